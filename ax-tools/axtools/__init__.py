@@ -0,0 +1,26 @@
+"""Post-processing tools for the dumped trees.
+
+The tree helpers are imported on first use: the dumpers share the tracing,
+cache and output modules of this package and must not load numpy for them.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "FlatTree": "tree",
+    "flatten": "tree",
+    "load": "tree",
+    "tree_roots": "tree",
+    "screen_rects": "geometry",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
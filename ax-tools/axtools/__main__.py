@@ -0,0 +1,36 @@
+"""Command line entry point, `python -m axtools <command>`"""
+import argparse
+
+from axtools import batch, compact, dataset, query, recorder, render, search, sqlexport, textindex, track
+
+# command name -> module with add_arguments(parser) and run(args)
+COMMANDS = {
+    "export-crops": dataset,
+    "record": recorder,
+    "query": query,
+    "index": textindex,
+    "search": search,
+    "batch": batch,
+    "compact": compact,
+    "render": render,
+    "track": track,
+    "export-sqlite": sqlexport,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m axtools',
+                                     description='Record and post-process accessibility tree dumps')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, module in COMMANDS.items():
+        summary = module.__doc__.strip().splitlines()[0]
+        command_parser = subparsers.add_parser(name, help=summary, description=summary)
+        module.add_arguments(command_parser)
+        command_parser.set_defaults(run=module.run)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""Run a pipeline of passes over many dumps, `python -m axtools batch`.
+
+Every input file is loaded once and handed through the passes in the order
+given with `-p`:
+
+- `stats`: schema, node, root and text node counts, number of levels and
+  role histogram
+- `compact`: `axtools.compact` with the default options, the node counts
+  before and after go into the record
+- `normalize`: adds the absolute `screen_rect` ([x0, y0, x1, y1], null where
+  unknown) of `axtools.screen_rects` to every node
+- `hash`: sha256 of the canonical json (sorted keys, no whitespace) of the
+  document as it is at that point of the pipeline
+- `reserialize`: stores the document itself in the output
+
+The results of a file form one record, `{"path", "stats", "compaction",
+"sha256", "tree"}`.
+Records are written next to their input (`tree.json` -> `tree.batch.json`,
+see `--suffix`) or, with `-o DIR`, as json lines into numbered shards.
+
+Files are processed in a process pool in chunks, a failing file is reported
+and does not stop the others. The workers load, run the passes and encode
+and compress their output, the main process only appends finished bytes to
+the shards, so throughput grows with the number of cores until the disk is
+the limit. Compressed shards are concatenated streams of one compressed
+member per record, which gzip, xz and zstd readers read as one file.
+
+A checkpoint lists the files which are done. An interrupted run started
+again with the same checkpoint skips them, changed files are processed
+again.
+"""
+import fnmatch
+import glob
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from axtools import tree as axtree
+from axtools.compressed import DEFAULT_LEVELS, compression_for_path, open_file
+
+DEFAULT_PASSES = ("stats", "hash")
+DEFAULT_SUFFIX = ".batch.json"
+DEFAULT_PATTERN = "*.json"
+DEFAULT_SHARD_SIZE = 1 << 30
+SHARD_PREFIX = "batch"
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+
+class FileContext:
+    """State of one file while it passes through the pipeline"""
+
+    def __init__(self, path, document):
+        self.path = path
+        self.document = document
+        self.record = {"path": path}
+        self._flat = None
+
+    @property
+    def flat(self):
+        # shared by the passes, reset by the ones which change the structure
+        if self._flat is None:
+            self._flat = axtree.flatten(self.document)
+        return self._flat
+
+
+def stats_pass(context):
+    flat = context.flat
+    roles = Counter(flat.roles)
+    context.record["stats"] = {
+        "schema": flat.schema,
+        "nodes": len(flat),
+        "roots": len(flat.roots),
+        "depth": int(flat.depth.max()) + 1 if len(flat) else 0,
+        "text_nodes": sum(1 for name in flat.names if name),
+        "roles": dict(roles.most_common()),
+    }
+
+
+def compact_pass(context):
+    from axtools.compact import compact_roots
+
+    roots = axtree.tree_roots(context.document)
+    stats = compact_roots(roots, axtree.detect_schema(roots))
+    context.record["compaction"] = stats.to_dict()
+    context._flat = None
+
+
+def normalize_pass(context):
+    from axtools.geometry import screen_rects
+
+    flat = context.flat
+    for node, rect in zip(flat.nodes, screen_rects(flat).tolist()):
+        # NaN is not json, nodes without a bbox get null
+        node["screen_rect"] = None if rect[0] != rect[0] else rect
+
+
+def hash_pass(context):
+    text = json.dumps(context.document, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    context.record["sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def reserialize_pass(context):
+    context.record["tree"] = context.document
+
+
+PASSES = {
+    "stats": stats_pass,
+    "compact": compact_pass,
+    "normalize": normalize_pass,
+    "hash": hash_pass,
+    "reserialize": reserialize_pass,
+}
+
+
+def parse_passes(text):
+    passes = [name.strip() for name in text.split(",") if name.strip()]
+    unknown = [name for name in passes if name not in PASSES]
+    if unknown:
+        raise ValueError(f"unknown passes {', '.join(unknown)}, available: {', '.join(PASSES)}")
+    if not passes:
+        raise ValueError("no passes given")
+    return passes
+
+
+def run_pipeline(path, passes):
+    """Load a file and run the passes over it, return its record"""
+    context = FileContext(path, axtree.load(path))
+    for name in passes:
+        PASSES[name](context)
+    return context.record
+
+
+def compress(data, compression, level=None):
+    """Compress bytes as one complete member of a gzip, xz or zstd stream"""
+    if compression is None:
+        return data
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if compression == "xz":
+        return lzma.compress(data, preset=level)
+    try:
+        from compression import zstd
+    except ImportError:
+        zstd = None
+    if zstd is not None:
+        return zstd.compress(data, level=level)
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd needs Python 3.14 or the zstandard package") from None
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def strip_extension(path):
+    """Remove the compression and json extensions of a path"""
+    if compression_for_path(path):
+        path = os.path.splitext(path)[0]
+    base, ext = os.path.splitext(path)
+    return base if ext.lower() in (".json", ".jsonl") else path
+
+
+def output_path(path, suffix):
+    return strip_extension(path) + suffix
+
+
+def check_output_paths(paths, suffix):
+    """Raise ValueError when two inputs would be written to the same output.
+
+    The extensions are replaced by the suffix, so `tree.json`, `tree.jsonl`
+    and `tree.json.gz` all end up in `tree.batch.json`.
+    """
+    inputs = {}
+    for path in paths:
+        output = output_path(path, suffix)
+        key = os.path.normcase(os.path.abspath(output))
+        if key in inputs:
+            raise ValueError(f"{inputs[key]} and {path} would both be written to {output}")
+        inputs[key] = path
+
+
+# set in every worker by _init_worker, so the tasks only carry a path
+_job = None
+
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+
+def _process(path):
+    """Worker task, returns (path, input bytes, output bytes, error)"""
+    passes, suffix, alongside, compression, level = _job
+    try:
+        size = os.path.getsize(path)
+        record = run_pipeline(path, passes)
+        if alongside:
+            # alongside the input, written by the worker itself
+            with open_file(output_path(path, suffix), "w", level) as f:
+                json.dump(record, f, ensure_ascii=False)
+            return path, size, None, None
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        return path, size, compress(line, compression, level), None
+    except Exception as e:
+        return path, 0, None, f"{type(e).__name__}: {e}"
+
+
+def find_inputs(inputs, pattern=DEFAULT_PATTERN, suffix=None):
+    """Expand directories (recursively, by `pattern`) and globs into sorted file paths.
+
+    The pattern is matched without the compression extension, so `*.json`
+    also finds `.json.gz`, `.json.xz` and `.json.zst` files. Files ending
+    with `suffix` are earlier outputs and are left out.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for directory, _, names in os.walk(item):
+                for name in names:
+                    plain = os.path.splitext(name)[0] if compression_for_path(name) else name
+                    if fnmatch.fnmatch(plain, pattern):
+                        paths.add(os.path.join(directory, name))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+    if suffix:
+        paths = {path for path in paths if not path.endswith(suffix)}
+    return sorted(paths)
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class Checkpoint:
+    """json-lines list of finished files, the first line holds the pipeline.
+
+    A file counts as done while its size and modification time match the
+    ones recorded when it was finished.
+    """
+
+    def __init__(self, path, passes):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                header = f.readline()
+                if header.strip() and json.loads(header).get("passes") != list(passes):
+                    raise ValueError(f"{path} was written for passes {json.loads(header).get('passes')}")
+                for line in f:
+                    # a line cut off by an interrupted run is ignored
+                    try:
+                        self.done.add(tuple(json.loads(line)))
+                    except ValueError:
+                        pass
+            self.file = open(path, "a", encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+            self.file.write(json.dumps({"passes": list(passes)}) + "\n")
+        self.file.flush()
+
+    def is_done(self, path):
+        try:
+            return _file_key(path) in self.done
+        except OSError:
+            return False
+
+    def add(self, path):
+        key = _file_key(path)
+        self.done.add(key)
+        self.file.write(json.dumps(key) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ShardLog:
+    """Append finished record bytes to numbered shards `batch-000000<ext>`.
+
+    Numbering continues after the shards already in the directory, so a
+    resumed run never writes into the shards of an earlier run.
+    """
+
+    def __init__(self, output_dir, ext, shard_size=DEFAULT_SHARD_SIZE):
+        self.output_dir = output_dir
+        self.ext = ext
+        self.shard_size = shard_size
+        self.index = len(glob.glob(os.path.join(glob.escape(output_dir), f"{SHARD_PREFIX}-*{ext}")))
+        self.file = None
+        self.shards = []
+
+    def write(self, data):
+        if self.file is None or self.file.tell() >= self.shard_size:
+            self._rotate()
+        self.file.write(data)
+        self.file.flush()
+
+    def _rotate(self):
+        self.close()
+        path = os.path.join(self.output_dir, f"{SHARD_PREFIX}-{self.index:06d}{self.ext}")
+        self.index += 1
+        self.file = open(path, "wb")
+        self.shards.append(path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Progress:
+    """Print files, files/s and MB/s to stderr every `interval` seconds"""
+
+    def __init__(self, total, interval=2.0, clock=time.perf_counter):
+        self.total = total
+        self.interval = interval
+        self.clock = clock
+        self.start = clock()
+        self.last = self.start
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def update(self, size, failed=False):
+        self.files += 1
+        self.failed += failed
+        self.bytes += size
+        now = self.clock()
+        if self.interval and now - self.last >= self.interval:
+            self.last = now
+            print(self.line(), file=sys.stderr)
+
+    def line(self):
+        elapsed = max(self.clock() - self.start, 1e-9)
+        rate = self.files / elapsed
+        eta = (self.total - self.files) / rate if rate else 0.0
+        return (f"{self.files}/{self.total} files, {self.failed} failed, {rate:.1f} files/s, "
+                f"{self.bytes / elapsed / 1e6:.1f} MB/s, {elapsed:.1f}s elapsed, {eta:.0f}s left")
+
+
+def default_chunk_size(files, processes):
+    # a few chunks per worker keep the pool balanced without a round trip per file
+    return max(1, min(64, files // (processes * 8)))
+
+
+def run_batch(paths, passes, output_dir=None, suffix=DEFAULT_SUFFIX, shard_ext=".jsonl.gz",
+              level=None, processes=None, chunk_size=None, checkpoint=None,
+              shard_size=DEFAULT_SHARD_SIZE, progress_interval=2.0):
+    """Run the passes over the files, return the finished Progress and the failed files.
+
+    Records go next to the inputs, or into shards in `output_dir`. Files
+    listed in the `checkpoint` file are skipped and finished ones are added
+    to it. Inputs which would overwrite each other's output next to them
+    raise ValueError before anything is written.
+    """
+    if output_dir is None:
+        check_output_paths(paths, suffix)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        if checkpoint is None:
+            checkpoint = os.path.join(output_dir, CHECKPOINT_NAME)
+    checkpoint = Checkpoint(checkpoint, passes) if checkpoint else None
+    if checkpoint is not None:
+        paths = [path for path in paths if not checkpoint.is_done(path)]
+
+    if output_dir is None:
+        shards = None
+        job = (tuple(passes), suffix, True, None, level)
+    else:
+        shards = ShardLog(output_dir, shard_ext, shard_size)
+        job = (tuple(passes), suffix, False, compression_for_path(shard_ext), level)
+
+    processes = processes or os.cpu_count() or 1
+    chunk_size = chunk_size or default_chunk_size(len(paths), processes)
+    progress = Progress(len(paths), progress_interval)
+    failed = []
+    try:
+        with Pool(processes, _init_worker, (job,)) as pool:
+            for path, size, data, error in pool.imap_unordered(_process, paths, chunk_size):
+                if error is not None:
+                    print(f"Failed {path}: {error}", file=sys.stderr)
+                    failed.append(path)
+                else:
+                    if shards is not None:
+                        shards.write(data)
+                    if checkpoint is not None:
+                        checkpoint.add(path)
+                progress.update(size, error is not None)
+    finally:
+        if shards is not None:
+            shards.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    return progress, failed
+
+
+def add_arguments(parser):
+    parser.add_argument('inputs',
+                      help='Directories (searched recursively with --pattern), files or globs',
+                      nargs='+')
+    parser.add_argument('-p', '--passes',
+                      help=f'Comma separated passes in order, from {", ".join(PASSES)} '
+                           f'(default: {",".join(DEFAULT_PASSES)})',
+                      default=','.join(DEFAULT_PASSES))
+    parser.add_argument('-o', '--out',
+                      help='Directory for sharded json-lines output, next to the inputs by default')
+    parser.add_argument('--suffix',
+                      help=f'Suffix replacing .json of the inputs for output next to them, '
+                           f'.gz, .xz and .zst compress (default: {DEFAULT_SUFFIX})',
+                      default=DEFAULT_SUFFIX)
+    parser.add_argument('--shard-ext',
+                      help='Extension of the shards in --out, .gz, .xz and .zst compress (default: .jsonl.gz)',
+                      default='.jsonl.gz')
+    parser.add_argument('--shard-size',
+                      help='Shard size in MB before rotating (default: 1024)',
+                      type=int,
+                      default=DEFAULT_SHARD_SIZE >> 20)
+    parser.add_argument('--pattern',
+                      help=f'File name pattern for directories, without the compression extension '
+                           f'(default: {DEFAULT_PATTERN})',
+                      default=DEFAULT_PATTERN)
+    parser.add_argument('--checkpoint',
+                      help=f'Checkpoint file to resume from (default: {CHECKPOINT_NAME} in --out, none otherwise)')
+    parser.add_argument('-w', '--workers',
+                      help='Number of worker processes (default: CPU count)',
+                      type=int)
+    parser.add_argument('--chunk-size',
+                      help='Files sent to a worker at once (default: by the number of files and workers)',
+                      type=int)
+    parser.add_argument('-l', '--compress-level',
+                      help='Compression level (default: 6 for gzip and xz, 3 for zstd)',
+                      type=int)
+    parser.add_argument('--progress',
+                      help='Seconds between progress lines, 0 for none (default: 2)',
+                      type=float,
+                      default=2.0)
+
+
+def run(args):
+    try:
+        passes = parse_passes(args.passes)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    paths = find_inputs(args.inputs, args.pattern, None if args.out else args.suffix)
+    if not paths:
+        print("No input files", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        progress, failed = run_batch(paths, passes, args.out, args.suffix, args.shard_ext,
+                                     args.compress_level, args.workers, args.chunk_size,
+                                     args.checkpoint, args.shard_size << 20, args.progress)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    skipped = len(paths) - progress.total
+    print(f"Done: {progress.line()}, {skipped} skipped by the checkpoint", file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,78 @@
+"""Warm cache of static element attributes between captures.
+
+Most elements keep their role, description and supported actions or
+patterns from one snapshot to the next, so a dumper which captures
+repeatedly (the `axtools record --dumper` loop) keeps them here and only
+reads the volatile attributes (position, size, value, states) again. The
+keys are the dumper's element identities: win-ax uses the UIA runtime id,
+mac-ax the AX element itself (equal elements hash alike). The cache is a
+bounded LRU and counts its hits, misses and evictions.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_SIZE = 100000
+
+
+class ElementCache:
+    """LRU map of element keys to their static attributes"""
+
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Entry of the key, None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Counts since the cache was created"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+
+
+def get_element_cache():
+    """The cache in use, None while caching is off"""
+    return _cache
+
+
+def set_element_cache(cache):
+    global _cache
+    _cache = cache
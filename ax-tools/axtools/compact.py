@@ -0,0 +1,277 @@
+"""Structural compaction of dumped trees, `python -m axtools compact`.
+
+Removes nodes which only add structure, for all three dumper schemas:
+
+- wrappers (`Pane`, `Group`, `AXGroup`, `filler`, ...) without text whose
+  only child has the same rectangle are replaced by that child
+- leaves with a zero-area bbox are dropped, and so are wrapper and static
+  text leaves without any text
+- static text nodes whose only child is static text with the same text (or
+  where one of the two has none) are merged into one node
+- invisible subtrees (win-ax `states.visible` false, mac-ax nodes clipped
+  away by their parents) are dropped
+
+Parents which become leaves are checked again, so a chain of empty wrappers
+disappears as a whole. Root nodes (applications, windows) are always kept.
+Every step can be switched off with `CompactOptions`.
+
+win-ax and mac-ax import this module to compact during the capture with
+`--compact`, so the NumPy based tree helpers are only loaded by `run`.
+"""
+import sys
+import time
+from dataclasses import dataclass
+
+from axtools.compressed import dump_json, open_file
+
+MAC = "mac"
+WIN = "win"
+LINUX = "linux"
+
+WRAPPER_ROLES = frozenset({
+    "Pane", "Group", "Custom",
+    "AXGroup", "AXUnknown",
+    "filler", "panel", "section",
+})
+TEXT_ROLES = frozenset({"Text", "AXStaticText", "label", "static"})
+# linux roles whose bbox is not relative to the parent node
+LINUX_ABSOLUTE_ROLES = ("application", "window", "frame")
+
+
+@dataclass
+class CompactOptions:
+    collapse_wrappers: bool = True
+    drop_zero_area: bool = True
+    drop_empty_text: bool = True
+    merge_text: bool = True
+    drop_invisible: bool = True
+    wrapper_roles: frozenset = WRAPPER_ROLES
+    text_roles: frozenset = TEXT_ROLES
+
+
+@dataclass
+class CompactStats:
+    """Node counts of a compaction, `before` and `after` include the roots"""
+    before: int = 0
+    after: int = 0
+    collapsed: int = 0
+    dropped: int = 0
+    merged: int = 0
+
+    @property
+    def reduction(self):
+        return 1 - self.after / self.before if self.before else 0.0
+
+    def to_dict(self):
+        return {"before": self.before, "after": self.after, "collapsed": self.collapsed,
+                "dropped": self.dropped, "merged": self.merged}
+
+
+def _children(node):
+    children = node.get("children") or []
+    # mac-ax stores the window of an application as a single dict
+    return [children] if isinstance(children, dict) else children
+
+
+def _set_children(node, children):
+    if isinstance(node.get("children"), dict) and len(children) == 1:
+        node["children"] = children[0]
+    else:
+        node["children"] = children
+
+
+def count_nodes(roots):
+    count = 0
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(_children(node))
+    return count
+
+
+def _box(bbox):
+    """(x0, y0, x1, y1) of a bbox dict or list, None when missing"""
+    if isinstance(bbox, dict):
+        x, y = bbox.get("x", 0), bbox.get("y", 0)
+        return (x, y, x + bbox.get("width", 0), y + bbox.get("height", 0))
+    if bbox:
+        return tuple(bbox)
+    return None
+
+
+def _has_content(node):
+    return bool(node.get("name") or node.get("value") or node.get("description"))
+
+
+def _text(node):
+    for key in ("name", "value"):
+        text = node.get(key)
+        if text:
+            return text if isinstance(text, str) else None
+    return ""
+
+
+def is_invisible(node, schema):
+    if schema == WIN:
+        return (node.get("states") or {}).get("visible") is False
+    if schema == MAC:
+        return "visible_bbox" in node and node["visible_bbox"] is None and node.get("bbox") is not None
+    return False
+
+
+def is_zero_area(node):
+    box = _box(node.get("bbox"))
+    return box is not None and (box[2] <= box[0] or box[3] <= box[1])
+
+
+def same_rect(parent, child, schema):
+    if schema == LINUX:
+        # linux children are relative to the parent, the same rectangle is
+        # at the parent's origin with the parent's size
+        if child.get("role") in LINUX_ABSOLUTE_ROLES:
+            return False
+        parent_box, child_box = _box(parent.get("bbox")), _box(child.get("bbox"))
+        if parent_box is None or child_box is None:
+            return False
+        return (child_box[:2] == (0, 0)
+                and child_box[2] == parent_box[2] - parent_box[0]
+                and child_box[3] == parent_box[3] - parent_box[1])
+    if schema == MAC:
+        parent_box = _box(parent.get("visible_bbox") or parent.get("bbox"))
+        child_box = _box(child.get("visible_bbox") or child.get("bbox"))
+    else:
+        parent_box, child_box = _box(parent.get("bbox")), _box(child.get("bbox"))
+    return parent_box is not None and parent_box == child_box
+
+
+def _merge_text(node, children, options, stats):
+    while len(children) == 1 and children[0].get("role") in options.text_roles:
+        child = children[0]
+        text, child_text = _text(node), _text(child)
+        if text is None or child_text is None or (text and child_text and text != child_text):
+            break
+        for key in ("name", "value", "description"):
+            if not node.get(key) and child.get(key):
+                node[key] = child[key]
+        children = _children(child)
+        stats.merged += 1
+    return children
+
+
+def _compact_node(node, children, schema, options, stats):
+    """Compact a node whose children are compacted, return its replacement or None"""
+    role = node.get("role")
+    if options.merge_text and role in options.text_roles:
+        children = _merge_text(node, children, options, stats)
+
+    if not children:
+        if options.drop_zero_area and is_zero_area(node):
+            return None
+        if options.drop_empty_text and role in options.wrapper_roles | options.text_roles \
+                and not _has_content(node):
+            return None
+
+    if options.collapse_wrappers and role in options.wrapper_roles and len(children) == 1 \
+            and not _has_content(node) and same_rect(node, children[0], schema):
+        child = children[0]
+        if schema == LINUX:
+            # the child takes the place of the parent in the grandparent
+            child["bbox"] = dict(node["bbox"])
+        stats.collapsed += 1
+        return child
+
+    _set_children(node, children)
+    return node
+
+
+def compact_roots(roots, schema, options=None):
+    """Compact the trees below the roots in place, return the CompactStats.
+
+    `schema` is MAC, WIN or LINUX. The roots themselves are never removed,
+    only their subtrees change.
+    """
+    if options is None:
+        options = CompactOptions()
+    stats = CompactStats(before=count_nodes(roots))
+    for root in roots:
+        # post-order, the children of a node are compacted before the node
+        results = {}
+        stack = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not visited:
+                if node is not root and options.drop_invisible and is_invisible(node, schema):
+                    results[id(node)] = None
+                    continue
+                stack.append((node, True))
+                stack.extend((child, False) for child in _children(node))
+                continue
+            children = [results.pop(id(child)) for child in _children(node)]
+            children = [child for child in children if child is not None]
+            if node is root:
+                _set_children(node, children)
+            else:
+                results[id(node)] = _compact_node(node, children, schema, options, stats)
+    stats.after = count_nodes(roots)
+    stats.dropped = stats.before - stats.after - stats.collapsed - stats.merged
+    return stats
+
+
+def options_from_args(args):
+    return CompactOptions(
+        collapse_wrappers=not args.keep_wrappers,
+        drop_zero_area=not args.keep_zero_area,
+        drop_empty_text=not args.keep_empty_text,
+        merge_text=not args.keep_text_chains,
+        drop_invisible=not args.keep_invisible,
+    )
+
+
+def add_option_arguments(parser):
+    parser.add_argument('--keep-wrappers',
+                      help='Do not collapse wrappers around a child of the same size',
+                      action='store_true')
+    parser.add_argument('--keep-zero-area',
+                      help='Keep leaves with a zero-area bbox',
+                      action='store_true')
+    parser.add_argument('--keep-empty-text',
+                      help='Keep wrapper and static text leaves without text',
+                      action='store_true')
+    parser.add_argument('--keep-text-chains',
+                      help='Do not merge static text chains',
+                      action='store_true')
+    parser.add_argument('--keep-invisible',
+                      help='Keep invisible subtrees',
+                      action='store_true')
+
+
+def add_arguments(parser):
+    parser.add_argument('tree',
+                      help='Dump of any dumper, plain or event format')
+    parser.add_argument('-o', '--out',
+                      help='Output file, .gz, .xz and .zst files are compressed (default: stdout)')
+    parser.add_argument('-l', '--compress-level',
+                      help='Compression level (default: 6 for gzip and xz, 3 for zstd)',
+                      type=int)
+    add_option_arguments(parser)
+
+
+def run(args):
+    from axtools import tree as axtree
+
+    document = axtree.load(args.tree)
+    roots = axtree.tree_roots(document)
+    start = time.perf_counter()
+    stats = compact_roots(roots, axtree.detect_schema(roots), options_from_args(args))
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open_file(args.out, 'w', args.compress_level) as f:
+            dump_json(document, f)
+    else:
+        dump_json(document, sys.stdout)
+        sys.stdout.write('\n')
+    print(f"Compacted {stats.before} to {stats.after} nodes ({stats.reduction:.0%} fewer: "
+          f"{stats.collapsed} wrappers collapsed, {stats.merged} texts merged, {stats.dropped} dropped) "
+          f"in {elapsed * 1000:.1f} ms", file=sys.stderr)
@@ -0,0 +1,87 @@
+"""Compressed files picked by the file extension.
+
+`.gz`, `.xz` and `.zst`/`.zstd` paths are compressed while they are written
+and decompressed while they are read, so every tool reads compressed dumps
+as they are. The dumpers write their output with `dump_json`, which encodes
+the document in chunks, so the json text of the whole tree is never built as
+one string before it is compressed. zstd uses the standard library on Python
+3.14+ and the `zstandard` package otherwise.
+"""
+import gzip
+import io
+import json
+import lzma
+
+EXTENSIONS = {".gz": "gzip", ".xz": "xz", ".zst": "zstd", ".zstd": "zstd"}
+DEFAULT_LEVELS = {"gzip": 6, "xz": 6, "zstd": 3}
+
+
+def compression_for_path(path):
+    """Get the compression of a path from its extension, None for plain files"""
+    lower = path.lower()
+    for extension, compression in EXTENSIONS.items():
+        if lower.endswith(extension):
+            return compression
+    return None
+
+
+def _open_zstd(path, mode, level):
+    try:
+        from compression import zstd
+    except ImportError:
+        zstd = None
+    if zstd is not None:
+        return zstd.open(path, mode, level=level) if "w" in mode else zstd.open(path, mode)
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(f"{path}: zstd needs Python 3.14 or the zstandard package") from None
+    if "w" in mode:
+        return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=level))
+    return zstandard.open(path, mode)
+
+
+def open_file(path, mode="r", level=None):
+    """Open a utf-8 text file (binary with "b"), compressed according to its extension"""
+    compression = compression_for_path(path)
+    if compression is None:
+        return open(path, mode) if "b" in mode else open(path, mode, encoding="utf-8")
+
+    writing = "w" in mode or "a" in mode
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+    if compression == "gzip":
+        f = gzip.open(path, binary_mode, compresslevel=level) if writing else gzip.open(path, binary_mode)
+    elif compression == "xz":
+        f = lzma.open(path, binary_mode, preset=level) if writing else lzma.open(path, binary_mode)
+    else:
+        f = _open_zstd(path, binary_mode, level)
+    return f if "b" in mode else io.TextIOWrapper(f, encoding="utf-8")
+
+
+def dump_json(value, file, levels=3):
+    """Write value as json, the text matches json.dumps(value, ensure_ascii=False).
+
+    The outer `levels` of dicts and lists are written item by item, so only
+    one item (a window, a query result) is encoded to a string at a time.
+    """
+    if levels and isinstance(value, dict):
+        file.write("{")
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                file.write(", ")
+            file.write(json.dumps(str(key), ensure_ascii=False))
+            file.write(": ")
+            dump_json(item, file, levels - 1)
+        file.write("}")
+    elif levels and isinstance(value, list):
+        file.write("[")
+        for index, item in enumerate(value):
+            if index:
+                file.write(", ")
+            dump_json(item, file, levels - 1)
+        file.write("]")
+    else:
+        file.write(json.dumps(value, ensure_ascii=False))
@@ -0,0 +1,263 @@
+"""Export per-element crops and element-id masks from screenshots and trees.
+
+Every (tree, screenshot) pair becomes one group of members in a tar shard:
+
+- `<key>/<element>.png` crop of every element with a visible area
+- `<key>/mask.png` 16-bit mask with the element id of every pixel, 0 for
+  pixels outside of all elements. Deeper elements are painted over their
+  parents. Trees with 65535 or more nodes get a uint32 `<key>/mask.npy`.
+
+Element ids are 1-based pre-order indices of the flattened tree. The crops
+are listed in `index.jsonl` with the shard they were written to, so millions
+of crops end up in a handful of files.
+"""
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+from axtools import tree as axtree
+
+# tar shards are rotated between files once they grow past this size
+DEFAULT_SHARD_SIZE = 1 << 30
+
+# crops are written often and read rarely, favour speed over size
+PNG_COMPRESS_LEVEL = 1
+
+
+def infer_scaling_factor(flat, image_size):
+    """Infer the backing scale factor of a mac-ax screenshot.
+
+    macapptree stores the window size in points, the cropped screenshot is
+    `size * _screen_scaling_factor` pixels wide. Other schemas are in pixels.
+    """
+    if flat.schema != axtree.MAC:
+        return 1
+    for node in flat.nodes:
+        size = node.get("size")
+        if size:
+            width = float(size.split(";")[0])
+            if width > 0:
+                return max(round(image_size[0] / width * 2) / 2, 1)
+    return 1
+
+
+def pixel_rects(flat, scaling_factor, image_size):
+    """Get the (x0, y0, x1, y1) pixel rectangles of all nodes.
+
+    Follows the rounding of `crop_window` in macapptree, the end corner is
+    exclusive. Rectangles are clipped to the image, nodes without a bbox get
+    an empty rectangle.
+    """
+    rects = np.nan_to_num(flat.rects * scaling_factor, nan=0.0)
+    rects = rects.astype(np.int64)
+    width, height = image_size
+    np.clip(rects[:, 0::2], 0, width, out=rects[:, 0::2])
+    np.clip(rects[:, 1::2], 0, height, out=rects[:, 1::2])
+    return rects
+
+
+def element_mask(rects, shape, exported):
+    """Paint the element ids of the exported rectangles in pre-order"""
+    mask = np.zeros(shape, dtype=np.uint32)
+    for index in np.flatnonzero(exported).tolist():
+        x0, y0, x1, y1 = rects[index].tolist()
+        mask[y0:y1, x0:x1] = index + 1
+    return mask
+
+
+def _encode_png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+def _encode_npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def export_file(key, tree_path, image_path, scaling_factor=None, min_size=1):
+    """Crop the elements of one tree out of its screenshot.
+
+    Returns the index records and the (member name, bytes) pairs to store.
+    """
+    flat = axtree.flatten(axtree.load(tree_path))
+    with Image.open(image_path) as image:
+        pixels = np.asarray(image.convert("RGB"))
+    height, width = pixels.shape[:2]
+
+    if scaling_factor is None:
+        scaling_factor = infer_scaling_factor(flat, (width, height))
+    rects = pixel_rects(flat, scaling_factor, (width, height))
+    exported = ((rects[:, 2] - rects[:, 0]) >= min_size) & ((rects[:, 3] - rects[:, 1]) >= min_size)
+
+    members = []
+    records = []
+    wide_mask = len(flat) >= np.iinfo(np.uint16).max
+    mask_name = f"{key}/mask.npy" if wide_mask else f"{key}/mask.png"
+    roles = flat.roles
+    names = flat.names
+    for index in np.flatnonzero(exported).tolist():
+        x0, y0, x1, y1 = rects[index].tolist()
+        crop_name = f"{key}/{index + 1}.png"
+        members.append((crop_name, _encode_png(pixels[y0:y1, x0:x1])))
+        records.append({
+            "tree": tree_path,
+            "image": image_path,
+            "crop": crop_name,
+            "mask": mask_name,
+            "element": index + 1,
+            "parent": int(flat.parent[index]) + 1,
+            "depth": int(flat.depth[index]),
+            "role": roles[index],
+            "name": names[index],
+            "rect": [x0, y0, x1, y1],
+            "scaling_factor": scaling_factor,
+        })
+    mask = element_mask(rects, (height, width), exported)
+    if wide_mask:
+        members.append((mask_name, _encode_npy(mask)))
+    else:
+        members.append((mask_name, _encode_png(mask.astype(np.uint16))))
+    return records, members
+
+
+def _export_job(job):
+    key, tree_path, image_path, scaling_factor, min_size = job
+    try:
+        return key, export_file(key, tree_path, image_path, scaling_factor, min_size), None
+    except Exception as e:
+        return key, None, f"{tree_path}: {e}"
+
+
+class ShardWriter:
+    """Append members to numbered tar shards, rotating between groups"""
+
+    def __init__(self, output_dir, shard_size=DEFAULT_SHARD_SIZE, prefix="shard"):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.shard_index = -1
+        self.shard_name = None
+        self.archive = None
+
+    def write_group(self, members):
+        """Write the members of one file to the current shard, return its name"""
+        if self.archive is None or self.archive.fileobj.tell() >= self.shard_size:
+            self._rotate()
+        mtime = time.time()
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = mtime
+            self.archive.addfile(info, io.BytesIO(data))
+        return self.shard_name
+
+    def _rotate(self):
+        self.close()
+        self.shard_index += 1
+        self.shard_name = f"{self.prefix}-{self.shard_index:06d}.tar"
+        self.archive = tarfile.open(os.path.join(self.output_dir, self.shard_name), "w")
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+
+def export_dataset(pairs, output_dir, scaling_factor=None, min_size=1,
+                   processes=None, shard_size=DEFAULT_SHARD_SIZE):
+    """Export crops and masks of (tree path, image path) pairs to output_dir.
+
+    The files are cropped in a process pool, the shards and the index are
+    written by the calling process only. Returns the number of exported
+    elements and the failed files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        (f"{index:06d}", tree_path, image_path, scaling_factor, min_size)
+        for index, (tree_path, image_path) in enumerate(pairs)
+    ]
+
+    exported = 0
+    failed = []
+    writer = ShardWriter(output_dir, shard_size)
+    with open(os.path.join(output_dir, "index.jsonl"), "w", encoding="utf-8") as index_file, \
+            Pool(processes) as pool:
+        try:
+            for key, result, error in pool.imap(_export_job, jobs):
+                if error is not None:
+                    print(f"Error exporting {error}", file=sys.stderr)
+                    failed.append(error)
+                    continue
+                records, members = result
+                shard = writer.write_group(members)
+                for record in records:
+                    record["shard"] = shard
+                    index_file.write(json.dumps(record, ensure_ascii=False))
+                    index_file.write("\n")
+                exported += len(records)
+        finally:
+            writer.close()
+    return exported, failed
+
+
+def image_for_tree(tree_path, image_ext):
+    return os.path.splitext(tree_path)[0] + image_ext
+
+
+def add_arguments(parser):
+    parser.add_argument('trees',
+                      help='Tree json files, the screenshot is looked up next to the tree with --image-ext',
+                      nargs='*')
+    parser.add_argument('-p', '--pair',
+                      help='Tree json file and its screenshot',
+                      nargs=2,
+                      action='append',
+                      default=[],
+                      metavar=('TREE', 'IMAGE'))
+    parser.add_argument('-o', '--out',
+                      help='Output directory for the shards and index.jsonl',
+                      required=True)
+    parser.add_argument('--image-ext',
+                      help='Screenshot extension used for the positional trees (default: .png)',
+                      default='.png')
+    parser.add_argument('-s', '--scale',
+                      help='Screen scaling factor, inferred from mac-ax window sizes by default',
+                      type=float)
+    parser.add_argument('--min-size',
+                      help='Minimum crop width and height in pixels (default: 1)',
+                      type=int,
+                      default=1)
+    parser.add_argument('-w', '--workers',
+                      help='Number of worker processes (default: CPU count)',
+                      type=int)
+    parser.add_argument('--shard-size',
+                      help='Shard size in MB before rotating (default: 1024)',
+                      type=int,
+                      default=DEFAULT_SHARD_SIZE >> 20)
+
+
+def run(args):
+    pairs = [(tree_path, image_for_tree(tree_path, args.image_ext)) for tree_path in args.trees]
+    pairs.extend(tuple(pair) for pair in args.pair)
+    if not pairs:
+        print("No input trees", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    exported, failed = export_dataset(pairs, args.out, args.scale, args.min_size,
+                                      args.workers, args.shard_size << 20)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {exported} elements from {len(pairs) - len(failed)} files in {elapsed:.2f}s",
+          file=sys.stderr)
+    if failed:
+        sys.exit(1)
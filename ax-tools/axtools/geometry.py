@@ -0,0 +1,143 @@
+"""Absolute screen rectangles for any dumper schema.
+
+`screen_rects` converts the `rects` of a FlatTree into screen coordinates
+with array operations over the whole tree:
+
+- win-ax bboxes are already in screen coordinates
+- mac-ax bboxes are relative to their window, the window origin is parsed
+  once per window from its `absolute_position` and `position` strings and
+  added to every node below it
+- linux-ax bboxes are relative to the parent, `flatten` already summed them
+  up along the path to the nearest application, window or frame. Frames
+  are in window coordinates, so the origin of the application or window
+  enclosing a frame is added to the frame and every node below it. Where
+  that ancestor reports no extents (zero or missing) the frame keeps its
+  window coordinates, there is nothing else to resolve them against
+
+Walks up the tree (nearest window, sums along the path) use pointer jumping:
+every round follows the pointers of the pointers, so a tree of depth d needs
+log2(d) rounds of NumPy indexing instead of a Python loop over the nodes.
+"""
+import numpy as np
+
+from axtools import tree as axtree
+
+MAC_WINDOW_ROLES = ("AXWindow",)
+
+
+def anchor_indices(parent, is_anchor):
+    """Get the nearest ancestor-or-self of every node for which `is_anchor` is set.
+
+    Roots count as anchors, so every node gets one.
+    """
+    is_anchor = is_anchor | (parent < 0)
+    anchor = np.where(is_anchor, np.arange(len(parent)), parent)
+    while True:
+        resolved = is_anchor[anchor]
+        if resolved.all():
+            return anchor
+        anchor = np.where(resolved, anchor, anchor[anchor])
+
+
+def path_sums(parent, values, is_anchor):
+    """Sum `values` along the path from every node up to its nearest anchor.
+
+    The node's own value and the anchor's value are included; roots count
+    as anchors.
+    """
+    sums = values.copy()
+    jump = np.where(is_anchor | (parent < 0), -1, parent)
+    active = np.flatnonzero(jump >= 0)
+    while active.size:
+        targets = jump[active]
+        # read the partial sums of the targets before any of them is updated
+        sums[active] += sums[targets]
+        jump[active] = jump[targets]
+        active = active[jump[active] >= 0]
+    return sums
+
+
+def _parse_point(text):
+    if not text:
+        return (0.0, 0.0)
+    x, _, y = text.partition(";")
+    return (float(x), float(y))
+
+
+def mac_window_origins(flat, anchors):
+    """Screen origin of the mac-ax windows at the `anchors` indices"""
+    origins = np.zeros((len(anchors), 2))
+    for row, index in enumerate(anchors.tolist()):
+        node = flat.nodes[index]
+        absolute = _parse_point(node.get("absolute_position"))
+        relative = _parse_point(node.get("position"))
+        # macapptree subtracts the window position only where it is positive
+        origins[row] = (absolute[0] - relative[0], absolute[1] - relative[1])
+    return origins
+
+
+def _role_mask(flat, roles):
+    return np.array([(node.get("role") or "") in roles for node in flat.nodes], dtype=bool)
+
+
+def linux_window_rects(flat, rects):
+    """Resolve parent-relative linux-ax rectangles up to their nearest anchor.
+
+    Nodes below an application or window are then in screen coordinates,
+    nodes below a frame in the window coordinates of the frame, see
+    `linux_screen_rects`.
+    """
+    if not len(flat):
+        return rects
+    is_anchor = _role_mask(flat, axtree.LINUX_SCREEN_ROLES + axtree.LINUX_WINDOW_ROLES)
+    origins = np.nan_to_num(rects[:, :2], nan=0.0)
+    sums = path_sums(flat.parent, origins, is_anchor)
+    # the own origin is part of the sum, only the ancestors' part is added
+    offsets = sums - origins
+    resolved = rects.copy()
+    resolved[:, 0::2] += offsets[:, :1]
+    resolved[:, 1::2] += offsets[:, 1:]
+    return resolved
+
+
+def linux_screen_rects(flat, rects):
+    """Move the window coordinates of linux-ax frames and their subtrees to the screen.
+
+    `rects` are resolved up to the nearest anchor by `linux_window_rects`.
+    Frames are placed relative to their window, the nearest application or
+    window above them, whose extents are in screen coordinates.
+    """
+    is_screen = _role_mask(flat, axtree.LINUX_SCREEN_ROLES)
+    is_frame = _role_mask(flat, axtree.LINUX_WINDOW_ROLES) & ~is_screen
+    if not is_frame.any():
+        return rects
+    anchor = anchor_indices(flat.parent, is_screen | is_frame)
+    # nested frames share the window of the outermost one
+    screen_anchor = anchor_indices(flat.parent, is_screen)
+    frame_parent = flat.parent[anchor]
+    window = np.where(frame_parent >= 0, screen_anchor[frame_parent], -1)
+    framed = np.flatnonzero(is_frame[anchor] & (window >= 0) & is_screen[np.maximum(window, 0)])
+    origins = np.nan_to_num(rects[window[framed], :2], nan=0.0)
+    resolved = rects.copy()
+    resolved[framed[:, None], [0, 2]] += origins[:, :1]
+    resolved[framed[:, None], [1, 3]] += origins[:, 1:]
+    return resolved
+
+
+def screen_rects(flat):
+    """Get the (x0, y0, x1, y1) screen rectangles of all nodes, NaN where unknown"""
+    rects = flat.rects.copy()
+    if not len(flat):
+        return rects
+    if flat.schema == axtree.LINUX:
+        return linux_screen_rects(flat, rects)
+    if flat.schema != axtree.MAC:
+        # win-ax is absolute
+        return rects
+
+    anchor = anchor_indices(flat.parent, _role_mask(flat, MAC_WINDOW_ROLES))
+    windows, window_of_node = np.unique(anchor, return_inverse=True)
+    offsets = mac_window_origins(flat, windows)[window_of_node]
+    rects[:, 0::2] += offsets[:, :1]
+    rects[:, 1::2] += offsets[:, 1:]
+    return rects
@@ -0,0 +1,427 @@
+"""Selector queries over dumped trees, `python -m axtools query SELECTOR TREES`.
+
+Selectors look like CSS:
+
+    Window[focused] Button[name="Save"]
+    List > ListItem[name~=/^report.*\\.pdf$/i][selected]
+    *[value^="http"][inside=0,0,1920,1080], AXTextField[!enabled]
+
+- a compound starts with a role (`*` for any) followed by `[...]`
+  predicates; roles match case-insensitively and ignore the `AX` prefix of
+  mac-ax, so `Button` also finds `AXButton`
+- predicates compare a field (`name`, `description`, `value`, `role`, ...)
+  or a win-ax state (`states`) with `=`, `!=`, `^=` (prefix), `$=`
+  (suffix), `*=` (substring) or `~=` (regex, `/.../i` for flags); `[field]`
+  tests that it is set and truthy, `[!field]` the opposite
+- `[inside=x0,y0,x1,y1]`, `[contains=x,y]` and `[overlaps=x0,y0,x1,y1]` test
+  the absolute screen rectangle
+- whitespace selects descendants, `>` children, `,` separates alternatives
+
+A SnapshotIndex is built once per snapshot (role and name indexes, parent
+pointers and pre-order subtree ranges) and answers any number of queries.
+Axes are resolved with array operations over the pre-order ranges, so a
+query never walks the nested `children` lists.
+"""
+import functools
+import json
+import re
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from axtools import tree as axtree
+from axtools.geometry import screen_rects
+
+GEOMETRY_FIELDS = ("inside", "contains", "overlaps")
+
+
+class SelectorError(ValueError):
+    """The selector could not be parsed"""
+
+
+@dataclass(frozen=True)
+class Predicate:
+    field: str
+    operator: str = None
+    value: object = None
+    negate: bool = False
+
+
+@dataclass(frozen=True)
+class Compound:
+    role: str = None
+    predicates: tuple = ()
+
+
+@dataclass(frozen=True)
+class Step:
+    """A compound and the axis which leads to it from the previous step"""
+    compound: Compound
+    axis: str = "descendant"
+
+
+@dataclass(frozen=True)
+class Selector:
+    alternatives: tuple
+
+
+def normalize_role(role):
+    role = (role or "").lower()
+    if role.startswith("ax"):
+        role = role[2:]
+    return role.replace(" ", "").replace("_", "")
+
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<child>>)
+  | (?P<comma>,)
+  | (?P<open>\[)
+  | (?P<star>\*)
+  | (?P<ident>[A-Za-z_][\w\-]*)
+""", re.VERBOSE)
+
+_PREDICATE = re.compile(r"""
+    \s*(?P<negate>!)?\s*(?P<field>[A-Za-z_][\w\-]*)\s*
+    (?:(?P<op>!=|\^=|\$=|\*=|~=|=)\s*
+       (?:"(?P<dq>(?:[^"\\]|\\.)*)"
+         |'(?P<sq>(?:[^'\\]|\\.)*)'
+         |/(?P<regex>(?:[^/\\]|\\.)*)/(?P<flags>[imsx]*)
+         |(?P<bare>[^\]]*?)))?
+    \s*\]
+""", re.VERBOSE)
+
+
+def _unescape(text):
+    return re.sub(r"\\(.)", r"\1", text)
+
+
+def _bare_value(text):
+    text = text.strip()
+    lower = text.lower()
+    if lower in ("true", "false"):
+        return lower == "true"
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _predicate(match):
+    field_name = match.group("field")
+    negate = bool(match.group("negate"))
+    operator = match.group("op")
+    if operator is None:
+        return Predicate(field_name, negate=negate)
+
+    if match.group("regex") is not None:
+        flags = 0
+        for flag in match.group("flags"):
+            flags |= {"i": re.I, "m": re.M, "s": re.S, "x": re.X}[flag]
+        value = re.compile(match.group("regex"), flags)
+        if operator != "~=":
+            raise SelectorError(f"regex value needs ~= in [{field_name}]")
+    elif match.group("dq") is not None or match.group("sq") is not None:
+        value = _unescape(match.group("dq") if match.group("dq") is not None else match.group("sq"))
+    else:
+        value = _bare_value(match.group("bare") or "")
+
+    if field_name in GEOMETRY_FIELDS:
+        try:
+            value = tuple(float(part) for part in str(value).split(","))
+        except ValueError:
+            raise SelectorError(f"[{field_name}] needs comma separated numbers") from None
+        if len(value) != (2 if field_name == "contains" else 4):
+            raise SelectorError(f"[{field_name}] needs {2 if field_name == 'contains' else 4} numbers")
+    elif operator == "~=" and not isinstance(value, re.Pattern):
+        value = re.compile(str(value))
+    return Predicate(field_name, operator, value, negate)
+
+
+@functools.lru_cache(maxsize=256)
+def parse(text):
+    """Parse a selector, parsed selectors are cached"""
+    alternatives = []
+    steps = []
+    role = None
+    predicates = []
+    has_compound = False
+    axis = "descendant"
+    position = 0
+
+    def finish_compound():
+        nonlocal role, predicates, has_compound, axis
+        if has_compound:
+            steps.append(Step(Compound(role, tuple(predicates)), axis))
+            axis = "descendant"
+        role, predicates, has_compound = None, [], False
+
+    while position < len(text):
+        token = _TOKEN.match(text, position)
+        if token is None:
+            raise SelectorError(f"Unexpected {text[position]!r} at {position} in {text!r}")
+        kind = token.lastgroup
+        position = token.end()
+        if kind == "open":
+            predicate = _PREDICATE.match(text, position)
+            if predicate is None:
+                raise SelectorError(f"Invalid predicate at {position} in {text!r}")
+            predicates.append(_predicate(predicate))
+            has_compound = True
+            position = predicate.end()
+        elif kind in ("ident", "star"):
+            if has_compound:
+                raise SelectorError(f"Role {token.group()!r} must start a compound in {text!r}")
+            role = None if kind == "star" else normalize_role(token.group())
+            has_compound = True
+        elif kind == "space":
+            finish_compound()
+        elif kind == "child":
+            finish_compound()
+            if not steps:
+                raise SelectorError(f"'>' without a left side in {text!r}")
+            axis = "child"
+        elif kind == "comma":
+            finish_compound()
+            if not steps:
+                raise SelectorError(f"Empty alternative in {text!r}")
+            alternatives.append(tuple(steps))
+            steps, axis = [], "descendant"
+    finish_compound()
+    if not steps or axis == "child":
+        raise SelectorError(f"Incomplete selector {text!r}")
+    alternatives.append(tuple(steps))
+    return Selector(tuple(alternatives))
+
+
+def _field(node, name):
+    if name in node:
+        return node[name]
+    states = node.get("states")
+    if isinstance(states, dict):
+        return states.get(name)
+    return None
+
+
+def _text_match(value, operator, expected):
+    if operator == "~=":
+        return value is not None and expected.search(str(value)) is not None
+    if isinstance(expected, bool):
+        # [focused=false] also matches nodes without the state
+        actual = bool(value)
+    elif value is None:
+        return operator == "!="
+    elif isinstance(expected, (int, float)) and isinstance(value, (int, float)) and not isinstance(value, bool):
+        actual = value
+    else:
+        actual, expected = str(value), str(expected)
+
+    if operator == "=":
+        return actual == expected
+    if operator == "!=":
+        return actual != expected
+    if operator == "^=":
+        return str(actual).startswith(str(expected))
+    if operator == "$=":
+        return str(actual).endswith(str(expected))
+    return str(expected) in str(actual)
+
+
+class SnapshotIndex:
+    """Indexes of one snapshot, built once and shared by all queries"""
+
+    def __init__(self, flat):
+        self.flat = flat
+        self.nodes = flat.nodes
+        self.parent = flat.parent
+        count = len(flat)
+
+        self.roles = defaultdict(list)
+        self.names = defaultdict(list)
+        for index, node in enumerate(self.nodes):
+            self.roles[normalize_role(node.get("role"))].append(index)
+            name = node.get("name")
+            if name:
+                self.names[name].append(index)
+        self.roles = {role: np.array(indices, dtype=np.int64) for role, indices in self.roles.items()}
+        self.names = {name: np.array(indices, dtype=np.int64) for name, indices in self.names.items()}
+
+        # descendants of node i are the pre-order range i + 1 .. end[i] - 1
+        size = axtree.subtree_sums(flat, np.ones(count, dtype=np.int64))
+        self.end = np.arange(count, dtype=np.int64) + size
+        self._screen_rects = None
+
+    @classmethod
+    def from_document(cls, document):
+        return cls(axtree.flatten(document))
+
+    @property
+    def screen_rects(self):
+        if self._screen_rects is None:
+            self._screen_rects = screen_rects(self.flat)
+        return self._screen_rects
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def children(self, index):
+        return np.flatnonzero(self.parent[index + 1:self.end[index]] == index) + index + 1
+
+    def ancestors(self, index):
+        result = []
+        index = int(self.parent[index])
+        while index >= 0:
+            result.append(index)
+            index = int(self.parent[index])
+        return result
+
+    def select(self, selector):
+        """Get the pre-order indices of the nodes matching the selector"""
+        if isinstance(selector, str):
+            selector = parse(selector)
+        mask = np.zeros(len(self), dtype=bool)
+        for steps in selector.alternatives:
+            mask |= self._match_steps(steps)
+        return np.flatnonzero(mask)
+
+    def select_nodes(self, selector):
+        return [self.nodes[index] for index in self.select(selector).tolist()]
+
+    def first(self, selector):
+        indices = self.select(selector)
+        return self.nodes[int(indices[0])] if len(indices) else None
+
+    def _match_steps(self, steps):
+        mask = self._match_compound(steps[0].compound, None)
+        for step in steps[1:]:
+            if step.axis == "child":
+                scope = np.zeros(len(self), dtype=bool)
+                has_parent = self.parent >= 0
+                scope[has_parent] = mask[self.parent[has_parent]]
+            else:
+                scope = self._descendants_of(mask)
+            mask = self._match_compound(step.compound, scope)
+        return mask
+
+    def _descendants_of(self, mask):
+        # +1 at the start and -1 after the end of every matched subtree, the
+        # running sum is positive inside at least one of them
+        ancestors = np.flatnonzero(mask)
+        delta = np.zeros(len(self) + 1, dtype=np.int64)
+        np.add.at(delta, ancestors + 1, 1)
+        np.add.at(delta, self.end[ancestors], -1)
+        return np.cumsum(delta[:-1]) > 0
+
+    def _match_compound(self, compound, scope):
+        candidates = None
+        if compound.role is not None:
+            candidates = self.roles.get(compound.role, np.empty(0, dtype=np.int64))
+        for predicate in compound.predicates:
+            if predicate.field == "name" and predicate.operator == "=" and not predicate.negate:
+                named = self.names.get(str(predicate.value), np.empty(0, dtype=np.int64))
+                candidates = named if candidates is None else np.intersect1d(candidates, named, assume_unique=True)
+        if candidates is None:
+            candidates = np.arange(len(self), dtype=np.int64)
+        if scope is not None:
+            candidates = candidates[scope[candidates]]
+
+        for predicate in compound.predicates:
+            if not len(candidates):
+                break
+            keep = self._evaluate(predicate, candidates)
+            candidates = candidates[keep != predicate.negate]
+
+        mask = np.zeros(len(self), dtype=bool)
+        mask[candidates] = True
+        return mask
+
+    def _evaluate(self, predicate, candidates):
+        if predicate.field in GEOMETRY_FIELDS and predicate.operator is not None:
+            rects = self.screen_rects[candidates]
+            value = predicate.value
+            with np.errstate(invalid="ignore"):
+                if predicate.field == "contains":
+                    x, y = value
+                    return (rects[:, 0] <= x) & (x < rects[:, 2]) & (rects[:, 1] <= y) & (y < rects[:, 3])
+                x0, y0, x1, y1 = value
+                if predicate.field == "inside":
+                    return (rects[:, 0] >= x0) & (rects[:, 1] >= y0) & (rects[:, 2] <= x1) & (rects[:, 3] <= y1)
+                return (rects[:, 0] < x1) & (rects[:, 2] > x0) & (rects[:, 1] < y1) & (rects[:, 3] > y0)
+
+        nodes = self.nodes
+        if predicate.operator is None:
+            return np.array([bool(_field(nodes[index], predicate.field)) for index in candidates.tolist()],
+                            dtype=bool)
+        if predicate.field == "role" and predicate.operator in ("=", "!="):
+            expected = normalize_role(str(predicate.value))
+            equal = np.array([normalize_role(nodes[index].get("role")) == expected
+                              for index in candidates.tolist()], dtype=bool)
+            return equal if predicate.operator == "=" else ~equal
+        return np.array([
+            _text_match(_field(nodes[index], predicate.field), predicate.operator, predicate.value)
+            for index in candidates.tolist()
+        ], dtype=bool)
+
+
+def describe(index, node_index):
+    node = index.nodes[node_index]
+    rect = index.screen_rects[node_index]
+    return {
+        "index": node_index,
+        "role": node.get("role"),
+        "name": node.get("name"),
+        "rect": None if np.isnan(rect).any() else [float(value) for value in rect],
+        "path": [int(ancestor) for ancestor in reversed(index.ancestors(node_index))],
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('selector',
+                      help='Selector, e.g. \'Window[focused] Button[name="Save"]\'')
+    parser.add_argument('trees',
+                      help='Tree json files, compressed files are decompressed',
+                      nargs='+')
+    parser.add_argument('-c', '--count',
+                      help='Print the number of matches per file only',
+                      action='store_true')
+    parser.add_argument('-n', '--limit',
+                      help='Print at most this many matches per file',
+                      type=int)
+    parser.add_argument('--nodes',
+                      help='Print the matched nodes without their children as json lines',
+                      action='store_true')
+
+
+def run(args):
+    try:
+        selector = parse(args.selector)
+    except SelectorError as e:
+        print(f"Invalid selector: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    matched = 0
+    for path in args.trees:
+        try:
+            index = SnapshotIndex.from_document(axtree.load(path))
+        except (OSError, ValueError) as e:
+            print(f"Failed to load {path}: {e}", file=sys.stderr)
+            continue
+        indices = index.select(selector).tolist()
+        matched += len(indices)
+        if args.count:
+            print(f"{path}\t{len(indices)}")
+            continue
+        for node_index in indices[:args.limit]:
+            if args.nodes:
+                node = {key: value for key, value in index.nodes[node_index].items() if key != "children"}
+                print(json.dumps(dict(node, file=path, index=node_index), ensure_ascii=False))
+            else:
+                print(json.dumps(dict(describe(index, node_index), file=path), ensure_ascii=False))
+    if not matched:
+        sys.exit(1)
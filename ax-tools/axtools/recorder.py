@@ -0,0 +1,340 @@
+"""Record snapshots at a fixed rate, `python -m axtools record --hz N`.
+
+Ticks follow a monotonic schedule (`start + tick / hz`), so a slow snapshot
+does not shift the ones after it. Only one capture runs at a time: ticks
+which come due while a capture is still running are skipped and counted
+instead of queued. Every snapshot is written as an event-format record
+(`{"time", "data": {"duration", "tree", ...}}`) with the tick, the ticks
+skipped before it and the capture duration, one json line per record, to a
+log which rotates by size and is compressed for `.gz`, `.xz` and `.zst`
+paths.
+
+Snapshots come from a Python dumper loaded in-process (`--dumper`, any
+script with a `capture_accessibility_tree()` function such as
+`win-ax/dump-tree.py`), from a command printing one tree per run
+(`-- CMD ...`) or from a fake backend with a random capture cost
+(`--fake`) for testing the scheduling. `--compact` compacts every snapshot
+with `axtools.compact` before it is written. `--cache N` makes the win-ax
+and mac-ax dumpers keep the static attributes of N elements warm between
+snapshots. `--track` gives the nodes track ids which persist across
+snapshots, see `axtools.track`.
+"""
+import importlib.util
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+
+from axtools import tree as axtree
+from axtools.cache import ElementCache, set_element_cache
+from axtools.compact import CompactOptions, compact_roots
+from axtools.compressed import compression_for_path, open_file
+from axtools.track import Tracker
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+
+def load_dumper(path, cache_size=None):
+    """Import a dumper script as a module, with its directory on sys.path.
+
+    With `cache_size` the dumper keeps a warm element cache of that many
+    elements between captures. Dumpers declare their support with a
+    module-level `SUPPORTS_ELEMENT_CACHE = True`, the win-ax and mac-ax
+    dumpers do.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location("dumper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, "capture_accessibility_tree"):
+        raise ValueError(f"{path} has no capture_accessibility_tree()")
+    if cache_size:
+        if not getattr(module, "SUPPORTS_ELEMENT_CACHE", False):
+            raise ValueError(f"{path} has no element cache")
+        set_element_cache(ElementCache(cache_size))
+    return module.capture_accessibility_tree
+
+
+def command_capture(command):
+    """Capture by running a dumper command which prints its tree to stdout"""
+    def capture():
+        result = subprocess.run(command, capture_output=True, check=True)
+        document = json.loads(result.stdout)
+        # unwrap event-format output, the recorder adds its own timing
+        if isinstance(document, dict) and "data" in document and "time" in document:
+            document = dict(document["data"])
+            document.pop("duration", None)
+            return document
+        return {"tree": document}
+    return capture
+
+
+def compacted_capture(capture, options=None):
+    """Compact the trees of every capture, the node counts go into `compaction`"""
+    def compacted():
+        data = capture()
+        roots = axtree.tree_roots(data)
+        data["compaction"] = compact_roots(roots, axtree.detect_schema(roots), options).to_dict()
+        return data
+    return compacted
+
+
+def tracked_capture(capture, tracker=None):
+    """Add persistent `track_id`s to the nodes of every capture, see axtools.track"""
+    tracker = tracker or Tracker()
+
+    def tracked():
+        data = capture()
+        tracker.update(data)
+        return data
+    return tracked
+
+
+class FakeCapture:
+    """Backend for testing the recorder, each capture sleeps a random cost.
+
+    The cost is drawn uniformly between `min_cost` and `max_cost` seconds
+    and returned with a small win-ax style tree, `costs` lists the drawn
+    costs in order.
+    """
+
+    def __init__(self, min_cost=0.0, max_cost=0.0, nodes=10, seed=0, sleep=time.sleep):
+        self.min_cost = min_cost
+        self.max_cost = max_cost
+        self.nodes = nodes
+        self.rng = random.Random(seed)
+        self.sleep = sleep
+        self.costs = []
+
+    def __call__(self):
+        cost = self.rng.uniform(self.min_cost, self.max_cost)
+        self.costs.append(cost)
+        self.sleep(cost)
+        children = [
+            {"name": f"item {i}", "role": "ListItem", "description": "", "value": "",
+             "bbox": {"x": 0, "y": 20 * i, "width": 200, "height": 20}, "children": []}
+            for i in range(self.nodes)
+        ]
+        window = {"name": "fake", "role": "Window", "description": "", "value": "",
+                  "bbox": {"x": 0, "y": 0, "width": 200, "height": 20 * self.nodes}, "children": children}
+        return {"tree": [window], "capture_cost": cost}
+
+
+class RotatingLog:
+    """json-lines log which moves to a new segment every `max_bytes`.
+
+    Segments are named `<stem>-000000<ext>`, `<stem>-000001<ext>`, ... after
+    `path`; `.gz`, `.xz` and `.zst` paths compress every segment. With `keep`
+    only the newest segments are kept. Records are flushed one by one, so a
+    plain or gzip segment which is still being written can be read up to its
+    last record.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, keep=None, level=None):
+        base, compressed_ext = path, ""
+        if compression_for_path(path):
+            base, compressed_ext = os.path.splitext(path)
+        self.stem, self.ext = os.path.splitext(base)
+        self.ext += compressed_ext
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.level = level
+        self.segments = []
+        self.file = None
+        self.written = 0
+
+    def segment_path(self, index):
+        return f"{self.stem}-{index:06d}{self.ext}"
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.file is None or self.written + len(line) > self.max_bytes and self.written:
+            self._rotate()
+        self.file.write(line)
+        self.file.flush()
+        self.written += len(line)
+
+    def _rotate(self):
+        self.close()
+        path = self.segment_path(len(self.segments))
+        self.file = open_file(path, "wb", self.level)
+        self.segments.append(path)
+        self.written = 0
+        if self.keep:
+            for old in self.segments[:-self.keep]:
+                if os.path.exists(old):
+                    os.remove(old)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_records(path):
+    """Yield the records of a log segment, compressed segments are decompressed"""
+    with open_file(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class SnapshotRecorder:
+    """Take snapshots with `capture` at `hz` and write them to `log`.
+
+    `clock` must be monotonic; `clock`, `sleep` and `wall_clock` can be
+    replaced to test the scheduling without waiting.
+    """
+
+    def __init__(self, capture, hz, log, clock=time.monotonic, sleep=time.sleep, wall_clock=time.time):
+        if hz <= 0:
+            raise ValueError("hz must be positive")
+        self.capture = capture
+        self.period = 1.0 / hz
+        self.log = log
+        self.clock = clock
+        self.sleep = sleep
+        self.wall_clock = wall_clock
+        self.records = 0
+        self.skipped = 0
+        self.errors = 0
+        self.durations = []
+
+    def run(self, count=None, duration=None):
+        """Record until `count` snapshots were taken or `duration` seconds passed"""
+        start = self.clock()
+        tick = 0
+        skipped = 0
+        while count is None or self.records + self.errors < count:
+            due = start + tick * self.period
+            if duration is not None and due - start >= duration:
+                break
+            delay = due - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+
+            wall_start = self.wall_clock()
+            capture_start = self.clock()
+            try:
+                data = self.capture()
+            except Exception as e:
+                self.errors += 1
+                print(f"Capture of tick {tick} failed: {e}", file=sys.stderr)
+                data = None
+            finished = self.clock()
+            capture_duration = finished - capture_start
+
+            if data is not None:
+                self.durations.append(capture_duration)
+                self.log.write({
+                    "time": int(wall_start * 1000),
+                    "tick": tick,
+                    "skipped": skipped,
+                    "data": dict({"duration": round(capture_duration * 1000, 3)}, **data),
+                })
+                self.records += 1
+
+            # the ticks which came due during the capture are dropped, the
+            # next snapshot waits for the first tick still ahead
+            next_tick = max(tick + 1, math.floor((finished - start) / self.period) + 1)
+            skipped = next_tick - tick - 1
+            self.skipped += skipped
+            tick = next_tick
+        return self.summary()
+
+    def summary(self):
+        durations = self.durations
+        return {
+            "records": self.records,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "mean_duration": sum(durations) / len(durations) if durations else 0.0,
+            "max_duration": max(durations, default=0.0),
+        }
+
+
+def add_arguments(parser):
+    parser.add_argument('command',
+                      help='Dumper command printing one tree per run, after --',
+                      nargs='*')
+    parser.add_argument('--hz',
+                      help='Snapshots per second',
+                      type=float,
+                      required=True)
+    parser.add_argument('-o', '--out',
+                      help='Log path, segments are numbered after it; .gz, .xz and .zst compress them',
+                      required=True)
+    parser.add_argument('--dumper',
+                      help='Python dumper script with capture_accessibility_tree(), run in-process')
+    parser.add_argument('--cache',
+                      help='Elements whose static attributes the --dumper keeps between snapshots (default: off)',
+                      type=int,
+                      metavar='N')
+    parser.add_argument('--fake',
+                      help='Use a fake backend whose capture takes MIN:MAX seconds',
+                      metavar='MIN:MAX')
+    parser.add_argument('-n', '--count',
+                      help='Stop after this many snapshots',
+                      type=int)
+    parser.add_argument('-d', '--duration',
+                      help='Stop after this many seconds',
+                      type=float)
+    parser.add_argument('--max-bytes',
+                      help='Uncompressed bytes per log segment in MB (default: 64)',
+                      type=int,
+                      default=DEFAULT_MAX_BYTES >> 20)
+    parser.add_argument('--keep',
+                      help='Number of newest log segments to keep (default: all)',
+                      type=int)
+    parser.add_argument('--compact',
+                      help='Compact every snapshot before it is written, see the compact command',
+                      action='store_true')
+    parser.add_argument('--track',
+                      help='Add track ids which persist across snapshots to the nodes, see the track command',
+                      action='store_true')
+    parser.add_argument('-l', '--compress-level',
+                      help='Compression level (default: 6 for gzip and xz, 3 for zstd)',
+                      type=int)
+
+
+def run(args):
+    sources = [bool(args.command), bool(args.dumper), bool(args.fake)]
+    if sum(sources) != 1:
+        print("Give exactly one of a command, --dumper or --fake", file=sys.stderr)
+        sys.exit(2)
+
+    if args.cache and not args.dumper:
+        print("--cache needs --dumper", file=sys.stderr)
+        sys.exit(2)
+
+    if args.dumper:
+        capture = load_dumper(args.dumper, args.cache)
+    elif args.fake:
+        min_cost, _, max_cost = args.fake.partition(':')
+        capture = FakeCapture(float(min_cost), float(max_cost or min_cost))
+    else:
+        capture = command_capture(args.command)
+    if args.compact:
+        capture = compacted_capture(capture, CompactOptions())
+    if args.track:
+        capture = tracked_capture(capture)
+
+    log = RotatingLog(args.out, args.max_bytes << 20, args.keep, args.compress_level)
+    recorder = SnapshotRecorder(capture, args.hz, log)
+    try:
+        recorder.run(args.count, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.close()
+
+    summary = recorder.summary()
+    print(f"Recorded {summary['records']} snapshots, skipped {summary['skipped']} ticks, "
+          f"{summary['errors']} failed captures, capture {summary['mean_duration'] * 1000:.1f} ms mean "
+          f"{summary['max_duration'] * 1000:.1f} ms max, {len(log.segments)} log segments",
+          file=sys.stderr)
@@ -0,0 +1,252 @@
+"""Render a tree as indented text within a token budget, `python -m axtools render`.
+
+Turns any dumper output into one line per node for language model prompts:
+
+    Window "Report.docx - Word" @0,0 1920x1040 [focused]
+      Button "Save" @12,4 24x24
+      … 14 more: 9 Text, 5 Image (212 nodes)
+
+The nodes to show are picked best first in a single pass: a priority queue
+starts with the roots, and every node taken from it puts its children in.
+Priorities favour the path to the focused node and its window (the
+frontmost application on mac-ax), interactive roles, text,
+visible nodes, subtrees with many interactive nodes and shallow nodes. A
+node is shown when its line still fits into the budget, with room kept for
+a summary line of every node whose children are not all shown. The summary
+lists the number of children left out, their most common roles and the size
+of their subtrees, so the model knows what was elided. The budget is
+counted in characters, `--tokens` assumes four characters per token.
+"""
+import heapq
+import json
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from axtools import tree as axtree
+from axtools.geometry import screen_rects
+from axtools.query import normalize_role
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKENS = 4000
+INDENT = "  "
+NAME_LENGTH = 60
+VALUE_LENGTH = 40
+# summary lines are cut to this length, the budget keeps room for them
+SUMMARY_LENGTH = 56
+
+INTERACTIVE_ROLES = frozenset({
+    "button", "pushbutton", "togglebutton", "menubutton", "splitbutton", "popupbutton",
+    "checkbox", "checkbutton", "radiobutton", "radiomenuitem", "checkmenuitem",
+    "edit", "textfield", "textarea", "entry", "passwordtext", "searchfield", "combobox",
+    "link", "menuitem", "tabitem", "pagetab", "listitem", "treeitem", "row", "cell",
+    "slider", "spinbutton", "spinner", "incrementor", "scrollbar", "hyperlink",
+})
+# win-ax states shown on the line when they are true
+SHOWN_STATES = ("focused", "keyboard_focused", "selected", "checked", "expanded", "pressed")
+
+ROOT_SCORE = 1e6
+FOCUS_SCORE = 1000.0
+INTERACTIVE_SCORE = 20.0
+TEXT_SCORE = 5.0
+VISIBLE_SCORE = 10.0
+INVISIBLE_SCORE = -50.0
+SUBTREE_SCORE = 4.0
+DEPTH_SCORE = -2.0
+
+
+def focused_nodes(flat):
+    """Mask of the focused nodes.
+
+    win-ax nodes carry focus states; mac-ax lists the applications front to
+    back, so the first one counts as focused; linux-ax has no focus
+    information.
+    """
+    focused = np.zeros(len(flat), dtype=bool)
+    if flat.schema == axtree.WIN:
+        for index, node in enumerate(flat.nodes):
+            states = node.get("states") or {}
+            if states.get("focused") or states.get("keyboard_focused"):
+                focused[index] = True
+    elif flat.schema == axtree.MAC and flat.roots:
+        focused[flat.roots[0]] = True
+    return focused
+
+
+def node_scores(flat, rects):
+    """Priority of every node, higher is shown first"""
+    count = len(flat)
+    roles = [normalize_role(role) for role in flat.roles]
+    interactive = np.fromiter((role in INTERACTIVE_ROLES for role in roles), dtype=bool, count=count)
+    has_text = np.fromiter((bool(node.get("name") or node.get("value")) for node in flat.nodes),
+                           dtype=bool, count=count)
+    visible = ~np.isnan(rects).any(axis=1) & (rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1])
+    for index, node in enumerate(flat.nodes):
+        if (node.get("states") or {}).get("visible") is False or \
+                ("visible_bbox" in node and node["visible_bbox"] is None):
+            visible[index] = False
+
+    interactive_below = axtree.subtree_sums(flat, interactive.astype(np.int64)) - interactive
+    scores = (INTERACTIVE_SCORE * interactive
+              + TEXT_SCORE * has_text
+              + np.where(visible, VISIBLE_SCORE, INVISIBLE_SCORE)
+              + SUBTREE_SCORE * np.log2(1 + interactive_below)
+              + DEPTH_SCORE * flat.depth)
+
+    # the path to the focused node comes first, then the rest of its window
+    # ranks above every other window
+    focus_path = axtree.subtree_sums(flat, focused_nodes(flat).astype(np.int64)) > 0
+    anchors = np.array(flat.roots, dtype=np.int64)
+    root_of = anchors[np.searchsorted(anchors, np.arange(count), side="right") - 1] if count else anchors
+    scores += FOCUS_SCORE * (focus_path.astype(np.float64) + focus_path[root_of])
+    scores[flat.roots] += ROOT_SCORE
+    return scores
+
+
+def display_role(role):
+    role = role or "?"
+    return role[2:] if role.startswith("AX") else role
+
+
+def _shorten(text, length):
+    text = " ".join(str(text).split())
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+
+def node_line(node, rect, depth, bbox=True):
+    parts = [INDENT * depth + display_role(node.get("role"))]
+    name = node.get("name")
+    if name:
+        parts.append(json.dumps(_shorten(name, NAME_LENGTH), ensure_ascii=False))
+    value = node.get("value")
+    if value not in (None, "") and value != name and not isinstance(value, (dict, list)):
+        parts.append("= " + json.dumps(_shorten(value, VALUE_LENGTH), ensure_ascii=False))
+    if bbox and not np.isnan(rect).any():
+        x0, y0, x1, y1 = (int(round(value)) for value in rect.tolist())
+        parts.append(f"@{x0},{y0} {x1 - x0}x{y1 - y0}")
+    states = node.get("states") or {}
+    flags = [state for state in SHOWN_STATES if states.get(state) is True]
+    if states.get("enabled") is False or node.get("enabled") is False:
+        flags.append("disabled")
+    if flags:
+        parts.append(f"[{', '.join(flags)}]")
+    return " ".join(parts)
+
+
+def summary_line(omitted, roles, sizes, depth):
+    counts = Counter(display_role(roles[index]) for index in omitted)
+    kinds = ", ".join(f"{count} {role}" for role, count in counts.most_common(2))
+    nodes = int(sizes[omitted].sum())
+    text = f"… {len(omitted)} more: {kinds} ({nodes} nodes)"
+    return INDENT * depth + _shorten(text, SUMMARY_LENGTH)
+
+
+def _summary_cost(depth):
+    return len(INDENT) * depth + SUMMARY_LENGTH + 1
+
+
+def select_nodes(flat, scores, line, max_chars):
+    """Pick the nodes to show, best first, within max_chars.
+
+    `line(index)` renders a node; it is only called for the nodes which
+    reach the head of the queue. Returns the shown mask and the lines.
+    """
+    children = [[] for _ in range(len(flat))]
+    for index, parent in enumerate(flat.parent.tolist()):
+        if parent >= 0:
+            children[parent].append(index)
+
+    shown = np.zeros(len(flat), dtype=bool)
+    lines = {}
+    # children not shown yet per shown node, -1 stands for the roots
+    pending = {-1: len(flat.roots)}
+    reserved = _summary_cost(0) if flat.roots else 0
+    used = 0
+    queue = [(-scores[root], root) for root in flat.roots]
+    heapq.heapify(queue)
+    while queue:
+        _, index = heapq.heappop(queue)
+        text = line(index)
+        parent = int(flat.parent[index])
+        depth = int(flat.depth[index])
+        cost = len(text) + 1
+        # showing the last pending child makes the parent's summary unnecessary
+        freed = _summary_cost(depth) if pending[parent] == 1 else 0
+        needed = _summary_cost(depth + 1) if children[index] else 0
+        if used + reserved + cost + needed - freed > max_chars:
+            continue
+        shown[index] = True
+        lines[index] = text
+        used += cost
+        reserved += needed - freed
+        pending[parent] -= 1
+        pending[index] = len(children[index])
+        for child in children[index]:
+            heapq.heappush(queue, (-scores[child], child))
+    return shown, lines, children
+
+
+def render_text(document, max_chars=DEFAULT_TOKENS * CHARS_PER_TOKEN, bbox=True):
+    """Render any dumper output as indented text of at most max_chars characters.
+
+    Returns the text and the number of nodes shown and in the tree.
+    """
+    flat = axtree.flatten(document)
+    rects = screen_rects(flat)
+    scores = node_scores(flat, rects)
+    sizes = axtree.subtree_sums(flat, np.ones(len(flat), dtype=np.int64))
+    roles = flat.roles
+
+    def line(index):
+        return node_line(flat.nodes[index], rects[index], int(flat.depth[index]), bbox)
+
+    shown, lines, children = select_nodes(flat, scores, line, max_chars)
+
+    output = []
+    open_nodes = []
+
+    def close(index):
+        omitted = [child for child in children[index] if not shown[child]]
+        if omitted:
+            output.append(summary_line(omitted, roles, sizes, int(flat.depth[index]) + 1))
+
+    end = np.arange(len(flat)) + sizes
+    for index in np.flatnonzero(shown).tolist():
+        while open_nodes and index >= end[open_nodes[-1]]:
+            close(open_nodes.pop())
+        output.append(lines[index])
+        open_nodes.append(index)
+    while open_nodes:
+        close(open_nodes.pop())
+    omitted_roots = [root for root in flat.roots if not shown[root]]
+    if omitted_roots:
+        output.append(summary_line(omitted_roots, roles, sizes, 0))
+    return "\n".join(output), int(shown.sum()), len(flat)
+
+
+def add_arguments(parser):
+    parser.add_argument('tree',
+                      help='Dump of any dumper, plain or event format')
+    parser.add_argument('-t', '--tokens',
+                      help=f'Token budget, {CHARS_PER_TOKEN} characters per token (default: {DEFAULT_TOKENS})',
+                      type=int,
+                      default=DEFAULT_TOKENS)
+    parser.add_argument('-c', '--chars',
+                      help='Character budget, overrides --tokens',
+                      type=int)
+    parser.add_argument('--no-bbox',
+                      help='Leave the screen rectangles out of the lines',
+                      action='store_true')
+
+
+def run(args):
+    document = axtree.load(args.tree)
+    max_chars = args.chars if args.chars is not None else args.tokens * CHARS_PER_TOKEN
+    start = time.perf_counter()
+    text, shown, total = render_text(document, max_chars, not args.no_bbox)
+    elapsed = time.perf_counter() - start
+    sys.stdout.write(text + "\n")
+    print(f"Rendered {shown} of {total} nodes in {len(text)} characters in {elapsed * 1000:.1f} ms",
+          file=sys.stderr)
@@ -0,0 +1,46 @@
+"""Search the text index, `python -m axtools search INDEX QUERY`.
+
+Prints the nodes whose name, description or value match, oldest snapshot
+first. All words must match, `"quoted words"` match as a phrase and `word*`
+as a prefix. See `axtools.textindex` for building the index.
+"""
+import datetime
+import os
+import sys
+
+from axtools.textindex import TextIndex
+
+
+def format_time(milliseconds):
+    return datetime.datetime.fromtimestamp(milliseconds / 1000).isoformat(timespec="milliseconds")
+
+
+def add_arguments(parser):
+    parser.add_argument('index',
+                      help='Index file written by the index command')
+    parser.add_argument('query',
+                      help='Words, "a phrase" or prefix*')
+    parser.add_argument('-n', '--limit',
+                      help='Print at most this many matches',
+                      type=int)
+    parser.add_argument('-t', '--timeline',
+                      help='Print the snapshots with matches and their number of matching nodes',
+                      action='store_true')
+
+
+def run(args):
+    if not os.path.exists(args.index):
+        print(f"No index at {args.index}", file=sys.stderr)
+        sys.exit(2)
+
+    with TextIndex(args.index) as index:
+        if args.timeline:
+            rows = index.timeline(args.query)
+            for snapshot_time, source, count in rows[:args.limit]:
+                print(f"{format_time(snapshot_time)}\t{source}\t{count}")
+        else:
+            rows = index.search(args.query, args.limit)
+            for snapshot_time, source, path, role, label in rows:
+                print(f"{format_time(snapshot_time)}\t{source}\t{path}\t{role}\t{label}")
+    if not rows:
+        sys.exit(1)
@@ -0,0 +1,124 @@
+"""Incremental loading of dump files into the SQLite files of the tools.
+
+`SnapshotStore` keeps a `sources` table with the size, modification time and
+number of records of every file it read, so a file is only read again when
+it changed. Record logs (`.jsonl` files of `axtools record`, compressed or
+not) are appended to while they are recorded: when one grew, only its new
+records are read. Any other changed file, and a record log which shrank, was
+replaced; its snapshots are deleted and the whole file is read again. The
+text index and the SQLite export are both built on it.
+"""
+import json
+import os
+import sqlite3
+
+from axtools.compressed import compression_for_path, open_file
+
+SOURCES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    records INTEGER NOT NULL
+);
+"""
+
+
+def is_record_log(path):
+    """True for json-lines paths, whose records are only ever appended"""
+    if compression_for_path(path):
+        path = os.path.splitext(path)[0]
+    return os.path.splitext(path)[1].lower() == ".jsonl"
+
+
+def read_snapshots(path, skip=0):
+    """Yield (record number, time in ms, document) of the snapshots in a file.
+
+    Record logs (json lines) yield one snapshot per line, other files a
+    single one; the first `skip` records are not parsed. Snapshots without
+    an event time get the file modification time.
+    """
+    mtime = int(os.stat(path).st_mtime * 1000)
+    with open_file(path) as f:
+        first = f.readline()
+        try:
+            document = json.loads(first)
+        except ValueError:
+            # a json document spread over several lines
+            document = json.loads(first + f.read())
+            yield 0, _snapshot_time(document, mtime), document
+            return
+        if skip == 0:
+            yield 0, _snapshot_time(document, mtime), document
+        for number, line in enumerate(f, 1):
+            if number >= skip and line.strip():
+                document = json.loads(line)
+                yield number, _snapshot_time(document, mtime), document
+
+
+def _snapshot_time(document, default):
+    if isinstance(document, dict) and isinstance(document.get("time"), (int, float)):
+        return int(document["time"])
+    return default
+
+
+class SnapshotStore:
+    """SQLite file of the snapshots read from dump files.
+
+    Subclasses add their tables to `schema` (with `snapshots (id, source,
+    ...)` and `nodes (id, snapshot, ...)`) and implement `_add_snapshot`,
+    which inserts one snapshot and returns its number of nodes. Rows which
+    point to nodes are removed by extending `_delete_source`.
+    """
+
+    schema = ""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SOURCES_SCHEMA + self.schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def add_file(self, path):
+        """Add the snapshots of a file which were not added yet, return (snapshots, nodes)"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.db.execute("SELECT size, mtime_ns, records FROM sources WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return 0, 0
+        resume = row is not None and is_record_log(path) and stat.st_size > row[0]
+        known_records = row[2] if resume else 0
+
+        snapshots = 0
+        nodes = 0
+        records = known_records
+        # one transaction per file, a failed file leaves the database unchanged
+        with self.db:
+            if row is not None and not resume:
+                self._delete_source(path)
+            for record, snapshot_time, document in read_snapshots(path, known_records):
+                records = max(records, record + 1)
+                nodes += self._add_snapshot(path, record, snapshot_time, document)
+                snapshots += 1
+            self.db.execute(
+                "INSERT OR REPLACE INTO sources (path, size, mtime_ns, records) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, records),
+            )
+        return snapshots, nodes
+
+    def _add_snapshot(self, source, record, snapshot_time, document):
+        raise NotImplementedError
+
+    def _delete_source(self, path):
+        """Delete the snapshots and nodes read from a replaced file"""
+        self.db.execute("DELETE FROM nodes WHERE snapshot IN (SELECT id FROM snapshots WHERE source = ?)", (path,))
+        self.db.execute("DELETE FROM snapshots WHERE source = ?", (path,))
@@ -0,0 +1,196 @@
+"""Export snapshots to SQLite tables, `python -m axtools export-sqlite DB FILES`.
+
+Flattens the trees of any dumper into one row per node, so analysis jobs
+read them with a single query instead of walking nested json:
+
+    pandas.read_sql("SELECT * FROM nodes WHERE role = 'Button'", sqlite3.connect("dumps.db"))
+
+`snapshots` has one row per snapshot (source file, record number, time,
+capture duration, schema and node count). `nodes` has the node id, its
+snapshot, the parent node id (NULL for roots), depth, position in the
+pre-order of the snapshot, role, name, description, value, the screen
+rectangle as x, y, width and height, the `track_id` of `axtools track` and
+one column per win-ax state (1, 0 or NULL when the dumper did not read it).
+Values which are not text are stored as json.
+
+Rows are bulk inserted with `executemany`, one transaction per file.
+Exports are incremental like the text index, see `axtools.sources`: files
+which did not change since they were exported are skipped, record logs only
+add their new records, so the database can be appended to while a recording
+grows, and other files which changed replace their snapshots. The role,
+name and snapshot indexes are created after the first load and kept up to
+date by SQLite afterwards.
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from axtools import tree as axtree
+from axtools.geometry import screen_rects
+from axtools.sources import SnapshotStore
+
+# win-ax states in the order of get_control_states
+STATES = (
+    "enabled", "visible", "focused", "minimized", "maximized", "collapsed", "expanded", "selected",
+    "checked", "checkable", "editable", "pressable", "pressed", "keyboard_focusable", "keyboard_focused",
+    "selection_required",
+)
+NODE_COLUMNS = (
+    "id", "snapshot", "parent", "depth", "position", "role", "name", "description", "value",
+    "x", "y", "width", "height", "track_id",
+) + tuple(f"state_{state}" for state in STATES)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    record INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    duration REAL,
+    schema TEXT NOT NULL,
+    nodes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    snapshot INTEGER NOT NULL,
+    parent INTEGER,
+    depth INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT,
+    name TEXT,
+    description TEXT,
+    value TEXT,
+    x REAL,
+    y REAL,
+    width REAL,
+    height REAL,
+    track_id INTEGER,
+    {", ".join(f"state_{state} INTEGER" for state in STATES)}
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (time);
+CREATE INDEX IF NOT EXISTS nodes_snapshot ON nodes (snapshot);
+CREATE INDEX IF NOT EXISTS nodes_role ON nodes (role);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes (name);
+"""
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+STATE_COLUMNS = {state: index for index, state in enumerate(STATES)}
+NO_STATES = (None,) * len(STATES)
+
+
+def state_values(states):
+    """State columns of a node, only the states it has are looked at"""
+    if not states:
+        return NO_STATES
+    values = list(NO_STATES)
+    for state, value in states.items():
+        column = STATE_COLUMNS.get(state)
+        if column is not None and isinstance(value, bool):
+            values[column] = int(value)
+    return values
+
+
+def _duration(document):
+    if isinstance(document, dict):
+        data = document.get("data")
+        if isinstance(data, dict) and isinstance(data.get("duration"), (int, float)):
+            return float(data["duration"])
+    return None
+
+
+def node_rows(flat, snapshot_id, first_id):
+    """Rows of the nodes table for a FlatTree, ids count up from first_id in pre-order"""
+    count = len(flat)
+    ids = np.arange(first_id, first_id + count, dtype=np.int64)
+    parents = np.where(flat.parent >= 0, flat.parent + first_id, -1).tolist()
+    rects = screen_rects(flat)
+    boxes = np.column_stack([rects[:, :2], rects[:, 2:] - rects[:, :2]]).tolist()
+    missing = np.isnan(rects).any(axis=1).tolist()
+    depths = flat.depth.tolist()
+
+    rows = []
+    for position, (node_id, node, parent, depth, box) in enumerate(
+            zip(ids.tolist(), flat.nodes, parents, depths, boxes)):
+        if missing[position]:
+            box = (None, None, None, None)
+        rows.append((
+            node_id, snapshot_id, parent if parent >= 0 else None, depth, position,
+            _text(node.get("role")), _text(node.get("name")), _text(node.get("description")),
+            _text(node.get("value")), *box, node.get("track_id"),
+            *state_values(node.get("states")),
+        ))
+    return rows
+
+
+class SnapshotDatabase(SnapshotStore):
+    """Snapshots and their nodes in a SQLite file"""
+
+    schema = SCHEMA
+
+    def __init__(self, path):
+        super().__init__(path)
+        insert_columns = ", ".join(NODE_COLUMNS)
+        self._insert_nodes = (f"INSERT INTO nodes ({insert_columns}) "
+                              f"VALUES ({', '.join('?' * len(NODE_COLUMNS))})")
+
+    def create_indexes(self):
+        self.db.executescript(INDEXES)
+
+    def _add_snapshot(self, source, record, snapshot_time, document):
+        return self.add_snapshot(document, source, record, snapshot_time)
+
+    def add_snapshot(self, document, source="", record=0, snapshot_time=None):
+        """Insert one snapshot in the current transaction, return its number of nodes"""
+        flat = axtree.flatten(document)
+        if snapshot_time is None:
+            snapshot_time = int(time.time() * 1000)
+        cursor = self.db.execute(
+            "INSERT INTO snapshots (source, record, time, duration, schema, nodes) VALUES (?, ?, ?, ?, ?, ?)",
+            (source, record, snapshot_time, _duration(document), flat.schema, len(flat)),
+        )
+        first_id = self.db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM nodes").fetchone()[0]
+        self.db.executemany(self._insert_nodes, node_rows(flat, cursor.lastrowid, first_id))
+        return len(flat)
+
+
+def add_arguments(parser):
+    parser.add_argument('database',
+                      help='SQLite file, created when missing')
+    parser.add_argument('files',
+                      help='Dumps and record logs to add, unchanged files are skipped',
+                      nargs='+')
+
+
+def run(args):
+    start = time.perf_counter()
+    snapshots = 0
+    nodes = 0
+    failed = 0
+    with SnapshotDatabase(args.database) as database:
+        for path in args.files:
+            try:
+                added_snapshots, added_nodes = database.add_file(path)
+            except (OSError, ValueError) as e:
+                failed += 1
+                print(f"Failed to export {path}: {e}", file=sys.stderr)
+                continue
+            snapshots += added_snapshots
+            nodes += added_nodes
+        database.create_indexes()
+    elapsed = time.perf_counter() - start
+    print(f"Exported {snapshots} snapshots with {nodes} nodes from {len(args.files) - failed} files "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,250 @@
+"""On-disk inverted index over the text of recorded snapshots.
+
+`python -m axtools index INDEX FILES` adds snapshots to an index file and
+`python -m axtools search INDEX QUERY` answers "when did this text appear".
+The `name`, `description` and `value` of every node are tokenized into
+lowercase word terms. The index is a SQLite file with a term table and a
+postings table clustered by term, every posting points to a node (its
+snapshot time, source file and path of child indices from the root) and the
+field and position of the term, so phrases are matched on consecutive
+positions and prefixes on a range of the sorted terms.
+
+Indexing is incremental, see `axtools.sources`: files which did not change
+since they were added are skipped, record logs of `axtools record` only add
+their new records and other files which changed replace their snapshots.
+Plain dumps, event-format dumps and record logs of all dumpers are read,
+compressed files included.
+"""
+import re
+import sys
+import time
+
+from axtools import tree as axtree
+from axtools.sources import SnapshotStore
+
+FIELDS = ("name", "description", "value")
+# stored with the node to show what matched, the postings hold the full text
+LABEL_LENGTH = 200
+
+_WORD = re.compile(r"\w+")
+_QUERY = re.compile(r'"(?P<phrase>[^"]*)"|(?P<word>\S+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    record INTEGER NOT NULL,
+    time INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (time);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    snapshot INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    role TEXT,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term INTEGER NOT NULL,
+    node INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (term, node, field, position)
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def _field_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def walk_text(document):
+    """Yield (path, node, [(field, tokens)]) of the nodes which have text.
+
+    Nodes which are not dicts are skipped, documents which are neither a
+    dict nor a list raise ValueError.
+    """
+    if not isinstance(document, (dict, list)):
+        raise ValueError(f"Not an accessibility tree: {type(document).__name__}")
+    stack = [(str(index), root) for index, root in reversed(list(enumerate(axtree.tree_roots(document))))]
+    while stack:
+        path, node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        fields = []
+        for field_id, field_name in enumerate(FIELDS):
+            text = _field_text(node.get(field_name))
+            if text:
+                tokens = tokenize(text)
+                if tokens:
+                    fields.append((field_id, tokens))
+        if fields:
+            yield path, node, fields
+        children = axtree.node_children(node)
+        stack.extend((f"{path}/{index}", child) for index, child in reversed(list(enumerate(children))))
+
+
+class TextIndex(SnapshotStore):
+    """Inverted index of snapshot texts in a SQLite file"""
+
+    schema = SCHEMA
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._terms = None
+
+    def _term_ids(self):
+        if self._terms is None:
+            self._terms = dict(self.db.execute("SELECT term, id FROM terms"))
+        return self._terms
+
+    def _add_snapshot(self, source, record, snapshot_time, document):
+        cursor = self.db.execute(
+            "INSERT INTO snapshots (source, record, time) VALUES (?, ?, ?)", (source, record, snapshot_time)
+        )
+        snapshot_id = cursor.lastrowid
+        node_id = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM nodes").fetchone()[0]
+        term_ids = self._term_ids()
+        new_terms = []
+        nodes = []
+        postings = set()
+        for path, node, fields in walk_text(document):
+            node_id += 1
+            label = _field_text(node.get("name")) or _field_text(node.get("value")) or ""
+            nodes.append((node_id, snapshot_id, path, node.get("role"), label[:LABEL_LENGTH]))
+            for field_id, tokens in fields:
+                for position, token in enumerate(tokens):
+                    term_id = term_ids.get(token)
+                    if term_id is None:
+                        term_id = term_ids[token] = len(term_ids) + 1
+                        new_terms.append((term_id, token))
+                    postings.add((term_id, node_id, field_id, position))
+        self.db.executemany("INSERT INTO terms (id, term) VALUES (?, ?)", new_terms)
+        self.db.executemany("INSERT INTO nodes (id, snapshot, path, role, label) VALUES (?, ?, ?, ?, ?)", nodes)
+        self.db.executemany("INSERT INTO postings (term, node, field, position) VALUES (?, ?, ?, ?)",
+                            sorted(postings))
+        return len(nodes)
+
+    def _delete_source(self, path):
+        self.db.execute(
+            "DELETE FROM postings WHERE node IN (SELECT nodes.id FROM nodes JOIN snapshots "
+            "ON snapshots.id = nodes.snapshot WHERE snapshots.source = ?)", (path,)
+        )
+        super()._delete_source(path)
+
+    def forget_terms(self):
+        """Drop the cached term ids, needed after a failed add_file rolled back"""
+        self._terms = None
+
+    def search(self, query, limit=None):
+        """Get (time, source, path, role, label) of the nodes matching the query, oldest first.
+
+        Words must all appear in the node, `"quoted words"` as a phrase in
+        one field and `word*` is a prefix.
+        """
+        clauses, params = self._query_sql(query)
+        if not clauses:
+            return []
+        sql = (
+            "SELECT snapshots.time, snapshots.source, nodes.path, nodes.role, nodes.label "
+            "FROM nodes JOIN snapshots ON snapshots.id = nodes.snapshot "
+            f"WHERE nodes.id IN ({' INTERSECT '.join(clauses)}) "
+            "ORDER BY snapshots.time, nodes.id"
+        )
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.db.execute(sql, params).fetchall()
+
+    def timeline(self, query):
+        """Get (time, source, matching nodes) of every snapshot with a match"""
+        clauses, params = self._query_sql(query)
+        if not clauses:
+            return []
+        sql = (
+            "SELECT snapshots.time, snapshots.source, COUNT(*) "
+            "FROM nodes JOIN snapshots ON snapshots.id = nodes.snapshot "
+            f"WHERE nodes.id IN ({' INTERSECT '.join(clauses)}) "
+            "GROUP BY snapshots.id ORDER BY snapshots.time"
+        )
+        return self.db.execute(sql, params).fetchall()
+
+    def _query_sql(self, query):
+        clauses = []
+        params = []
+        for match in _QUERY.finditer(query):
+            if match.group("phrase") is not None:
+                tokens = tokenize(match.group("phrase"))
+                if len(tokens) > 1:
+                    clauses.append(self._phrase_sql(len(tokens)))
+                    params.extend(tokens)
+                    continue
+            else:
+                word = match.group("word")
+                if word.endswith("*"):
+                    tokens = tokenize(word[:-1])
+                    if len(tokens) == 1:
+                        clauses.append(
+                            "SELECT postings.node FROM terms JOIN postings ON postings.term = terms.id "
+                            "WHERE terms.term >= ? AND terms.term < ?"
+                        )
+                        params.extend((tokens[0], tokens[0] + "\U0010ffff"))
+                        continue
+                tokens = tokenize(word)
+            for token in tokens:
+                clauses.append(
+                    "SELECT postings.node FROM terms JOIN postings ON postings.term = terms.id WHERE terms.term = ?"
+                )
+                params.append(token)
+        return clauses, params
+
+    @staticmethod
+    def _phrase_sql(length):
+        # every following word at the next position of the same field
+        joins = []
+        for index in range(length):
+            alias = f"p{index}"
+            joins.append(f"JOIN terms t{index} ON t{index}.term = ? "
+                         f"JOIN postings {alias} ON {alias}.term = t{index}.id")
+            if index:
+                joins[-1] += (f" AND {alias}.node = p0.node AND {alias}.field = p0.field"
+                              f" AND {alias}.position = p0.position + {index}")
+        first, *rest = joins
+        return f"SELECT p0.node FROM (SELECT 1) {first} {' '.join(rest)}"
+
+
+def add_arguments(parser):
+    parser.add_argument('index',
+                      help='Index file, created when missing')
+    parser.add_argument('files',
+                      help='Dumps and record logs to add, unchanged files are skipped',
+                      nargs='+')
+
+
+def run(args):
+    start = time.perf_counter()
+    added = 0
+    failed = 0
+    with TextIndex(args.index) as index:
+        for path in args.files:
+            try:
+                added += index.add_file(path)[0]
+            except (OSError, ValueError) as e:
+                index.forget_terms()
+                failed += 1
+                print(f"Failed to index {path}: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {added} snapshots from {len(args.files) - failed} files in {elapsed:.2f}s", file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,128 @@
+"""Chrome trace-event output of the dumpers (chrome://tracing, Perfetto).
+
+Shared by win-ax and mac-ax. Spans are written as complete ("X") events with the id and name of the
+thread they ran on. Per-node spans go through `sample()`, which returns the
+tracer for every Nth node and a no-op tracer for the rest, so tracing large
+trees stays cheap.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """Tracer which records nothing, used while tracing is off"""
+
+    enabled = False
+
+    def span(self, name, cat, args=None):
+        return NULL_SPAN
+
+    def instant(self, name, cat, args=None):
+        pass
+
+    def sample(self):
+        return self
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        event = self.tracer.event(self.name, self.cat, "X", self.start, self.args)
+        event["dur"] = (end - self.start) / 1000
+        if exc_type is not None:
+            event.setdefault("args", {})["error"] = repr(exc)
+        return False
+
+
+class Tracer:
+    """Collect trace events of all threads, `every` sets the node sampling"""
+
+    enabled = True
+
+    def __init__(self, every=1):
+        self.every = max(every, 1)
+        self.events = []
+        self.pid = os.getpid()
+        self.threads = set()
+        self.nodes = itertools.count()
+
+    def span(self, name, cat, args=None):
+        return _Span(self, name, cat, args)
+
+    def instant(self, name, cat, args=None):
+        event = self.event(name, cat, "i", time.perf_counter_ns(), args)
+        event["s"] = "t"
+
+    def sample(self):
+        """Get the tracer for every Nth call and the no-op tracer otherwise"""
+        if next(self.nodes) % self.every == 0:
+            return self
+        return NULL_TRACER
+
+    def event(self, name, cat, phase, timestamp, args):
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads.add(tid)
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                "args": {"name": threading.current_thread().name},
+            })
+        event = {"name": name, "cat": cat, "ph": phase, "ts": timestamp / 1000, "pid": self.pid, "tid": tid}
+        if args:
+            event["args"] = dict(args)
+        # list.append is atomic, the worker threads do not need a lock
+        self.events.append(event)
+        return event
+
+    def merge(self, path):
+        """Add the events of a trace file, e.g. of a child process"""
+        with open(path, encoding="utf-8") as f:
+            self.events.extend(json.load(f)["traceEvents"])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, f)
+
+
+_tracer = NULL_TRACER
+
+
+def set_tracer(new_tracer):
+    """Replace the tracer the dumper reports to"""
+    global _tracer
+    _tracer = new_tracer
+
+
+def get_tracer():
+    return _tracer
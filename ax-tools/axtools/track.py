@@ -0,0 +1,263 @@
+"""Persistent track ids across snapshots, `python -m axtools track`.
+
+Gives every node a `track_id` which stays the same while the element stays
+on screen, so "this button in snapshot N" can be followed into snapshot
+N+1. win-ax and linux-ax nodes have no ids of their own and the mac-ax ids
+change with the position, so the nodes of a snapshot are aligned with the
+previous one in a few linear passes, first match wins:
+
+1. identity: nodes with a backend identity (the win-ax `runtime_id`, written
+   while the element cache is on) keep the track of the same identity
+2. subtree: subtrees whose hash of roles, names and values is unique in
+   both snapshots are matched node by node
+3. path: below matched parents, children are matched by role and name, in
+   sibling order
+4. overlap: the remaining children of the same role are matched in sibling
+   order when their rectangles overlap by at least `MIN_OVERLAP`
+5. moved: nodes with the same role, name and rectangle anywhere in the tree
+
+The other nodes start new tracks. Every pass looks nodes up in dicts built
+once per snapshot, so a snapshot costs O(n) instead of comparing all pairs.
+"""
+import json
+import sys
+import time
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+
+from axtools import tree as axtree
+from axtools.compressed import open_file
+from axtools.sources import read_snapshots
+
+IDENTITY_KEYS = ("runtime_id",)
+# intersection over union of the rectangles for matches on role and order only
+MIN_OVERLAP = 0.5
+PASSES = ("identity", "subtree", "path", "overlap", "moved", "new")
+
+
+def node_identity(node):
+    for key in IDENTITY_KEYS:
+        identity = node.get(key)
+        if identity:
+            return tuple(identity) if isinstance(identity, list) else identity
+    return None
+
+
+def _label(node):
+    name = node.get("name")
+    return name if isinstance(name, str) else ""
+
+
+def subtree_hashes(flat):
+    """Hash of role, name, value and child hashes of every node, geometry left out"""
+    hashes = [0] * len(flat)
+    children = [[] for _ in range(len(flat))]
+    parent = flat.parent.tolist()
+    for index in range(len(flat) - 1, -1, -1):
+        node = flat.nodes[index]
+        value = node.get("value")
+        if not isinstance(value, (str, int, float)):
+            value = None
+        # children were added in reverse pre-order
+        hashes[index] = hash((node.get("role"), _label(node), value, tuple(reversed(children[index]))))
+        if parent[index] >= 0:
+            children[parent[index]].append(hashes[index])
+    return hashes
+
+
+def _moved_key(node, rect):
+    # NaN never equals itself, nodes without a rectangle are not matched here
+    return node.get("role"), _label(node), tuple(rect)
+
+
+def overlap(a, b):
+    """Intersection over union of two rectangles, 1 when both have none"""
+    a_missing, b_missing = np.isnan(a).any(), np.isnan(b).any()
+    if a_missing or b_missing:
+        return 1.0 if a_missing and b_missing else 0.0
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 1.0
+
+
+class _Previous:
+    """The previous snapshot with the lookups of the matching passes"""
+
+    def __init__(self, flat, tracks):
+        self.flat = flat
+        self.tracks = tracks
+        self.used = np.zeros(len(flat), dtype=bool)
+        self.children = defaultdict(list)
+        for index, parent in enumerate(flat.parent.tolist()):
+            self.children[parent].append(index)
+        self.rects = flat.rects.tolist()
+        self.identities = {}
+        self.moved = defaultdict(deque)
+        for index, node in enumerate(flat.nodes):
+            identity = node_identity(node)
+            if identity is not None:
+                self.identities[identity] = index
+            self.moved[_moved_key(node, self.rects[index])].append(index)
+        # per parent, built when its children are first matched
+        self.by_label = {}
+        self.by_role = {}
+
+    def groups(self, parent):
+        if parent not in self.by_label:
+            by_label = defaultdict(deque)
+            by_role = defaultdict(deque)
+            for child in self.children.get(parent, ()):
+                node = self.flat.nodes[child]
+                by_label[node.get("role"), _label(node)].append(child)
+                by_role[node.get("role")].append(child)
+            self.by_label[parent] = by_label
+            self.by_role[parent] = by_role
+        return self.by_label[parent], self.by_role[parent]
+
+    def take(self, queue):
+        """First index of the queue not matched yet, None when there is none"""
+        while queue and self.used[queue[0]]:
+            queue.popleft()
+        return queue[0] if queue else None
+
+
+class Tracker:
+    """Assigns track ids to the nodes of a sequence of snapshots.
+
+    `update(document)` writes `track_id` into every node of the document
+    and returns the number of nodes matched by every pass.
+    """
+
+    def __init__(self, min_overlap=MIN_OVERLAP):
+        self.min_overlap = min_overlap
+        self.previous = None
+        self.next_track = 1
+
+    def update(self, document):
+        flat = axtree.flatten(document)
+        count = len(flat)
+        tracks = np.zeros(count, dtype=np.int64)
+        matched = np.full(count, -1, dtype=np.int64)
+        counts = Counter()
+        previous = _Previous(self.previous[0], self.previous[1]) if self.previous else None
+
+        def match(index, old, kind):
+            matched[index] = old
+            tracks[index] = previous.tracks[old]
+            previous.used[old] = True
+            counts[kind] += 1
+
+        if previous is not None:
+            self._match_identity(flat, previous, matched, match)
+            self._match_subtrees(flat, previous, matched, match)
+            self._match_top_down(flat, previous, matched, match)
+
+        for index in np.flatnonzero(tracks == 0).tolist():
+            tracks[index] = self.next_track
+            self.next_track += 1
+            counts["new"] += 1
+        for node, track in zip(flat.nodes, tracks.tolist()):
+            node["track_id"] = track
+        self.previous = (flat, tracks)
+        return {kind: counts[kind] for kind in PASSES}
+
+    @staticmethod
+    def _match_identity(flat, previous, matched, match):
+        if not previous.identities:
+            return
+        for index, node in enumerate(flat.nodes):
+            identity = node_identity(node)
+            old = previous.identities.get(identity) if identity is not None else None
+            if old is not None and not previous.used[old]:
+                match(index, old, "identity")
+
+    @staticmethod
+    def _match_subtrees(flat, previous, matched, match):
+        hashes = subtree_hashes(flat)
+        old_hashes = subtree_hashes(previous.flat)
+        counts = Counter(hashes)
+        old_counts = Counter(old_hashes)
+        old_index = {value: index for index, value in enumerate(old_hashes) if old_counts[value] == 1}
+        sizes = axtree.subtree_sums(flat, np.ones(len(flat), dtype=np.int64)).tolist()
+        index = 0
+        while index < len(flat):
+            old = old_index.get(hashes[index]) if counts[hashes[index]] == 1 else None
+            if old is None or matched[index] >= 0 or previous.used[old]:
+                index += 1
+                continue
+            # equal hashes mean equal shapes, pre-order offsets line up
+            for offset in range(sizes[index]):
+                if matched[index + offset] < 0 and not previous.used[old + offset]:
+                    match(index + offset, old + offset, "subtree")
+            index += sizes[index]
+
+    def _match_top_down(self, flat, previous, matched, match):
+        rects = flat.rects.tolist()
+        for index, node in enumerate(flat.nodes):
+            if matched[index] >= 0:
+                continue
+            parent = int(flat.parent[index])
+            old_parent = -1 if parent < 0 else int(matched[parent])
+            role = node.get("role")
+            if parent < 0 or old_parent >= 0:
+                by_label, by_role = previous.groups(old_parent)
+                old = previous.take(by_label[role, _label(node)])
+                if old is not None:
+                    match(index, old, "path")
+                    continue
+                old = previous.take(by_role[role])
+                if old is not None and overlap(rects[index], previous.rects[old]) >= self.min_overlap:
+                    match(index, old, "overlap")
+                    continue
+            old = previous.take(previous.moved[_moved_key(node, rects[index])])
+            if old is not None:
+                match(index, old, "moved")
+
+
+def add_arguments(parser):
+    parser.add_argument('files',
+                      help='Dumps and record logs in snapshot order',
+                      nargs='+')
+    parser.add_argument('-o', '--out',
+                      help='Output json-lines file with one snapshot per line, .gz, .xz and .zst files are '
+                           'compressed (default: stdout)')
+    parser.add_argument('-l', '--compress-level',
+                      help='Compression level (default: 6 for gzip and xz, 3 for zstd)',
+                      type=int)
+    parser.add_argument('--min-overlap',
+                      help=f'Rectangle overlap for matches on role and order only (default: {MIN_OVERLAP})',
+                      type=float,
+                      default=MIN_OVERLAP)
+
+
+def run(args):
+    tracker = Tracker(args.min_overlap)
+    totals = Counter()
+    snapshots = 0
+    failed = 0
+    start = time.perf_counter()
+    out = open_file(args.out, 'w', args.compress_level) if args.out else sys.stdout
+    try:
+        for path in args.files:
+            try:
+                for _, _, document in read_snapshots(path):
+                    totals.update(tracker.update(document))
+                    out.write(json.dumps(document, ensure_ascii=False) + "\n")
+                    snapshots += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                print(f"Failed to read {path}: {e}", file=sys.stderr)
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.perf_counter() - start
+    summary = ", ".join(f"{totals[kind]} {kind}" for kind in PASSES)
+    print(f"Tracked {sum(totals.values())} nodes in {snapshots} snapshots ({summary}), "
+          f"{tracker.next_track - 1} tracks in {elapsed:.2f}s", file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,162 @@
+"""Schema-independent view of the dumped accessibility trees.
+
+The three dumpers write slightly different trees:
+
+- mac-ax: macapptree `to_dict()` nodes with window-relative `bbox` and
+  `visible_bbox` lists ([x1, y1, x2, y2]) and "x;y" position strings
+- win-ax: `{"x", "y", "width", "height"}` bboxes in screen coordinates and a
+  `states` dict per node
+- linux-ax: the same bbox dicts, relative to the parent node except for
+  applications and windows (screen) and frames (window)
+
+`flatten` turns any of them into parallel arrays in pre-order, so the tools
+can work on whole trees with NumPy instead of walking nested dicts.
+"""
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from axtools.compressed import open_file
+
+MAC = "mac"
+WIN = "win"
+LINUX = "linux"
+
+# linux roles whose bbox is not relative to the parent node
+LINUX_SCREEN_ROLES = ("application", "window")
+LINUX_WINDOW_ROLES = ("frame",)
+
+
+@dataclass
+class FlatTree:
+    """Nodes of one or more trees in pre-order.
+
+    `rects` are (x0, y0, x1, y1) in the coordinates of the dump, NaN for
+    nodes without a bbox; `axtools.screen_rects` converts them to screen
+    coordinates. `parent` is -1 for the roots.
+    """
+    schema: str
+    nodes: list
+    parent: np.ndarray
+    depth: np.ndarray
+    rects: np.ndarray
+    roots: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def roles(self):
+        return [node.get("role") or "" for node in self.nodes]
+
+    @property
+    def names(self):
+        return [node.get("name") or "" for node in self.nodes]
+
+
+def load(path):
+    """Load a dumped tree from a json file, compressed files are decompressed"""
+    with open_file(path) as f:
+        return json.load(f)
+
+
+def tree_roots(document):
+    """Get the root nodes of any dumper output.
+
+    Accepts the plain and event (`{"time", "data"}`) outputs of the dumpers
+    as well as a single macapptree window, also when they are wrapped in a
+    `{"tree": ...}` record such as the output of `axtools batch`.
+    """
+    while isinstance(document, dict) and "role" not in document:
+        if "data" in document and "time" in document:
+            document = document["data"]
+        elif "tree" in document:
+            document = document["tree"]
+        else:
+            break
+    if isinstance(document, dict):
+        return [document]
+    return [node for node in document if node]
+
+
+def node_children(node):
+    children = node.get("children") or []
+    # mac-ax stores the window of an application as a single dict
+    if isinstance(children, dict):
+        return [children]
+    return children
+
+
+def detect_schema(roots):
+    """Guess which dumper wrote the tree from the keys of its nodes"""
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        if "visible_bbox" in node or "absolute_position" in node:
+            return MAC
+        if "states" in node:
+            return WIN
+        stack.extend(reversed(node_children(node)))
+    return LINUX
+
+
+def node_rect(node):
+    """Get the (x0, y0, x1, y1) rectangle of a node in dump coordinates"""
+    bbox = node.get("visible_bbox")
+    if bbox is None:
+        bbox = node.get("bbox")
+    if isinstance(bbox, dict):
+        x, y = bbox.get("x", 0), bbox.get("y", 0)
+        return (x, y, x + bbox.get("width", 0), y + bbox.get("height", 0))
+    if bbox:
+        return tuple(bbox)
+    return None
+
+
+def flatten(document, schema=None):
+    """Flatten the trees of a dumper output into a FlatTree"""
+    roots = tree_roots(document)
+    if schema is None:
+        schema = detect_schema(roots)
+
+    nodes = []
+    parents = []
+    depths = []
+    rects = []
+    root_indices = []
+    stack = [(root, -1, 0) for root in reversed(roots)]
+    while stack:
+        node, parent, depth = stack.pop()
+        index = len(nodes)
+        if parent == -1:
+            root_indices.append(index)
+        nodes.append(node)
+        parents.append(parent)
+        depths.append(depth)
+        rect = node_rect(node)
+        rects.append(rect if rect is not None else (np.nan,) * 4)
+        stack.extend((child, index, depth + 1) for child in reversed(node_children(node)))
+
+    tree = FlatTree(
+        schema,
+        nodes,
+        np.array(parents, dtype=np.int64),
+        np.array(depths, dtype=np.int32),
+        np.array(rects, dtype=np.float64).reshape(-1, 4),
+        root_indices,
+    )
+    if schema == LINUX:
+        from axtools.geometry import linux_window_rects
+        tree.rects = linux_window_rects(tree, tree.rects)
+    return tree
+
+
+def subtree_sums(flat, values):
+    """Sum `values` (one row per node) over the subtree of every node, the node included"""
+    sums = np.array(values, copy=True)
+    # deepest level first, every level adds its finished sums to the parents
+    for level in range(int(flat.depth.max()) if len(flat) else 0, 0, -1):
+        at_level = np.flatnonzero(flat.depth == level)
+        np.add.at(sums, flat.parent[at_level], sums[at_level])
+    return sums
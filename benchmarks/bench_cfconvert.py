@@ -0,0 +1,155 @@
+"""Micro-benchmark for the mac-ax CF conversion layer.
+
+The pyobjc frameworks are replaced with stand-in modules so the conversion
+code in macapptree.ax_backend can be timed on any platform. The stand-in CF
+objects only implement what the conversion layer touches, so the numbers
+measure the Python dispatch overhead, not the cost of the bridge itself.
+"""
+import argparse
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mac-ax', 'macapptree'))
+
+STRING_TYPE_ID = 7
+ARRAY_TYPE_ID = 19
+BOOLEAN_TYPE_ID = 21
+NUMBER_TYPE_ID = 22
+ELEMENT_TYPE_ID = 100
+AXVALUE_TYPE_ID = 101
+
+POINT_TYPE = 1
+SIZE_TYPE = 2
+RANGE_TYPE = 4
+ERROR_TYPE = 5
+
+
+class StandInArrayM(list):
+    """Stand-in for the mutable arrays returned by the accessibility API"""
+
+
+class StandInElement:
+    """Stand-in for AXUIElementRef"""
+
+
+class StandInAXValue:
+    """Stand-in for AXValueRef wrapping a point, size, range or error"""
+
+    def __init__(self, value_type, value):
+        self.value_type = value_type
+        self.value = value
+
+
+def stand_in_type_id(value):
+    if isinstance(value, StandInElement):
+        return ELEMENT_TYPE_ID
+    if isinstance(value, StandInAXValue):
+        return AXVALUE_TYPE_ID
+    if isinstance(value, bool):
+        return BOOLEAN_TYPE_ID
+    if isinstance(value, (int, float)):
+        return NUMBER_TYPE_ID
+    if isinstance(value, str):
+        return STRING_TYPE_ID
+    if isinstance(value, list):
+        return ARRAY_TYPE_ID
+    return 0
+
+
+def install_stand_ins():
+    """Register stand-in Foundation, ApplicationServices and AppKit modules"""
+    foundation = types.ModuleType('Foundation')
+    foundation.__NSArrayM = StandInArrayM
+    foundation.NSArray = list
+    foundation.CFGetTypeID = stand_in_type_id
+    foundation.CFNumberGetValue = lambda number, number_type, _: (True, number)
+    foundation.kCFNumberIntType = 9
+    foundation.kCFNumberDoubleType = 13
+    foundation.CFStringGetTypeID = lambda: STRING_TYPE_ID
+    foundation.CFBooleanGetTypeID = lambda: BOOLEAN_TYPE_ID
+    foundation.CFArrayGetTypeID = lambda: ARRAY_TYPE_ID
+    foundation.CFNumberGetTypeID = lambda: NUMBER_TYPE_ID
+
+    services = types.ModuleType('ApplicationServices')
+    services.AXUIElementRef = StandInElement
+    services.AXValueRef = StandInAXValue
+    services.AXUIElementGetTypeID = lambda: ELEMENT_TYPE_ID
+    services.AXValueGetType = lambda value: value.value_type
+    services.AXValueGetValue = lambda value, value_type, _: (value.value_type == value_type, value.value)
+    services.kAXValueCGPointType = POINT_TYPE
+    services.kAXValueCGSizeType = SIZE_TYPE
+    services.kAXValueCFRangeType = RANGE_TYPE
+    services.kAXValueAXErrorType = ERROR_TYPE
+    services.kAXErrorSuccess = 0
+
+    sys.modules['Foundation'] = foundation
+    sys.modules['ApplicationServices'] = services
+    sys.modules['AppKit'] = types.ModuleType('AppKit')
+
+
+def node_values(children):
+    """Attribute values of one element as returned by a batched read"""
+    return [
+        'AXButton',
+        'Save document',
+        True,
+        StandInAXValue(POINT_TYPE, types.SimpleNamespace(x=12.0, y=40.0)),
+        StandInAXValue(SIZE_TYPE, types.SimpleNamespace(width=80.0, height=24.0)),
+        'save',
+        'button',
+        StandInAXValue(ERROR_TYPE, None),
+        StandInArrayM(StandInElement() for _ in range(children)),
+        StandInAXValue(ERROR_TYPE, None),
+    ]
+
+
+def measure(label, func, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    per_item = best / len(items) * 1e6
+    print(f"{label:<40} {per_item:8.3f} us/node")
+    return per_item
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mac-ax CF conversion layer with stand-in CF objects')
+    parser.add_argument('-n', '--nodes',
+                      help='Number of synthetic nodes (default: 20000)',
+                      type=int,
+                      default=20000)
+    parser.add_argument('-c', '--children',
+                      help='Children per node (default: 8)',
+                      type=int,
+                      default=8)
+    parser.add_argument('-r', '--repeat',
+                      help='Repetitions, the best run is reported (default: 5)',
+                      type=int,
+                      default=5)
+    args = parser.parse_args()
+
+    install_stand_ins()
+    from macapptree.ax_backend import ApplicationServicesBackend, CFAttributeToPyObject
+
+    backend = ApplicationServicesBackend()
+    nodes = [node_values(args.children) for _ in range(args.nodes)]
+    children = [values[8] for values in nodes]
+    positions = [values[3] for values in nodes]
+
+    def convert_node(values):
+        for value in values:
+            backend._convert(value)
+
+    measure('batched attribute conversion', convert_node, nodes, args.repeat)
+    measure('CFAttributeToPyObject(children)', CFAttributeToPyObject, children, args.repeat)
+    measure('CFAttributeToPyObject(position)', CFAttributeToPyObject, positions, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
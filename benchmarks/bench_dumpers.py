@@ -0,0 +1,350 @@
+"""Benchmark the Python dumpers on synthetic trees.
+
+Every case runs in a fresh process, so the reported peak RSS belongs to that
+case only. Results can be stored as a baseline and later runs compared
+against it; `--check` exits with 1 when a case got slower, bigger in memory
+or changed its output size by more than the tolerance.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import synthetic
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# A case gets the synthetic windows and a scratch directory, prepares what it
+# needs and returns a function which runs the measured code once and returns
+# the number of output bytes.
+
+def case_win_get_element_info(windows, workdir, latency):
+    dumper = synthetic.load_win_dumper()
+    controls = synthetic.win_desktop(windows, latency).windows()
+
+    def run():
+        for control in controls:
+            dumper.get_element_info(control)
+        return 0
+    return run
+
+
+def case_win_save_accessibility_tree(windows, workdir, latency):
+    dumper = synthetic.load_win_dumper()
+    dumper.set_desktop(synthetic.win_desktop(windows, latency))
+    output = os.path.join(workdir, 'win.json')
+
+    def run():
+        # the random query points decide which subtrees are dumped twice
+        random.seed(0)
+        dumper.save_accessibility_tree(output, timeout=60)
+        return file_size(output)
+    return run
+
+
+def case_win_windows(windows, workdir, latency):
+    dumper = synthetic.load_win_dumper()
+    dumper.set_desktop(synthetic.win_desktop(windows, latency))
+
+    def run():
+        dumper.get_all_windows_accessibility_tree(timeout_seconds=60)
+        return 0
+    return run
+
+
+def case_win_warm_cache(windows, workdir, latency):
+    dumper = synthetic.load_win_dumper()
+    dumper.set_desktop(synthetic.win_desktop(windows, latency))
+    from axtools.cache import ElementCache, set_element_cache
+    set_element_cache(ElementCache())
+    # the first capture fills the cache, the measured ones are served from it
+    dumper.get_all_windows_accessibility_tree(timeout_seconds=60)
+
+    def run():
+        dumper.get_all_windows_accessibility_tree(timeout_seconds=60)
+        return 0
+    return run
+
+
+def mac_setup(windows):
+    synthetic.load_macapptree()
+    from macapptree.backend import FakeBackend, set_backend
+    set_backend(FakeBackend())
+    return [synthetic.mac_window(window) for window in windows]
+
+
+def case_mac_uielement(windows, workdir, latency):
+    elements = mac_setup(windows)
+    from macapptree.uielement import UIElement
+
+    def run():
+        for element in elements:
+            UIElement(element)
+        return 0
+    return run
+
+
+def case_mac_warm_cache(windows, workdir, latency):
+    elements = mac_setup(windows)
+    from macapptree.uielement import UIElement
+    from axtools.cache import ElementCache, set_element_cache
+    set_element_cache(ElementCache())
+    for element in elements:
+        UIElement(element)
+
+    def run():
+        for element in elements:
+            UIElement(element)
+        return 0
+    return run
+
+
+def case_mac_to_dict(windows, workdir, latency):
+    elements = mac_setup(windows)
+    from macapptree.uielement import UIElement
+    trees = [UIElement(element) for element in elements]
+
+    def run():
+        return sum(len(json.dumps(tree.to_dict(), ensure_ascii=False).encode('utf-8')) for tree in trees)
+    return run
+
+
+def case_mac_store_data_to_file(windows, workdir, latency):
+    elements = mac_setup(windows)
+    from macapptree.uielement import UIElement
+    from macapptree.files import store_data_to_file
+    trees = [UIElement(element) for element in elements]
+    output = os.path.join(workdir, 'mac.json')
+
+    def run():
+        written = 0
+        for tree in trees:
+            store_data_to_file(tree, output)
+            written += file_size(output)
+        return written
+    return run
+
+
+def case_mac_segment_image(windows, workdir, latency):
+    elements = mac_setup(windows)
+    from PIL import Image
+    from macapptree.uielement import UIElement
+    from macapptree.window_tools import segment_image
+    trees = [UIElement(element) for element in elements]
+    images = []
+    for index, window in enumerate(windows):
+        path = os.path.join(workdir, f'window{index}.png')
+        Image.new('RGB', (window.width, window.height), 'white').save(path)
+        images.append(path)
+
+    def run():
+        for tree, path in zip(trees, images):
+            segment_image(path, tree)
+        return sum(file_size(path) for path in images)
+    return run
+
+
+CASES = {
+    'win.get_element_info': case_win_get_element_info,
+    'win.save_accessibility_tree': case_win_save_accessibility_tree,
+    'win.windows': case_win_windows,
+    'win.warm_cache': case_win_warm_cache,
+    'mac.UIElement': case_mac_uielement,
+    'mac.warm_cache': case_mac_warm_cache,
+    'mac.to_dict': case_mac_to_dict,
+    'mac.store_data_to_file': case_mac_store_data_to_file,
+    'mac.segment_image': case_mac_segment_image,
+}
+
+
+def run_case(name, spec, repeat, latency):
+    """Run one case in the current process and return its measurements"""
+    windows = synthetic.generate(spec)
+    nodes = synthetic.count_nodes(windows)
+    with tempfile.TemporaryDirectory() as workdir:
+        run = CASES[name](windows, workdir, latency)
+        best = None
+        output_bytes = 0
+        for _ in range(repeat):
+            # like timeit, collect before and keep the collector out of the run
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                output_bytes = run()
+                elapsed = time.perf_counter() - start
+            finally:
+                gc.enable()
+            best = elapsed if best is None else min(best, elapsed)
+    return {
+        'nodes': nodes,
+        'seconds': best,
+        'nodes_per_sec': nodes / best if best else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+    }
+
+
+def _run_case_job(job):
+    name, spec, repeat, latency = job
+    # the dumpers print progress and errors, keep the report readable
+    with open(os.devnull, 'w') as devnull:
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = devnull
+        try:
+            return run_case(name, spec, repeat, latency)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+
+def run_isolated(name, spec, repeat, latency):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_run_case_job, ((name, spec, repeat, latency),))
+
+
+def compare(results, baseline, tolerance):
+    """Get the regressions of the results against the baseline"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['nodes_per_sec'] < base['nodes_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['nodes_per_sec']:.0f} nodes/s, baseline {base['nodes_per_sec']:.0f}")
+        if result['peak_rss_mb'] and base.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['peak_rss_mb']:.1f} MB peak RSS, baseline {base['peak_rss_mb']:.1f}")
+        if base.get('output_bytes') and abs(result['output_bytes'] - base['output_bytes']) > base['output_bytes'] * tolerance:
+            regressions.append(f"{name}: {result['output_bytes']} output bytes, baseline {base['output_bytes']}")
+    return regressions
+
+
+def change(value, base):
+    if not base:
+        return ''
+    return f'{(value / base - 1) * 100:+6.1f}%'
+
+
+def print_report(results, baseline):
+    print(f"{'case':<30} {'nodes/s':>10} {'':>7} {'peak RSS MB':>11} {'':>7} {'output bytes':>13}")
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        rss = result['peak_rss_mb'] or 0
+        print(f"{name:<30} {result['nodes_per_sec']:10.0f} {change(result['nodes_per_sec'], base.get('nodes_per_sec')):>7}"
+              f" {rss:11.1f} {change(rss, base.get('peak_rss_mb')):>7} {result['output_bytes']:13d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Python dumpers on synthetic accessibility trees')
+    parser.add_argument('cases',
+                      help=f'Cases to run (default: all of {", ".join(CASES)})',
+                      nargs='*')
+    parser.add_argument('-n', '--nodes',
+                      help='Number of nodes over all windows (default: 5000)',
+                      type=int,
+                      default=synthetic.TreeSpec.nodes)
+    parser.add_argument('-d', '--depth',
+                      help='Maximum tree depth (default: 10)',
+                      type=int,
+                      default=synthetic.TreeSpec.depth)
+    parser.add_argument('-f', '--fanout',
+                      help='Maximum children per node (default: 6)',
+                      type=int,
+                      default=synthetic.TreeSpec.fanout)
+    parser.add_argument('-t', '--text-length',
+                      help='Characters per name (default: 16)',
+                      type=int,
+                      default=synthetic.TreeSpec.text_length)
+    parser.add_argument('-u', '--unicode-mix',
+                      help='Share of non-ASCII characters in the text (default: 0.1)',
+                      type=float,
+                      default=synthetic.TreeSpec.unicode_mix)
+    parser.add_argument('-w', '--windows',
+                      help='Number of top-level windows (default: 4)',
+                      type=int,
+                      default=synthetic.TreeSpec.windows)
+    parser.add_argument('-r', '--repeat',
+                      help='Repetitions, the best run is reported (default: 5)',
+                      type=int,
+                      default=5)
+    parser.add_argument('-l', '--latency',
+                      help='Seconds slept by every fake win-ax call (default: 0)',
+                      type=float,
+                      default=0.0)
+    parser.add_argument('-b', '--baseline',
+                      help=f'Baseline file (default: {os.path.relpath(BASELINE)})',
+                      default=BASELINE)
+    parser.add_argument('--save-baseline',
+                      help='Store the results as the new baseline',
+                      action='store_true')
+    parser.add_argument('--check',
+                      help='Exit with 1 when a case regressed against the baseline',
+                      action='store_true')
+    parser.add_argument('--tolerance',
+                      help='Allowed relative regression (default: 0.15)',
+                      type=float,
+                      default=0.15)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        print(f"Unknown cases: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+
+    spec = synthetic.TreeSpec(
+        nodes=args.nodes,
+        depth=args.depth,
+        fanout=args.fanout,
+        text_length=args.text_length,
+        unicode_mix=args.unicode_mix,
+        windows=args.windows,
+    )
+    results = {name: run_isolated(name, spec, args.repeat, args.latency) for name in args.cases or CASES}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('spec') == spec.to_dict():
+            baseline = stored['results']
+        else:
+            print('Baseline was measured with a different tree spec, not comparing', file=sys.stderr)
+
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        results = dict(baseline, **results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'spec': spec.to_dict(), 'results': results}, f, indent=2)
+        print(f'Baseline stored in {args.baseline}')
+    elif args.check:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark the startup of the dump CLIs with `python -X importtime`.
+
+Every target runs in a fresh interpreter. The report shows the wall time of
+the whole start (best of `-r` runs), the import time and number of modules
+the target adds on top of a bare interpreter, and the most expensive
+imports. With `--check` the run fails when a target loads one of the heavy
+modules it should import lazily (PIL, numpy, the screenshot frameworks and
+pywinauto stay out of a plain tree dump).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+WIN_AX = os.path.join(ROOT, 'win-ax')
+MACAPPTREE = os.path.join(ROOT, 'mac-ax', 'macapptree')
+AX_TOOLS = os.path.join(ROOT, 'ax-tools')
+
+# modules which only the screenshot, overlay and Windows paths need
+HEAVY = ('PIL', 'numpy', 'Quartz', 'AppKit', 'unidecode', 'pywinauto', 'win32gui', 'win32api', 'comtypes')
+
+
+@dataclass
+class Target:
+    """Code run in a fresh interpreter, `lazy` modules must stay unloaded"""
+    code: str
+    path: str = ''
+    lazy: tuple = ()
+
+
+TARGETS = {
+    # what mac-ax/dump-tree.py imports to start the per-app processes
+    'macapptree.get_tree': Target('from macapptree import get_tree, get_app_bundle', MACAPPTREE, HEAVY),
+    # the tree dump of macapptree.main without the AppKit application lookup
+    'macapptree.tree': Target(
+        'import macapptree.uielement, macapptree.extractor, macapptree.files', MACAPPTREE, HEAVY),
+    'macapptree.overlay': Target('import macapptree.overlay', MACAPPTREE),
+    'win-ax': Target(
+        "import importlib.util; "
+        "spec = importlib.util.spec_from_file_location('dump_tree', 'dump-tree.py'); "
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))", WIN_AX, HEAVY),
+    'axtools': Target('import axtools', AX_TOOLS, HEAVY),
+}
+
+
+def parse_importtime(stderr):
+    """Get (name, self_us, cumulative_us, level) of every import in the output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        level = (len(name) - len(stripped) - 1) // 2
+        imports.append((stripped, int(fields[0]), int(fields[1]), level))
+    return imports
+
+
+def run_interpreter(code, path, importtime=False):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    if path:
+        # the dumpers import the shared modules of ax-tools
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [path, AX_TOOLS, env.get('PYTHONPATH')]))
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', code]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=path or None, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def measure(target, repeat, startup_modules):
+    """Measure one target and return its numbers"""
+    best = None
+    for _ in range(repeat):
+        result, elapsed = run_interpreter(target.code, target.path)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1]}
+        best = elapsed if best is None else min(best, elapsed)
+
+    result, _ = run_interpreter(target.code, target.path, importtime=True)
+    imports = [entry for entry in parse_importtime(result.stderr) if entry[0] not in startup_modules]
+    top_level = [entry for entry in imports if entry[3] == 0]
+    loaded = {entry[0] for entry in imports}
+    return {
+        'seconds': best,
+        'import_ms': sum(entry[2] for entry in top_level) / 1000,
+        'modules': len(loaded),
+        'slowest': sorted(imports, key=lambda entry: entry[1], reverse=True)[:5],
+        'heavy': sorted({name.split('.')[0] for name in loaded} & set(target.lazy)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the dump CLIs')
+    parser.add_argument('targets',
+                      help=f'Targets to run (default: all of {", ".join(TARGETS)})',
+                      nargs='*')
+    parser.add_argument('-r', '--repeat',
+                      help='Interpreter starts per target, the best one is reported (default: 10)',
+                      type=int,
+                      default=10)
+    parser.add_argument('-v', '--verbose',
+                      help='List the slowest imports of every target',
+                      action='store_true')
+    parser.add_argument('--check',
+                      help='Exit with 1 when a target loads a module it should import lazily',
+                      action='store_true')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        print(f"Unknown targets: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+
+    bare, _ = run_interpreter('pass', '', importtime=True)
+    startup_modules = {entry[0] for entry in parse_importtime(bare.stderr)}
+    startup = min(run_interpreter('pass', '')[1] for _ in range(args.repeat))
+
+    print(f"{'target':<22} {'start ms':>9} {'import ms':>10} {'modules':>8}  heavy modules")
+    print(f"{'(bare interpreter)':<22} {startup * 1000:9.1f} {0:10.1f} {0:8d}")
+    failed = []
+    for name in args.targets or TARGETS:
+        result = measure(TARGETS[name], args.repeat, startup_modules)
+        if 'error' in result:
+            print(f"{name:<22} failed: {result['error']}")
+            continue
+        print(f"{name:<22} {result['seconds'] * 1000:9.1f} {result['import_ms']:10.1f} {result['modules']:8d}"
+              f"  {', '.join(result['heavy']) or '-'}")
+        if args.verbose:
+            for module, self_us, cumulative_us, _ in result['slowest']:
+                print(f"    {module:<40} {self_us / 1000:8.2f} ms self {cumulative_us / 1000:8.2f} ms cumulative")
+        if result['heavy']:
+            failed.append(name)
+
+    if args.check and failed:
+        print(f"Heavy modules imported eagerly by: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Synthetic accessibility trees and fake desktops for the benchmarks.
+
+`generate` builds a platform independent tree with the requested size, depth,
+fan-out and text; `win_desktop` and `mac_window` expose it through the same
+interfaces the dumpers read from (pywinauto style wrappers for win-ax,
+FakeElement/FakeBackend for mac-ax).
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+WIN_AX = os.path.join(ROOT, 'win-ax')
+MACAPPTREE = os.path.join(ROOT, 'mac-ax', 'macapptree')
+AX_TOOLS = os.path.join(ROOT, 'ax-tools')
+
+# role of every synthetic node kind on each platform
+ROLES = [
+    ('Pane', 'AXGroup'),
+    ('Button', 'AXButton'),
+    ('Text', 'AXStaticText'),
+    ('Edit', 'AXTextField'),
+    ('List', 'AXList'),
+    ('ListItem', 'AXRow'),
+    ('Image', 'AXImage'),
+    ('MenuItem', 'AXMenuItem'),
+]
+
+# characters mixed into the text, one pool is picked per character
+ASCII = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 '
+UNICODE_POOLS = [
+    'àáâãäåçèéêëìíîïñòóôõöùúûüýÿ',
+    'абвгдежзийклмнопрстуфхцчшщэюя',
+    '的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年',
+    '😀😂😍👍🚀🎉🔥✨💡📁',
+]
+
+
+@dataclass
+class TreeSpec:
+    """Shape of a synthetic tree"""
+    nodes: int = 5000
+    depth: int = 10
+    fanout: int = 6
+    text_length: int = 16
+    unicode_mix: float = 0.1
+    windows: int = 4
+    width: int = 1600
+    height: int = 1000
+    seed: int = 0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class SyntheticNode:
+    kind: int
+    name: str
+    description: str
+    value: str
+    x: int
+    y: int
+    width: int
+    height: int
+    children: list = field(default_factory=list)
+
+
+def synthetic_text(rng, length, unicode_mix):
+    chars = []
+    for _ in range(length):
+        pool = rng.choice(UNICODE_POOLS) if rng.random() < unicode_mix else ASCII
+        chars.append(rng.choice(pool))
+    return ''.join(chars)
+
+
+def generate(spec):
+    """Generate `spec.windows` window trees with `spec.nodes` nodes in total.
+
+    Nodes are added breadth first with up to `spec.fanout` children and at
+    most `spec.depth` levels, every child is laid out inside its parent.
+    """
+    rng = random.Random(spec.seed)
+
+    def node(x, y, width, height):
+        return SyntheticNode(
+            rng.randrange(len(ROLES)),
+            synthetic_text(rng, spec.text_length, spec.unicode_mix),
+            synthetic_text(rng, spec.text_length // 2, spec.unicode_mix),
+            synthetic_text(rng, spec.text_length // 4, spec.unicode_mix) if rng.random() < 0.3 else '',
+            x, y, width, height,
+        )
+
+    windows = [node(20 * i, 20 * i, spec.width, spec.height) for i in range(spec.windows)]
+    count = len(windows)
+    level = [(window, 1) for window in windows]
+    while level and count < spec.nodes:
+        next_level = []
+        for parent, depth in level:
+            if depth >= spec.depth:
+                continue
+            children = min(rng.randint(1, spec.fanout), spec.nodes - count)
+            if children <= 0:
+                break
+            # stack the children vertically inside the parent
+            height = max(parent.height // children, 1)
+            for index in range(children):
+                child = node(parent.x + 2, parent.y + index * height, max(parent.width - 4, 1), height)
+                parent.children.append(child)
+                next_level.append((child, depth + 1))
+            count += children
+        level = next_level
+    return windows
+
+
+def count_nodes(nodes):
+    count = 0
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def pause(latency):
+    if latency > 0:
+        time.sleep(latency)
+
+
+class WinRect:
+    """Stand-in for the pywinauto RECT"""
+
+    def __init__(self, left, top, right, bottom):
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+
+class WinElementInfo:
+    """UIA element info, every property is a round trip like in pywinauto"""
+
+    def __init__(self, node, process_id=0, latency=0.0, calls=None):
+        self.node = node
+        self.process_id = process_id
+        self.latency = latency
+        self.calls = calls
+
+    def _call(self, name):
+        if self.calls is not None:
+            self.calls[name] += 1
+        pause(self.latency)
+
+    @property
+    def name(self):
+        self._call('name')
+        return self.node.name
+
+    @property
+    def control_type(self):
+        self._call('control_type')
+        return ROLES[self.node.kind][0]
+
+    @property
+    def description(self):
+        self._call('description')
+        return self.node.description
+
+    @property
+    def runtime_id(self):
+        self._call('runtime_id')
+        return (42, id(self.node))
+
+
+class WinControl:
+    """pywinauto UIA wrapper over a synthetic node.
+
+    Every call sleeps for `latency` seconds to model the cross-process round
+    trip of UI Automation and is counted by name in `calls` when given.
+    """
+
+    def __init__(self, node, latency=0.0, process_id=0, handle=0, calls=None):
+        self.node = node
+        self.latency = latency
+        self.calls = calls
+        self.element_info = WinElementInfo(node, process_id, latency, calls)
+        self.handle = handle
+
+    def _call(self, name):
+        if self.calls is not None:
+            self.calls[name] += 1
+        pause(self.latency)
+
+    def rectangle(self):
+        self._call('rectangle')
+        node = self.node
+        return WinRect(node.x, node.y, node.x + node.width, node.y + node.height)
+
+    def children(self):
+        self._call('children')
+        return [WinControl(child, self.latency, calls=self.calls) for child in self.node.children]
+
+    def window_text(self):
+        self._call('window_text')
+        return self.node.name
+
+    def get_value(self):
+        self._call('get_value')
+        if not self.node.value:
+            raise AttributeError('no value pattern')
+        return self.node.value
+
+    def is_enabled(self):
+        self._call('is_enabled')
+        return True
+
+    def is_visible(self):
+        self._call('is_visible')
+        return True
+
+    def is_focused(self):
+        self._call('is_focused')
+        return False
+
+    def is_keyboard_focusable(self):
+        self._call('is_keyboard_focusable')
+        return self.node.kind in (1, 3)
+
+
+class WinDesktop:
+    """Desktop for `set_desktop` of win-ax serving synthetic windows.
+
+    Window i belongs to process `1000 + i` named `app<i>.exe`, its handle is
+    `i + 1` and the first window is in the foreground. `calls` counts the
+    calls of all controls by name.
+    """
+
+    def __init__(self, windows, latency=0.0):
+        self.window_nodes = windows
+        self.latency = latency
+        self.calls = Counter()
+
+    def windows(self):
+        pause(self.latency)
+        return [WinControl(window, self.latency, 1000 + index, index + 1, self.calls)
+                for index, window in enumerate(self.window_nodes)]
+
+    def foreground_handle(self):
+        return 1
+
+    def process_name(self, pid):
+        pause(self.latency)
+        return f"app{pid - 1000}.exe"
+
+    def focused_control(self):
+        return WinControl(self.window_nodes[0], self.latency, calls=self.calls)
+
+    def control_at_position(self, x, y):
+        # deepest node under the point in the first window containing it, the
+        # first window stands in for the desktop elsewhere
+        for window in self.window_nodes:
+            node = window
+            if not self._contains(node, x, y):
+                continue
+            while True:
+                child = next((child for child in node.children if self._contains(child, x, y)), None)
+                if child is None:
+                    return WinControl(node, self.latency, calls=self.calls)
+                node = child
+        return WinControl(self.window_nodes[0], self.latency, calls=self.calls)
+
+    def cursor_position(self):
+        return (10, 10)
+
+    def monitor_area(self):
+        return (0, 0, 1920, 1080)
+
+    @staticmethod
+    def _contains(node, x, y):
+        return node.x <= x < node.x + node.width and node.y <= y < node.y + node.height
+
+
+def win_desktop(windows, latency=0.0):
+    return WinDesktop(windows, latency)
+
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def load_win_dumper():
+    """Import win-ax/dump-tree.py as a module"""
+    add_path(AX_TOOLS)
+    add_path(WIN_AX)
+    spec = importlib.util.spec_from_file_location('win_dump_tree', os.path.join(WIN_AX, 'dump-tree.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_macapptree():
+    add_path(AX_TOOLS)
+    add_path(MACAPPTREE)
+
+
+def mac_window(window):
+    """Build a FakeElement tree of a synthetic window"""
+    load_macapptree()
+    from macapptree.backend import (
+        FakeElement, Point, Size, ROLE, TITLE, ENABLED, POSITION, SIZE,
+        DESCRIPTION, ROLE_DESCRIPTION, VALUE,
+    )
+
+    def element(node):
+        role = ROLES[node.kind][1]
+        return FakeElement({
+            ROLE: role,
+            TITLE: node.name,
+            ENABLED: True,
+            POSITION: Point(node.x, node.y),
+            SIZE: Size(node.width, node.height),
+            DESCRIPTION: node.description,
+            ROLE_DESCRIPTION: role[2:].lower(),
+            VALUE: node.value or None,
+        }, actions=['AXPress'] if role == 'AXButton' else [], children=[element(child) for child in node.children])
+
+    return element(window)
@@ -62,7 +62,8 @@ handle_platform() {
             # Add Windows-specific commands here
             setup_venv "windows"
             cd win-ax
-            pyinstaller --onefile dump-tree.py
+            # the shared modules of ax-tools are bundled from the source tree
+            pyinstaller --paths ../ax-tools --onefile dump-tree.py
             cd ..
             mkdir -p target/windows-x64
             cp win-ax/dist/dump-tree.exe target/windows-x64/
@@ -93,6 +94,7 @@ handle_platform() {
             # build & copy to target
             pyinstaller \
                 --add-data "./macapptree/macapptree:macapptree" \
+                --add-data "../ax-tools/axtools:axtools" \
                 --onefile \
                 --target-arch arm64\
                 dump-tree.py
@@ -114,6 +116,7 @@ handle_platform() {
             # build & copy to target
             pyinstaller \
                 --add-data "./macapptree/macapptree:macapptree" \
+                --add-data "../ax-tools/axtools:axtools" \
                 --onefile \
                 --target-arch x86_64\
                 dump-tree.py
@@ -16,14 +16,29 @@ interface Node {
   children: Node[];
 }
 
+interface CompactStats {
+  before: number;
+  after: number;
+  collapsed: number;
+  dropped: number;
+  merged: number;
+}
+
 interface EventOutput {
   time: number;
   data: {
     duration: number;
     tree: Node[];
+    compaction?: CompactStats;
   };
 }
 
+// Roles compacted by --compact, the same as ax-tools/axtools/compact.py
+const WRAPPER_ROLES = new Set(["filler", "panel", "section"]);
+const TEXT_ROLES = new Set(["label", "static"]);
+// Roles whose bbox is not relative to the parent node
+const ABSOLUTE_ROLES = new Set(["application", "window", "frame"]);
+
 function getLabel(accessible: Atspi.Accessible) {
   const relationSet = accessible.get_relation_set();
   if (!relationSet) return null;
@@ -105,7 +120,87 @@ function dumpNodeContent(node: Atspi.Accessible): Node {
   return nodeInfo;
 }
 
-async function main(outFile: string | null, eventFormat: boolean = false) {
+function countNodes(nodes: Node[]): number {
+  let count = 0;
+  const stack = [...nodes];
+  while (stack.length > 0) {
+    const node = stack.pop()!;
+    count++;
+    stack.push(...node.children);
+  }
+  return count;
+}
+
+function hasText(node: Node) {
+  return Boolean(node.name || node.value || node.description);
+}
+
+function isZeroArea(node: Node) {
+  return node.bbox.width <= 0 || node.bbox.height <= 0;
+}
+
+// Children are relative to the parent, the same rectangle is at the parent's
+// origin with the parent's size
+function sameRect(parent: Node, child: Node) {
+  return (
+    !ABSOLUTE_ROLES.has(child.role) &&
+    child.bbox.x === 0 &&
+    child.bbox.y === 0 &&
+    child.bbox.width === parent.bbox.width &&
+    child.bbox.height === parent.bbox.height
+  );
+}
+
+// Compact a node after its children, return its replacement or null
+function compactNode(node: Node, stats: CompactStats): Node | null {
+  let children = node.children
+    .map((child) => compactNode(child, stats))
+    .filter((child): child is Node => child !== null);
+
+  // static text with a single static text child of the same text
+  while (
+    TEXT_ROLES.has(node.role) &&
+    children.length === 1 &&
+    TEXT_ROLES.has(children[0].role) &&
+    (!node.name || !children[0].name || node.name === children[0].name)
+  ) {
+    node.name = node.name || children[0].name;
+    node.description = node.description || children[0].description;
+    children = children[0].children;
+    stats.merged++;
+  }
+
+  if (children.length === 0) {
+    if (isZeroArea(node)) return null;
+    if ((WRAPPER_ROLES.has(node.role) || TEXT_ROLES.has(node.role)) && !hasText(node)) return null;
+  }
+
+  // wrappers around a single child of the same size are replaced by the child
+  if (WRAPPER_ROLES.has(node.role) && children.length === 1 && !hasText(node) && sameRect(node, children[0])) {
+    const child = children[0];
+    child.bbox = { ...node.bbox };
+    stats.collapsed++;
+    return child;
+  }
+
+  node.children = children;
+  return node;
+}
+
+// Compact the trees below the applications, which are kept
+function compactTree(apps: Node[]): CompactStats {
+  const stats = { before: countNodes(apps), after: 0, collapsed: 0, dropped: 0, merged: 0 };
+  for (const app of apps) {
+    app.children = app.children
+      .map((child) => compactNode(child, stats))
+      .filter((child): child is Node => child !== null);
+  }
+  stats.after = countNodes(apps);
+  stats.dropped = stats.before - stats.after - stats.collapsed - stats.merged;
+  return stats;
+}
+
+async function main(outFile: string | null, eventFormat: boolean = false, compact: boolean = false) {
   Atspi.init();
 
   const startTime = Date.now(); // JS timestamp in ms
@@ -114,6 +209,12 @@ async function main(outFile: string | null, eventFormat: boolean = false) {
   for (let i = 0, app; (app = desktop.get_child_at_index(i)); i++) {
     out.push(dumpNodeContent(app));
   }
+  let compaction: CompactStats | undefined;
+  if (compact) {
+    compaction = compactTree(out);
+    const reduction = compaction.before ? Math.round((1 - compaction.after / compaction.before) * 100) : 0;
+    console.error(`Compacted ${compaction.before} to ${compaction.after} nodes (${reduction}% fewer)`);
+  }
   const endTime = Date.now();
   const duration = endTime - startTime;
 
@@ -123,6 +224,7 @@ async function main(outFile: string | null, eventFormat: boolean = false) {
         data: {
           duration,
           tree: out,
+          ...(compaction ? { compaction } : {}),
         },
       }
     : out;
@@ -156,9 +258,58 @@ Gio._promisify(Gio.InputStream.prototype, "read_bytes_async");
 /* Gio.OutputStream */
 Gio._promisify(Gio.OutputStream.prototype, "write_bytes_async");
 
+// Yield the json of value in chunks, the outer levels of arrays and objects
+// item by item, so compressed output never holds the whole document as one
+// string
+function* jsonChunks(value: unknown, levels: number): Generator<string> {
+  if (levels > 0 && Array.isArray(value)) {
+    yield "[";
+    for (let i = 0; i < value.length; i++) {
+      if (i > 0) yield ",";
+      yield* jsonChunks(value[i], levels - 1);
+    }
+    yield "]";
+  } else if (levels > 0 && value !== null && typeof value === "object") {
+    yield "{";
+    let first = true;
+    for (const [key, item] of Object.entries(value)) {
+      if (!first) yield ",";
+      first = false;
+      yield JSON.stringify(key) + ":";
+      yield* jsonChunks(item, levels - 1);
+    }
+    yield "}";
+  } else {
+    yield JSON.stringify(value);
+  }
+}
+
+// Stream the json through a gzip compressor into the file
+function writeGzip(outFile: string, out: Node[] | EventOutput, level: number) {
+  const file = Gio.File.new_for_path(outFile);
+  const fileStream = file.replace(
+    null, // etag
+    false, // make_backup
+    Gio.FileCreateFlags.REPLACE_DESTINATION,
+    null // cancellable
+  );
+  const compressor = Gio.ZlibCompressor.new(Gio.ZlibCompressorFormat.GZIP, level);
+  const stream = new Gio.ConverterOutputStream({
+    base_stream: fileStream,
+    converter: compressor,
+  });
+  const enc = new TextEncoder();
+  for (const chunk of jsonChunks(out, 3)) {
+    stream.write_all(enc.encode(chunk), null);
+  }
+  stream.close(null);
+}
+
 // Parse command line arguments
 let outFile: string | null = null;
 let eventFormat: boolean = false;
+let compact: boolean = false;
+let level: number = -1; // zlib default
 
 const args = ARGV;
 for (let i = 0; i < args.length; i++) {
@@ -166,10 +317,28 @@ for (let i = 0; i < args.length; i++) {
     outFile = args[i + 1] || null;
   } else if (args[i] === "-e" || args[i] === "--event") {
     eventFormat = true;
+  } else if (args[i] === "--compact") {
+    compact = true;
+  } else if (args[i] === "-l" || args[i] === "--compress-level") {
+    level = parseInt(args[i + 1], 10);
   }
 }
 
-main(outFile, eventFormat).then(async (out) => {
+main(outFile, eventFormat, compact).then(async (out) => {
+  if (outFile && /\.(xz|zst|zstd)$/i.test(outFile)) {
+    console.error("Only .gz compression is available, use a .gz output file");
+    process.exit(1);
+  }
+  if (outFile && /\.gz$/i.test(outFile)) {
+    try {
+      writeGzip(outFile, out as Node[] | EventOutput, level);
+    } catch (error) {
+      console.error(`Error writing file: ${(error as Error).message}`);
+      process.exit(1);
+    }
+    return;
+  }
+
   const jsonOutput = JSON.stringify(out, null, 2);
 
   if (outFile) {
@@ -1,79 +1,232 @@
 import json
 import argparse
+import os
+import re
+import sys
+import tempfile
 import time
 from macapptree import get_app_bundle, get_tree
+from axtools.tracing import Tracer, get_tracer, set_tracer
+from axtools.compressed import dump_json, open_file
+from axtools.compact import MAC, CompactOptions, compact_roots
+from axtools.cache import get_element_cache
 
 from Quartz import (
     CGWindowListCopyWindowInfo,
     kCGWindowListOptionOnScreenOnly,
     kCGNullWindowID,
     kCGWindowOwnerName,
+    kCGWindowOwnerPID,
+    kCGWindowName,
+    kCGWindowLayer,
     kCGWindowBounds
 )
 
-def get_accessibility_tree():
-    INVALID_WINDOWS=['Window Server', 'Notification Center']
+INVALID_WINDOWS = ['Window Server', 'Notification Center']
+# lets `axtools record --cache` warm the element cache of in-process captures
+SUPPORTS_ELEMENT_CACHE = True
+
+def normalize_app_name(name):
+    name = (name or '').lower()
+    return name[:-4] if name.endswith('.app') else name
+
+class WindowFilter:
+    """Select apps by the window list entries of their on-screen windows.
+
+    The rules only read the window list, so an app without a matching window
+    is never walked. App names match without case and `.app`, the title is
+    the window name, which needs the screen recording permission. An app
+    selected by its title is captured with a window of that title, see
+    `title_regex`.
+    """
+
+    def __init__(self, pids=None, process_names=None, title_regex=None, foreground_only=False, exclude=None):
+        self.pids = set(pids or ())
+        self.process_names = {normalize_app_name(name) for name in process_names or ()}
+        self.title = re.compile(title_regex) if title_regex else None
+        self.foreground_only = foreground_only
+        self.exclude = {normalize_app_name(name) for name in exclude or ()}
+
+    @property
+    def title_regex(self):
+        """The title pattern, for picking the window to capture within a selected app"""
+        return self.title.pattern if self.title is not None else None
+
+    def accepts(self, window, frontmost_pid):
+        if self.foreground_only and window.get(kCGWindowOwnerPID) != frontmost_pid:
+            return False
+        if self.pids and window.get(kCGWindowOwnerPID) not in self.pids:
+            return False
+        name = normalize_app_name(window.get(kCGWindowOwnerName))
+        if self.process_names and name not in self.process_names:
+            return False
+        if name in self.exclude:
+            return False
+        if self.title is not None and not self.title.search(window.get(kCGWindowName) or ''):
+            return False
+        return True
+
+def select_apps(window_list, window_filter=None):
+    """Names of the apps with a real window on screen, front to back, each once"""
+    windows = [window for window in window_list
+               if window.get(kCGWindowBounds, {}).get("Y", 0) > 0
+               and window.get(kCGWindowOwnerName) not in INVALID_WINDOWS]
+    # the list is ordered front to back, the first normal window is frontmost
+    frontmost_pid = next((window.get(kCGWindowOwnerPID) for window in windows
+                          if window.get(kCGWindowLayer, 0) == 0), None)
+    app_names = []
+    for window in windows:
+        if window_filter is not None and not window_filter.accepts(window, frontmost_pid):
+            continue
+        name = window.get(kCGWindowOwnerName)
+        if name not in app_names:
+            app_names.append(name)
+    return app_names
+
+def get_accessibility_tree(window_filter=None):
     options = kCGWindowListOptionOnScreenOnly
     windowList = CGWindowListCopyWindowInfo(options, kCGNullWindowID)
-    # Convert windowList to a list of Python dictionaries
-    app_names = []
-    for window in windowList:
-        real = False
-        for key, value in window.items():
-            if key == kCGWindowBounds:
-                if value["Y"] > 0:
-                    real = True
-        for key, value in window.items():
-            if key == kCGWindowOwnerName and real == True:
-                if value not in INVALID_WINDOWS:
-                    app_names.append(value)
+    app_names = select_apps(windowList, window_filter)
+    title_regex = window_filter.title_regex if window_filter is not None else None
 
+    tracer = get_tracer()
     out = []
     for app in app_names:
         try:
-            bundle = get_app_bundle(app)
-            out.append({
-                'name': app,
-                'role': 'application',
-                'description': '',
-                'value': '',
-                'bbox': {'x': 0, 'y': 0, 'width': 0, 'height': 0},
-                'children': get_tree(bundle)
-            })
+            with tracer.span('app', 'window', {'app': app}):
+                with tracer.span('get_app_bundle', 'capture'):
+                    bundle = get_app_bundle(app)
+                out.append({
+                    'name': app,
+                    'role': 'application',
+                    'description': '',
+                    'value': '',
+                    'bbox': {'x': 0, 'y': 0, 'width': 0, 'height': 0},
+                    'children': get_traced_tree(bundle, title_regex)
+                })
         except:
            pass 
     
     return out
 
+def get_traced_tree(bundle, title_regex=None):
+    """Get the tree of the app, the events of its process go into the trace.
+
+    With `title_regex` the largest window with a matching title is captured
+    instead of the largest window of the app.
+    """
+    if get_element_cache() is not None:
+        return get_tree_in_process(bundle, title_regex)
+    tracer = get_tracer()
+    if not tracer.enabled:
+        return get_tree(bundle, title_regex=title_regex)
+
+    fd, trace_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        with tracer.span('get_tree', 'capture', {'bundle': bundle}):
+            tree = get_tree(bundle, trace_file=trace_file, trace_every=tracer.every, title_regex=title_regex)
+        tracer.merge(trace_file)
+        return tree
+    finally:
+        os.remove(trace_file)
+
+def get_tree_in_process(bundle, title_regex=None):
+    """Get the tree of the app in this process, so the element cache stays warm between captures"""
+    from macapptree.main import main as extract_app
+
+    fd, tree_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        with get_tracer().span('get_tree', 'capture', {'bundle': bundle}):
+            extract_app(bundle, tree_file, None, None, title_regex=title_regex)
+        with open(tree_file) as f:
+            return json.load(f)
+    finally:
+        os.remove(tree_file)
+
 def main():
     parser = argparse.ArgumentParser(description='Extract accessibility tree from macOS applications')
-    parser.add_argument('-o', '--out', help='Output file path (defaults to stdout)')
+    parser.add_argument('-o', '--out', help='Output file path, .gz, .xz and .zst files are compressed (defaults to stdout)')
+    parser.add_argument('-l', '--compress-level', help='Compression level (default: 6 for gzip and xz, 3 for zstd)',
+                        type=int)
     parser.add_argument('-e', '--event', help='Output in event format with timing data', action='store_true')
+    parser.add_argument('--pid', help='Capture the app with this process id only, repeat for more', type=int,
+                        action='append')
+    parser.add_argument('--process-name', help='Capture this app only (e.g. Safari), repeat for more',
+                        action='append')
+    parser.add_argument('--title-regex', help='Capture the windows with a title matching this regular '
+                        'expression only, the largest one per app')
+    parser.add_argument('--foreground-only', help='Capture the frontmost app only', action='store_true')
+    parser.add_argument('--exclude', help='Skip this app, repeat for more', action='append')
+    parser.add_argument('--compact', help='Collapse same-size groups, drop zero-area, empty and clipped leaves and '
+                        'merge text chains', action='store_true')
+    parser.add_argument('--trace', help='Write Chrome trace events (chrome://tracing, Perfetto) to this file')
+    parser.add_argument('--trace-every', help='Trace the accessibility calls of every Nth element only (default: 1)',
+                        type=int, default=1)
     args = parser.parse_args()
 
+    args.window_filter = None
+    if args.pid or args.process_name or args.title_regex or args.foreground_only or args.exclude:
+        try:
+            args.window_filter = WindowFilter(args.pid, args.process_name, args.title_regex,
+                                              args.foreground_only, args.exclude)
+        except re.error as e:
+            print(f"Invalid --title-regex: {e}", file=sys.stderr)
+            sys.exit(2)
+
+    if args.trace:
+        set_tracer(Tracer(args.trace_every))
+    try:
+        dump(args)
+    finally:
+        if args.trace:
+            get_tracer().save(args.trace)
+
+def capture_accessibility_tree(compact=None, window_filter=None):
+    """Capture the trees of all apps with windows on screen.
+
+    With CompactOptions in `compact` the trees are compacted and the node
+    counts before and after are added as `compaction`. A WindowFilter
+    selects the apps before their trees are read. While an ElementCache is
+    set, the apps are read in this process and the cache counts are added
+    as `cache`.
+    """
+    tree = get_accessibility_tree(window_filter)
+    data = {"tree": tree}
+    if compact is not None:
+        with get_tracer().span('compact', 'capture'):
+            stats = compact_roots(tree, MAC, compact)
+        print(f"Compacted {stats.before} to {stats.after} nodes ({stats.reduction:.0%} fewer)", file=sys.stderr)
+        data["compaction"] = stats.to_dict()
+    cache = get_element_cache()
+    if cache is not None:
+        data["cache"] = cache.stats()
+    return data
+
+def dump(args):
+    tracer = get_tracer()
+
     start_time = int(time.time() * 1000)  # JS equivalent of timestamp_millis
-    tree = get_accessibility_tree()
+    data = capture_accessibility_tree(CompactOptions() if args.compact else None, args.window_filter)
     end_time = int(time.time() * 1000)
     duration = end_time - start_time
 
     if args.event:
         output = {
             "time": start_time,
-            "data": {
-                "duration": duration,
-                "tree": tree
-            }
+            "data": dict({"duration": duration}, **data)
         }
     else:
-        output = tree
+        output = data["tree"]
 
-    json_output = json.dumps(output)
-
-    if args.out:
-        with open(args.out, 'w') as f:
-            f.write(json_output)
-    else:
-        print(json_output)
+    # the json is streamed app by app into the (compressed) file
+    with tracer.span('write', 'io', {'file': args.out or 'stdout'}):
+        if args.out:
+            with open_file(args.out, 'w', args.compress_level) as f:
+                dump_json(output, f)
+        else:
+            print(json.dumps(output))
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,29 @@
-from .extractor import extract_window
-from . import uielement
-from . import files
-from .run import get_tree, get_tree_screenshot, get_app_bundle
\ No newline at end of file
+import importlib
+
+
+# the submodules are imported on first use, so the one-shot CLIs only load
+# what they run (PIL, numpy and the screenshot frameworks stay unloaded for
+# a plain tree dump)
+_LAZY_ATTRIBUTES = {
+    "extract_window": "extractor",
+    "get_tree": "run",
+    "get_tree_screenshot": "run",
+    "get_app_bundle": "run",
+}
+_LAZY_MODULES = {"uielement", "files"}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | _LAZY_MODULES)
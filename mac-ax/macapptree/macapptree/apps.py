@@ -1,5 +1,5 @@
 import ApplicationServices
-import macapptree.uielement as uielement
+from macapptree.ax_backend import CFAttributeToPyObject
 import subprocess
 from time import sleep
 
@@ -19,7 +19,7 @@ def windows_for_application(app):
         else:
             print("Error retrieving attribute")
         return []
-    return uielement.CFAttributeToPyObject(value)
+    return CFAttributeToPyObject(value)
 
 
 def application_for_bundle(app_bundle, workspace):
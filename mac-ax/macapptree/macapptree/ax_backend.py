@@ -0,0 +1,176 @@
+import ApplicationServices
+import Foundation
+import AppKit
+from macapptree.backend import Backend, Point, Size, CHILDREN, MAX_CHILDREN
+
+
+# mutable arrays returned by the accessibility API, aliased here because the
+# double underscore name would be mangled inside the backend class
+NSArrayM = Foundation.__NSArrayM
+
+# the conversion runs for every attribute of every element, so the bridged
+# functions are looked up once instead of through the lazy framework modules
+_CFGetTypeID = Foundation.CFGetTypeID
+_CFNumberGetValue = Foundation.CFNumberGetValue
+_AXValueGetType = ApplicationServices.AXValueGetType
+_AXValueGetValue = ApplicationServices.AXValueGetValue
+
+
+def _number_to_py(number_value):
+    success, int_value = _CFNumberGetValue(
+        number_value, Foundation.kCFNumberIntType, None
+    )
+    if success:
+        return int(int_value)
+
+    success, float_value = _CFNumberGetValue(
+        number_value, Foundation.kCFNumberDoubleType, None
+    )
+    if success:
+        return float(float_value)
+    return None
+
+
+def _list_to_py(list_value):
+    return [CFAttributeToPyObject(item) for item in list_value]
+
+
+def _element_to_py(element_value):
+    return element_value
+
+
+# CF type id -> converter
+CF_TYPE_CONVERTERS = {
+    Foundation.CFStringGetTypeID(): str,
+    Foundation.CFBooleanGetTypeID(): bool,
+    Foundation.CFArrayGetTypeID(): _list_to_py,
+    Foundation.CFNumberGetTypeID(): _number_to_py,
+    ApplicationServices.AXUIElementGetTypeID(): _element_to_py,
+}
+
+# AXValue type -> tuple of the extracted structure
+AX_VALUE_TUPLES = {
+    ApplicationServices.kAXValueCGSizeType: lambda size: (size.width, size.height),
+    ApplicationServices.kAXValueCGPointType: lambda point: (point.x, point.y),
+    ApplicationServices.kAXValueCFRangeType: lambda cf_range: (cf_range.location, cf_range.length),
+}
+
+# AXValue type -> geometry object used by UIElement
+AX_VALUE_OBJECTS = {
+    ApplicationServices.kAXValueCGSizeType: lambda size: Size(size.width, size.height),
+    ApplicationServices.kAXValueCGPointType: lambda point: Point(point.x, point.y),
+}
+
+
+# convert CF attribute to python object
+def CFAttributeToPyObject(attrValue):
+    converter = CF_TYPE_CONVERTERS.get(_CFGetTypeID(attrValue))
+    if converter is not None:
+        return converter(attrValue)
+
+    # did not get a supported CF type. Move on to AX type
+    ax_attr_type = _AXValueGetType(attrValue)
+    to_tuple = AX_VALUE_TUPLES.get(ax_attr_type)
+    if to_tuple is None:
+        return None
+    value = element_value(attrValue, ax_attr_type)
+    if value is None:
+        return None
+    return to_tuple(value)
+
+
+# det accessibility element value
+def element_value(element, type):
+    err, value = _AXValueGetValue(element, type, None)
+    if err == True:
+        return value
+    return None
+
+
+# ApplicationServicesBackend reads the attributes through the macOS
+# accessibility API
+class ApplicationServicesBackend(Backend):
+
+    def attributes(self, element, names):
+        names = list(names)
+        err, values = ApplicationServices.AXUIElementCopyMultipleAttributeValues(
+            element, names, 0, None
+        )
+        if err != ApplicationServices.kAXErrorSuccess or values is None:
+            # the element does not support batched reads, read one by one
+            return {name: self._copy_attribute(element, name) for name in names}
+
+        result = {}
+        for name, value in zip(names, values):
+            value = self._convert(value)
+            if name == CHILDREN and isinstance(value, list):
+                value = value[:MAX_CHILDREN]
+            result[name] = value
+        return result
+
+    def attribute(self, element, name):
+        return self._copy_attribute(element, name)
+
+    def action_names(self, element):
+        error, actions = ApplicationServices.AXUIElementCopyActionNames(element, None)
+        if error == ApplicationServices.kAXErrorSuccess and actions is not None:
+            return actions
+        return []
+
+    def is_element(self, value):
+        return isinstance(value, ApplicationServices.AXUIElementRef)
+
+    def element_at_position(self, x, y):
+        system_component = ApplicationServices.AXUIElementCreateSystemWide()
+        err, value = ApplicationServices.AXUIElementCopyElementAtPosition(
+            system_component, x, y, None
+        )
+        if err == ApplicationServices.kAXErrorSuccess:
+            return value
+        return None
+
+    def point_on_screen(self, x, y):
+        point = AppKit.NSMakePoint(x, y)
+        for screen in AppKit.NSScreen.screens():
+            if AppKit.NSPointInRect(point, screen.frame()):
+                return True
+        return False
+
+    def screen_scaling_factor(self):
+        scaling_factor = 1
+        for screen in AppKit.NSScreen.screens():
+            scaling_factor = screen.backingScaleFactor()
+        return scaling_factor
+
+    def _copy_attribute(self, element, name):
+        if name == CHILDREN:
+            err, value = ApplicationServices.AXUIElementCopyAttributeValues(
+                element, name, 0, MAX_CHILDREN, None
+            )
+            if err == ApplicationServices.kAXErrorSuccess:
+                return self._convert(value)
+        err, value = ApplicationServices.AXUIElementCopyAttributeValue(
+            element, name, None
+        )
+        if err == ApplicationServices.kAXErrorSuccess:
+            return self._convert(value)
+        return None
+
+    # convert the raw attribute value, per-attribute errors of a batched read
+    # are reported as AXValue of the error type
+    def _convert(self, value):
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        if isinstance(value, NSArrayM):
+            return CFAttributeToPyObject(value)
+        if isinstance(value, Foundation.NSArray):
+            return list(value)
+        if isinstance(value, ApplicationServices.AXValueRef):
+            value_type = _AXValueGetType(value)
+            to_object = AX_VALUE_OBJECTS.get(value_type)
+            if to_object is not None:
+                extracted = element_value(value, value_type)
+                return to_object(extracted) if extracted is not None else None
+            if value_type == ApplicationServices.kAXValueAXErrorType:
+                return None
+        return value
@@ -0,0 +1,158 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+
+
+# accessibility attribute names (same values as the kAX*Attribute constants)
+ROLE = "AXRole"
+SUBROLE = "AXSubrole"
+TITLE = "AXTitle"
+ENABLED = "AXEnabled"
+POSITION = "AXPosition"
+SIZE = "AXSize"
+DESCRIPTION = "AXDescription"
+ROLE_DESCRIPTION = "AXRoleDescription"
+VALUE = "AXValue"
+CHILDREN = "AXChildren"
+VISIBLE_CHILDREN = "AXVisibleChildren"
+PARENT = "AXParent"
+WINDOW = "AXWindow"
+WINDOWS = "AXWindows"
+
+# the maximum number of children read for a single element
+MAX_CHILDREN = 999
+
+
+@dataclass
+class Point:
+    x: float
+    y: float
+
+
+@dataclass
+class Size:
+    width: float
+    height: float
+
+
+# Backend is the only layer which talks to the accessibility API. Every method
+# is a single round-trip to the target process, so callers should prefer
+# `attributes` with all the names they need over repeated `attribute` calls.
+# A backend missing one of the abstract methods can not be created.
+class Backend(ABC):
+
+    # fetch several attributes of the element in one call, missing or failed
+    # attributes are returned as None
+    @abstractmethod
+    def attributes(self, element, names):
+        raise NotImplementedError
+
+    # fetch a single attribute of the element
+    def attribute(self, element, name):
+        return self.attributes(element, (name,))[name]
+
+    # get the action names supported by the element
+    @abstractmethod
+    def action_names(self, element):
+        raise NotImplementedError
+
+    # check if the value is an accessibility element
+    @abstractmethod
+    def is_element(self, value):
+        raise NotImplementedError
+
+    # get the element at the screen position
+    @abstractmethod
+    def element_at_position(self, x, y):
+        raise NotImplementedError
+
+    # check if the point lies on any of the screens
+    @abstractmethod
+    def point_on_screen(self, x, y):
+        raise NotImplementedError
+
+    # get the backing scale factor of the screens
+    @abstractmethod
+    def screen_scaling_factor(self):
+        raise NotImplementedError
+
+
+# FakeElement is an in-memory accessibility element used by FakeBackend
+class FakeElement:
+
+    def __init__(self, attributes=None, actions=(), children=None):
+        self.attributes = dict(attributes or {})
+        self.actions = list(actions)
+        if children is not None:
+            self.attributes[CHILDREN] = list(children)
+            for child in children:
+                child.attributes.setdefault(PARENT, self)
+
+    def __repr__(self):
+        return f"FakeElement({self.attributes.get(ROLE)!r}, {self.attributes.get(TITLE)!r})"
+
+
+# FakeBackend serves FakeElement trees and counts every call, so the tree
+# building logic can be exercised without a macOS accessibility session
+class FakeBackend(Backend):
+
+    def __init__(self, hit_targets=(), screens=((0, 0, 1920, 1080),), scaling_factor=1):
+        self.hit_targets = list(hit_targets)
+        self.screens = list(screens)
+        self.scaling_factor = scaling_factor
+        self.calls = Counter()
+
+    def attributes(self, element, names):
+        self.calls["attributes"] += 1
+        result = {}
+        for name in names:
+            value = element.attributes.get(name)
+            if isinstance(value, list):
+                value = list(value[:MAX_CHILDREN] if name == CHILDREN else value)
+            elif isinstance(value, (Point, Size)):
+                value = type(value)(*vars(value).values())
+            result[name] = value
+        return result
+
+    def action_names(self, element):
+        self.calls["action_names"] += 1
+        return list(element.actions)
+
+    def is_element(self, value):
+        return isinstance(value, FakeElement)
+
+    # hit targets are (x1, y1, x2, y2) rectangles paired with elements, the
+    # first rectangle which contains the point wins
+    def element_at_position(self, x, y):
+        self.calls["element_at_position"] += 1
+        for (x1, y1, x2, y2), element in self.hit_targets:
+            if x1 <= x < x2 and y1 <= y < y2:
+                return element
+        return None
+
+    def point_on_screen(self, x, y):
+        for sx, sy, width, height in self.screens:
+            if sx <= x < sx + width and sy <= y < sy + height:
+                return True
+        return False
+
+    def screen_scaling_factor(self):
+        return self.scaling_factor
+
+
+_backend = None
+
+
+# get the backend used for accessibility calls
+def get_backend():
+    global _backend
+    if _backend is None:
+        from macapptree.ax_backend import ApplicationServicesBackend
+        _backend = ApplicationServicesBackend()
+    return _backend
+
+
+# replace the backend used for accessibility calls
+def set_backend(backend):
+    global _backend
+    _backend = backend
@@ -1,6 +1,6 @@
 from macapptree.uielement import UIElement
-import AppKit
-import ApplicationServices
+from macapptree.backend import get_backend, Point, WINDOW
+from axtools.tracing import get_tracer
 import macapptree.uielement as uielement
 import macapptree.files as files
 import macapptree.window_tools as window_tools
@@ -9,70 +9,127 @@ import macapptree.window_tools as window_tools
 # perform a hit test on the specified point
 def hit_test(point, window_element):
     window_point = window_tools.convert_point_to_window(point, window_element.position)
-    system_component = ApplicationServices.AXUIElementCreateSystemWide()
-    err, value = ApplicationServices.AXUIElementCopyElementAtPosition(
-        system_component, window_point.x, window_point.y, None
-    )
-    if err == ApplicationServices.kAXErrorSuccess:
-        return value
-    return None
-
-
-def extract_with_hit_test(window, app_bundle, output_file, print_nodes, max_depth):
-    window_offset_x = window.position.x
-    window_offset_y = window.position.y
-
-    point = AppKit.NSMakePoint(window_offset_x + 50, window_offset_y + 50)
-    group_element = hit_test(point, window)
-
-    if group_element is None:
-        return False
-
-    # find the root window
-    found_root_element = UIElement.find_root_element(group_element)
-    root_element = UIElement(found_root_element, window_offset_x, window_offset_y, max_depth)
-    parent_window = uielement.element_attribute(
-        found_root_element, ApplicationServices.kAXWindowAttribute
-    )
+    return get_backend().element_at_position(window_point.x, window_point.y)
+
+
+# points of a columns x rows grid over the window in screen coordinates
+def grid_points(window, grid):
+    columns, rows = grid
+    origin = window.absolute_position
+    points = []
+    for row in range(rows):
+        for column in range(columns):
+            points.append(Point(
+                origin.x + window.size.width * (column + 0.5) / columns,
+                origin.y + window.size.height * (row + 0.5) / rows,
+            ))
+    return points
+
+
+# add the accessibility elements of the element and all its descendants to
+# the merge index. Equal AX elements refer to the same UI element, so the
+# index does not depend on the ids, which are empty with --skip-hashes
+def index_elements(index, element):
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        index.add(current.ax_element)
+        stack.extend(current.children)
+
+
+# find the root of the hit element, None if it belongs to another window
+def hit_test_root(window, hit_element, offset_x, offset_y):
+    found_root_element = UIElement.find_root_element(hit_element)
+    if found_root_element is None:
+        return None
+    parent_window = uielement.element_attribute(found_root_element, WINDOW)
     if parent_window is not None:
+        # only the window attributes are compared, skip its children
         parent_window_element = UIElement(
-            parent_window, window_offset_x, window_offset_y, max_depth
+            parent_window, offset_x, offset_y, 0, compute_hashes=False
         )
-
-        if window_tools.windows_are_equal(window, parent_window_element):
-            element_not_found = True
-            for child in window.children:
-                if (
-                    child.identifier == root_element.identifier
-                    and child.content_identifier == root_element.content_identifier
-                ):
-                    element_not_found = False
-            if element_not_found:
-                window.children.append(root_element)
-                window.calculate_hashes()
+        if not window_tools.windows_are_equal(window, parent_window_element):
+            return None
+    return found_root_element
+
+
+# hit test the window and merge the found elements which are missing in the
+# tree, e.g. popovers. Without a grid the single point 50 pixels inside the
+# window origin is probed
+def extract_with_hit_test(window, app_bundle, output_file, print_nodes, max_depth, grid=None):
+    if grid is None:
+        window_offset_x = window.position.x
+        window_offset_y = window.position.y
+        points = [Point(window_offset_x + 50, window_offset_y + 50)]
     else:
+        window_offset_x = window.absolute_position.x
+        window_offset_y = window.absolute_position.y
+        points = grid_points(window, grid)
+
+    index = set()
+    index_elements(index, window)
+
+    hit_any = False
+    seen_hits = set()
+    seen_roots = set()
+    merged = []
+    for point in points:
+        group_element = hit_test(point, window)
+        if group_element is None:
+            continue
+        hit_any = True
+
+        # neighbouring points mostly hit the same elements, resolve and build
+        # every root only once
+        if group_element in seen_hits:
+            continue
+        seen_hits.add(group_element)
+        found_root_element = hit_test_root(window, group_element, window_offset_x, window_offset_y)
+        if found_root_element is None or found_root_element in seen_roots:
+            continue
+        seen_roots.add(found_root_element)
+        # the window itself or an element already in the tree
+        if found_root_element in index:
+            continue
+
+        root_element = UIElement(
+            found_root_element, window_offset_x, window_offset_y, max_depth, compute_hashes=window.compute_hashes
+        )
+        index_elements(index, root_element)
+
+        root_element.parent = window
         window.children.append(root_element)
-        window.calculate_hashes()
+        merged.append(root_element)
+
+    if not hit_any:
+        return False
+
+    # the merged subtrees are hashed already, only the window changed
+    if merged:
+        window.update_hashes()
 
     # print the node with its children and attributes
     if print_nodes:
-        uielement.print_node(root_element)
+        for root_element in merged:
+            uielement.print_node(root_element)
 
     files.store_data_to_file(window, output_file)
 
     return True
 
 
-
 # extract the window
 def extract_window(
-    window, app_bundle, output_file, perform_hit_test, print_nodes, max_depth
+    window, app_bundle, output_file, perform_hit_test, print_nodes, max_depth, hit_test_grid=None
 ) -> bool:
     if window is None:
         return False
 
     if perform_hit_test:
-        return extract_with_hit_test(window, app_bundle, output_file, print_nodes, max_depth)
+        with get_tracer().span("hit test", "capture"):
+            return extract_with_hit_test(
+                window, app_bundle, output_file, print_nodes, max_depth, hit_test_grid
+            )
 
     else:
         files.store_data_to_file(window, output_file)
@@ -1,10 +1,64 @@
+from axtools.tracing import get_tracer
+from axtools.compressed import open_file
 import json
 
 
-# store element to the output file as json
-def store_data_to_file(element, output_file):
+# write the element tree as json while walking it, without building the
+# nested dicts or the whole json string in memory first
+def write_element(element, file, indent=None):
+    if indent is None:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+    _write_element(file.write, encoder.encode, element, indent, 0)
+
+
+def _write_element(write, encode, element, indent, level):
+    if indent is None:
+        item_start, key_separator, item_end, list_end = "", ":", "", ""
+    else:
+        item_start = "\n" + " " * (indent * (level + 1))
+        key_separator = ": "
+        item_end = "\n" + " " * (indent * level)
+        list_end = item_start
+
+    chunks = ["{"]
+    for key, value in element.serialized_attributes().items():
+        chunks.append(item_start)
+        chunks.append(encode(key))
+        chunks.append(key_separator)
+        chunks.append(encode(value))
+        chunks.append(",")
+    chunks.append(item_start)
+    chunks.append('"children"')
+    chunks.append(key_separator)
+    if not element.children:
+        chunks.append("[]")
+        chunks.append(item_end)
+        chunks.append("}")
+        write("".join(chunks))
+        return
+
+    chunks.append("[")
+    write("".join(chunks))
+    child_start = "" if indent is None else "\n" + " " * (indent * (level + 2))
+    for index, child in enumerate(element.children):
+        if index > 0:
+            write(",")
+        write(child_start)
+        _write_element(write, encode, child, indent, level + 2)
+    write(list_end)
+    write("]")
+    write(item_end)
+    write("}")
+
+
+# store element to the output file as json, .gz, .xz and .zst files are
+# compressed with the given level
+def store_data_to_file(element, output_file, indent=None, level=None):
     if output_file is None:
         return
-    json_data = json.dumps(element.to_dict(), indent=4)
-    with open(output_file, "w") as f:
-        f.write(json_data)
+    # serialization and writes are interleaved, so they share one span
+    with get_tracer().span("store_data_to_file", "serialize", {"file": output_file}):
+        with open_file(output_file, "w", level) as f:
+            write_element(element, f, indent)
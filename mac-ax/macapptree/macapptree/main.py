@@ -1,10 +1,9 @@
 import AppKit
 import macapptree.apps as apps
-from macapptree.window_tools import store_screen_scaling_factor
+from macapptree.window_tools import store_screen_scaling_factor, windows_matching_title
 from macapptree.uielement import UIElement
 from macapptree.extractor import extract_window
-from macapptree.screenshot_app_window import screenshot_window_to_file
-from macapptree.window_tools import segment_window_components
+from axtools.tracing import Tracer, get_tracer, set_tracer
 import argparse
 import shutil
 import json
@@ -12,13 +11,39 @@ import time
 import os
 
 
-def get_main_window(windows, max_depth):
-    ui_windows = [UIElement(window, max_depth=max_depth) for window in windows]
+# the window with the most elements, of the windows whose title matches
+# title_regex when given; None when no window matches
+def get_main_window(windows, max_depth, compute_hashes=True, title_regex=None):
+    windows = windows_matching_title(windows, title_regex)
+    if not windows:
+        return None
+    ui_windows = []
+    for index, window in enumerate(windows):
+        with get_tracer().span("window", "window", {"window": index}):
+            ui_windows.append(UIElement(window, max_depth=max_depth, compute_hashes=compute_hashes))
     main_window = max([(window, len(window.recursive_children())) for window in ui_windows], key=lambda x: x[1])[0]
     return main_window
 
 
-def main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth):
+def main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth, compute_hashes=True, hit_test_grid=None,
+         record_file=None, trace_file=None, trace_every=1, title_regex=None):
+    if trace_file:
+        set_tracer(Tracer(trace_every))
+        try:
+            return main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth, compute_hashes,
+                        hit_test_grid, record_file, title_regex=title_regex)
+        finally:
+            get_tracer().save(trace_file)
+
+    if record_file:
+        from macapptree.replay import start_recording
+        recorder = start_recording()
+        try:
+            return main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth, compute_hashes,
+                        hit_test_grid, title_regex=title_regex)
+        finally:
+            recorder.save(record_file)
+
     # store the screen scaling factor
     store_screen_scaling_factor()
 
@@ -31,13 +56,18 @@ def main(app_bundle, output_accessibility_file, output_screenshot_file, max_dept
 
     application = apps.application_for_process_id(app.processIdentifier())
 
-    windows = apps.windows_for_application(application)
-    window_element = get_main_window(windows, max_depth)
+    tracer = get_tracer()
+    with tracer.span("windows", "capture"):
+        windows = apps.windows_for_application(application)
+    window_element = get_main_window(windows, max_depth, compute_hashes, title_regex)
+    if window_element is None:
+        raise ValueError(f"No window of {app_bundle} has a title matching {title_regex!r}")
 
     # output_accessibility_file_hit = output_accessibility_file.replace(".tmp", "_hit.tmp")
 
     extracted = extract_window(
-            window_element, app_bundle, output_accessibility_file, False, False, max_depth
+            window_element, app_bundle, output_accessibility_file, hit_test_grid is not None, False, max_depth,
+            hit_test_grid
         )
     
     # extracted_hit = extract_window(
@@ -56,8 +86,21 @@ def main(app_bundle, output_accessibility_file, output_screenshot_file, max_dept
     #     shutil.move(output_accessibility_file_hit, output_accessibility_file)
     
     if output_screenshot_file:
-        output_croped, _ = screenshot_window_to_file(app.localizedName(), window_element.name, output_screenshot_file)
-        output_segmented = segment_window_components(window_element, output_croped)
+        # Quartz, PIL and numpy are only loaded when a screenshot is requested
+        from macapptree.screenshot_app_window import screenshot_window
+        from macapptree.window_tools import segment_window_image
+
+        # the images stay in memory until they are encoded once here
+        with tracer.span("screenshot", "capture"):
+            croped_image, _ = screenshot_window(app.localizedName(), window_element.name)
+        with tracer.span("segment", "capture"):
+            segmented_image = segment_window_image(window_element, croped_image)
+
+        output_croped = output_screenshot_file
+        output_segmented = output_screenshot_file.replace(".png", "_segmented.png")
+        with tracer.span("save images", "io"):
+            croped_image.save(output_croped)
+            segmented_image.save(output_segmented)
 
         print(json.dumps({
             "croped_screenshot_path": output_croped,
@@ -73,12 +116,29 @@ if __name__ == "__main__":
     arg_parser.add_argument("--oa", type=str, required=True, help="Accessibility output file")
     arg_parser.add_argument("--os", type=str, default=None, required=False, help="Screenshot output file")
     arg_parser.add_argument("--max-depth", type=int, required=False, help="Maximum depth of the accessibility")
+    arg_parser.add_argument("--skip-hashes", action="store_true", help="Do not calculate the element ids")
+    arg_parser.add_argument("--hit-test-grid", type=str, default=None, required=False,
+                            help="Merge the elements found by hit testing a COLUMNSxROWS grid of points, e.g. 4x3")
+    arg_parser.add_argument("--title-regex", type=str, default=None, required=False,
+                            help="Capture the window with a title matching this regular expression")
+    arg_parser.add_argument("--record", type=str, default=None, required=False,
+                            help="Record every accessibility call with its result and latency to this file")
+    arg_parser.add_argument("--trace", type=str, default=None, required=False,
+                            help="Write Chrome trace events (chrome://tracing, Perfetto) to this file")
+    arg_parser.add_argument("--trace-every", type=int, default=1, required=False,
+                            help="Trace the accessibility calls of every Nth element only")
 
     args = arg_parser.parse_args()
     app_bundle = args.a
     output_accessibility_file = args.oa
     output_screenshot_file = args.os
     max_depth = args.max_depth
+    compute_hashes = not args.skip_hashes
+    hit_test_grid = None
+    if args.hit_test_grid:
+        columns, rows = args.hit_test_grid.lower().split("x")
+        hit_test_grid = (int(columns), int(rows))
 
     # start processing all the running applications or the specified application
-    main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth)
+    main(app_bundle, output_accessibility_file, output_screenshot_file, max_depth, compute_hashes, hit_test_grid,
+         args.record, args.trace, args.trace_every, args.title_regex)
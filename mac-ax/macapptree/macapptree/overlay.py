@@ -0,0 +1,210 @@
+from dataclasses import dataclass
+from multiprocessing import Pool
+from PIL import Image, ImageColor, ImageDraw
+import numpy as np
+import json
+
+
+# outline color of every role, other roles are drawn with DEFAULT_COLOR
+DEFAULT_COLOR = "red"
+ROLE_COLORS = {
+    "AXButton": "blue",
+    "AXTextField": "green",
+    "AXStaticText": "yellow",
+    "AXImage": "purple",
+    "AXGroup": "orange",
+    "AXScrollBar": "brown",
+    "AXRow": "pink",
+    "AXColumn": "cyan",
+    "AXCell": "magenta",
+    "AXTable": "lightblue",
+    "AXOutline": "lightgreen",
+    "AXLayoutArea": "lightyellow",
+    "AXLayoutItem": "lavender",
+    "AXHandle": "peachpuff",
+    "AXSplitter": "lightsalmon",
+    "AXIncrementor": "lightpink",
+    "AXBusyIndicator": "lightcyan",
+    "AXProgressIndicator": "plum",
+    "AXToolbar": "darkred",
+    "AXPopover": "darkblue",
+    "AXMenu": "darkgreen",
+    "AXMenuItem": "olive",
+    "AXMenuBar": "rebeccapurple",
+    "AXMenuBarItem": "darkorange",
+    "AXMenuButton": "saddlebrown",
+    "AXMenuItemCheckbox": "palevioletred",
+    "AXMenuItemRadio": "darkcyan",
+    "AXMenuItemPopover": "darkmagenta",
+    "AXMenuItemSplitter": "black",
+    "AXMenuItemTable": "white",
+    "AXMenuItemTextField": "lightgray",
+    "AXMenuItemStaticText": "darkgray",
+    "AXMenuItemImage": "salmon",
+    "AXMenuItemGroup": "lightblue",
+    "AXMenuItemScrollBar": "lightgreen",
+    "AXMenuItemRow": "lightyellow",
+    "AXMenuItemColumn": "lavender",
+    "AXMenuItemCell": "peachpuff",
+    "AXMenuItemOutline": "burlywood",
+    "AXMenuItemLayoutArea": "lightpink",
+    "AXMenuItemLayoutItem": "lightcyan",
+    "AXMenuItemHandle": "plum",
+    "AXMenuItemIncrementor": "darkblue",
+    "AXMenuItemBusyIndicator": "darkgreen",
+    "AXMenuItemProgressIndicator": "darkyellow",
+    "AXMenuItemToolbar": "rebeccapurple",
+}
+
+# role code 0 is every role missing in ROLE_COLORS
+ROLE_CODES = {role: code for code, role in enumerate(ROLE_COLORS, start=1)}
+ROLE_NAMES = [None] + list(ROLE_COLORS)
+
+
+def _palette():
+    palette = np.zeros((len(ROLE_NAMES), 3), dtype=np.uint8)
+    drawable = np.ones(len(ROLE_NAMES), dtype=bool)
+    for code, color in enumerate([DEFAULT_COLOR] + list(ROLE_COLORS.values())):
+        try:
+            palette[code] = ImageColor.getrgb(color)[:3]
+        except ValueError:
+            # unknown color names are not drawn
+            drawable[code] = False
+    return palette, drawable
+
+
+PALETTE, DRAWABLE = _palette()
+PALETTE_COLORS = [tuple(color) for color in PALETTE.tolist()]
+
+# outline width in pixels
+OUTLINE_WIDTH = 2
+
+
+# Segments are the rectangles of the drawn elements in pixels, (x0, y0, x1,
+# y1) with inclusive corners, and their role codes in drawing order
+@dataclass
+class Segments:
+    rects: np.ndarray
+    codes: np.ndarray
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _parse_size(size):
+    if not size:
+        return None
+    width, height = size.split(";")
+    return float(width), float(height)
+
+
+# flatten the children of the window into segments, accepts UIElement trees
+# and their to_dict() form. Elements without a visible bbox or size are
+# skipped together with their children
+def flatten_segments(window, scaling_factor=1):
+    bboxes = []
+    heights = []
+    codes = []
+    is_dict = isinstance(window, dict)
+    stack = list(reversed(window["children"] if is_dict else window.children))
+    while stack:
+        element = stack.pop()
+        if is_dict:
+            bbox = element.get("visible_bbox")
+            size = _parse_size(element.get("size"))
+            role = element.get("role")
+            children = element.get("children", [])
+        else:
+            bbox = element.visible_bbox
+            size = None if element.size is None else (element.size.width, element.size.height)
+            role = element.role
+            children = element.children
+
+        # skip the element if it has no size
+        if bbox is None or size is None or size[0] == 0 or size[1] == 0:
+            continue
+
+        bboxes.append(bbox)
+        heights.append(size[1])
+        codes.append(ROLE_CODES.get(role, 0))
+        stack.extend(reversed(children))
+
+    rects = np.array(bboxes, dtype=np.float64).reshape(-1, 4) * scaling_factor
+    # update the bottom right coordinate to support retina displays
+    height_offset = np.where(np.array(heights) < 2, 0, 2)
+    rects[:, 2] -= 1
+    rects[:, 3] += 1 - height_offset
+    for start, end in ((0, 2), (1, 3)):
+        collapsed = (rects[:, end] < 0) | (rects[:, end] < rects[:, start])
+        rects[collapsed, end] = rects[collapsed, start]
+    return Segments(rects, np.array(codes, dtype=np.int64))
+
+
+# index of the last segment which covers the pixel, -1 elsewhere. The
+# segments are painted in drawing order with one slice assignment each, so
+# the loop costs a Python step per segment and the pixel writes run in
+# NumPy. Resolving all segments at once per pixel would need memory for the
+# summed area of the segments, which nested elements make a multiple of the
+# image. Segments outside the mask are dropped before the loop
+def fill_mask(segments, shape):
+    mask = np.full(shape, -1, dtype=np.int32)
+    rects = np.maximum(segments.rects, 0).astype(np.int64)
+    rects[:, 2:] += 1
+    rects[:, [0, 2]] = np.minimum(rects[:, [0, 2]], shape[1])
+    rects[:, [1, 3]] = np.minimum(rects[:, [1, 3]], shape[0])
+    visible = np.flatnonzero((rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1]))
+    # later segments are drawn over the earlier ones
+    for index, (x0, y0, x1, y1) in zip(visible.tolist(), rects[visible].tolist()):
+        mask[y0:y1, x0:x1] = index
+    return mask
+
+
+# per pixel role codes of the filled segments, 0 is the background and the
+# role codes are shifted by one
+def label_mask(segments, shape):
+    mask = fill_mask(segments, shape)
+    codes = np.concatenate([[0], segments.codes + 1]).astype(np.uint8)
+    return codes[mask + 1]
+
+
+# draw the outlines of the segments on a copy of the image. Coordinates and
+# colors are prepared for all segments at once, the strokes themselves are
+# drawn by PIL which is faster than expanding every outline into pixels
+def render_segments(image, segments, outline_width=OUTLINE_WIDTH):
+    segmented_image = image.copy()
+    draw = ImageDraw.Draw(segmented_image)
+    drawable = DRAWABLE[segments.codes]
+    rectangle = draw.rectangle
+    for rect, code in zip(segments.rects[drawable].tolist(), segments.codes[drawable].tolist()):
+        rectangle(rect, outline=PALETTE_COLORS[code], width=outline_width)
+    return segmented_image
+
+
+def _load_tree(tree):
+    if isinstance(tree, str):
+        with open(tree) as f:
+            tree = json.load(f)
+    return tree
+
+
+def _render_job(job):
+    image_path, tree, output_path, scaling_factor = job
+    if not isinstance(tree, Segments):
+        tree = flatten_segments(_load_tree(tree), scaling_factor)
+    with Image.open(image_path) as image:
+        render_segments(image, tree).save(output_path)
+    return output_path
+
+
+# render many overlays in a process pool, jobs are (image_path, tree,
+# output_path) with the tree as UIElement, to_dict() form or json file path
+def render_batch(jobs, processes=None, scaling_factor=1, chunksize=8):
+    prepared = []
+    for image_path, tree, output_path in jobs:
+        if not isinstance(tree, (dict, str)):
+            # UIElement trees hold accessibility references, send the segments
+            tree = flatten_segments(tree, scaling_factor)
+        prepared.append((image_path, tree, output_path, scaling_factor))
+
+    with Pool(processes) as pool:
+        return list(pool.imap(_render_job, prepared, chunksize))
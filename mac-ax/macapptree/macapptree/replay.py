@@ -0,0 +1,271 @@
+from macapptree.backend import Backend, Point, Size, get_backend, set_backend
+from macapptree.uielement import UIElement
+from macapptree import files
+from collections import defaultdict, deque
+import argparse
+import threading
+import json
+import time
+
+
+RECORDING_VERSION = 1
+
+# shortest sleep used to replay the recorded latencies
+MIN_SLEEP = 0.001
+
+
+# RecordingBackend forwards every call to the wrapped backend and logs the
+# arguments, the result and the latency. Elements are logged by number, the
+# elements which were passed in before any call returned them are the roots
+# of the recording (usually the windows)
+class RecordingBackend(Backend):
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.calls = []
+        self.element_ids = {}
+        self.roots = []
+
+    def attributes(self, element, names):
+        return self._record("attributes", element, list(names))
+
+    def attribute(self, element, name):
+        return self._record("attribute", element, name)
+
+    def action_names(self, element):
+        return self._record("action_names", element)
+
+    def is_element(self, value):
+        return self.backend.is_element(value)
+
+    def element_at_position(self, x, y):
+        return self._record("element_at_position", None, x, y)
+
+    def point_on_screen(self, x, y):
+        return self._record("point_on_screen", None, x, y)
+
+    def screen_scaling_factor(self):
+        return self._record("screen_scaling_factor", None)
+
+    def _record(self, call, element, *args):
+        start = time.perf_counter()
+        if element is None:
+            result = getattr(self.backend, call)(*args)
+        else:
+            result = getattr(self.backend, call)(element, *args)
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            entry = {"call": call, "latency": latency, "args": list(args)}
+            if element is not None:
+                entry["element"] = self._element_id(element, root=True)
+            entry["result"] = self._encode(result)
+            self.calls.append(entry)
+        return result
+
+    def _element_id(self, element, root=False):
+        element_id = self.element_ids.get(element)
+        if element_id is None:
+            element_id = self.element_ids[element] = len(self.element_ids)
+            if root:
+                self.roots.append(element_id)
+        return element_id
+
+    def _encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._encode(item) for key, item in value.items()}
+        if isinstance(value, Point):
+            return {"$point": [value.x, value.y]}
+        if isinstance(value, Size):
+            return {"$size": [value.width, value.height]}
+        if self.backend.is_element(value):
+            return {"$element": self._element_id(value)}
+        # dates and other foundation objects are only ever serialized as text
+        return {"$str": str(value)}
+
+    def save(self, path):
+        with self.lock:
+            recording = {"version": RECORDING_VERSION, "roots": list(self.roots), "calls": list(self.calls)}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False)
+
+
+# ReplayElement stands in for a recorded element
+class ReplayElement:
+
+    def __init__(self, element_id):
+        self.element_id = element_id
+
+    def __repr__(self):
+        return f"ReplayElement({self.element_id})"
+
+
+# ReplayBackend serves the calls of a recording. Repeated calls get the
+# recorded results in order, the last one is reused once they run out, and
+# attributes are also served from everything recorded for the element, so
+# reads of other attribute combinations still work. With latencies every
+# result is delayed by the recorded latency times latency_scale
+class ReplayBackend(Backend):
+
+    def __init__(self, recording, latencies=False, latency_scale=1.0):
+        self.latencies = latencies
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.owed = threading.local()
+        self.elements = {}
+        self.entries = defaultdict(deque)
+        self.known_attributes = defaultdict(dict)
+        self.root_ids = recording.get("roots", [])
+        self.scaling_factor = 1
+
+        for entry in recording["calls"]:
+            entry = dict(entry, result=self._decode(entry["result"]))
+            self.entries[self._key(entry["call"], entry.get("element"), entry["args"])].append(entry)
+            if entry["call"] == "attributes":
+                self.known_attributes[entry["element"]].update(entry["result"])
+            elif entry["call"] == "attribute":
+                self.known_attributes[entry["element"]][entry["args"][0]] = entry["result"]
+            elif entry["call"] == "screen_scaling_factor":
+                self.scaling_factor = entry["result"]
+
+    @classmethod
+    def load(cls, path, latencies=False, latency_scale=1.0):
+        with open(path, encoding="utf-8") as f:
+            recording = json.load(f)
+        if recording.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {recording.get('version')}")
+        return cls(recording, latencies, latency_scale)
+
+    # get the elements the recording started from
+    def roots(self):
+        return [self._element(element_id) for element_id in self.root_ids]
+
+    def attributes(self, element, names):
+        names = list(names)
+        entry = self._next("attributes", element, [names])
+        if entry is not None:
+            return self._result(entry)
+        known = self.known_attributes.get(element.element_id, {})
+        return {name: known.get(name) for name in names}
+
+    def attribute(self, element, name):
+        entry = self._next("attribute", element, [name])
+        if entry is not None:
+            return self._result(entry)
+        return self.known_attributes.get(element.element_id, {}).get(name)
+
+    def action_names(self, element):
+        entry = self._next("action_names", element, [])
+        return self._result(entry) if entry is not None else []
+
+    def is_element(self, value):
+        return isinstance(value, ReplayElement)
+
+    def element_at_position(self, x, y):
+        entry = self._next("element_at_position", None, [x, y])
+        return self._result(entry) if entry is not None else None
+
+    def point_on_screen(self, x, y):
+        entry = self._next("point_on_screen", None, [x, y])
+        return self._result(entry) if entry is not None else False
+
+    def screen_scaling_factor(self):
+        return self.scaling_factor
+
+    def _key(self, call, element_id, args):
+        return call, element_id, json.dumps(args)
+
+    def _next(self, call, element, args):
+        element_id = element.element_id if element is not None else None
+        with self.lock:
+            queue = self.entries.get(self._key(call, element_id, args))
+            if not queue:
+                return None
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def _result(self, entry):
+        if self.latencies:
+            self._delay(entry["latency"] * self.latency_scale)
+        result = entry["result"]
+        # hand out copies, the callers may modify the values
+        if isinstance(result, dict):
+            return {name: self._copy(value) for name, value in result.items()}
+        return self._copy(result)
+
+    def _copy(self, value):
+        if isinstance(value, list):
+            return list(value)
+        if isinstance(value, (Point, Size)):
+            return type(value)(*vars(value).values())
+        return value
+
+    # short latencies are collected per thread and slept off once they add up,
+    # sleeping for every sub-millisecond call would cost more than the call
+    def _delay(self, latency):
+        owed = getattr(self.owed, "latency", 0.0) + latency
+        if owed >= MIN_SLEEP:
+            start = time.perf_counter()
+            time.sleep(owed)
+            owed -= time.perf_counter() - start
+        self.owed.latency = owed
+
+    def _element(self, element_id):
+        element = self.elements.get(element_id)
+        if element is None:
+            element = self.elements[element_id] = ReplayElement(element_id)
+        return element
+
+    def _decode(self, value):
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        if isinstance(value, dict):
+            if "$point" in value:
+                return Point(*value["$point"])
+            if "$size" in value:
+                return Size(*value["$size"])
+            if "$element" in value:
+                return self._element(value["$element"])
+            if "$str" in value:
+                return value["$str"]
+            return {key: self._decode(item) for key, item in value.items()}
+        return value
+
+
+# start recording the calls of the current backend
+def start_recording():
+    recorder = RecordingBackend(get_backend())
+    set_backend(recorder)
+    return recorder
+
+
+# rebuild the trees of a recording with the replay backend
+def replay_trees(path, max_depth=None, latencies=False, latency_scale=1.0, compute_hashes=True):
+    backend = ReplayBackend.load(path, latencies, latency_scale)
+    set_backend(backend)
+    return [UIElement(root, max_depth=max_depth, compute_hashes=compute_hashes) for root in backend.roots()]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Rebuild the accessibility trees of a recording")
+
+    arg_parser.add_argument("recording", type=str, help="Recording written with --record")
+    arg_parser.add_argument("-o", type=str, default=None, required=False, help="Output file for the largest tree")
+    arg_parser.add_argument("--max-depth", type=int, required=False, help="Maximum depth of the accessibility")
+    arg_parser.add_argument("--latency", type=float, default=None, required=False,
+                            help="Delay the replayed calls by their recorded latency times this factor")
+
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    trees = replay_trees(args.recording, args.max_depth, args.latency is not None,
+                         args.latency if args.latency is not None else 1.0)
+    elapsed = time.perf_counter() - start
+    nodes = sum(1 + len(tree.recursive_children()) for tree in trees)
+    print(f"Replayed {len(trees)} trees with {nodes} elements in {elapsed:.3f}s")
+    if args.o and trees:
+        files.store_data_to_file(max(trees, key=lambda tree: len(tree.recursive_children())), args.o)
@@ -1,4 +1,3 @@
-from PIL import Image
 import subprocess
 import tempfile
 import json
@@ -29,13 +28,19 @@ def launch_app(app_bundle):
         raise e
 
 
-def get_tree(app_bundle, max_depth=None):
+def get_tree(app_bundle, max_depth=None, compute_hashes=True, trace_file=None, trace_every=1, title_regex=None):
     launch_app(app_bundle)
 
     tmp_file = tempfile.NamedTemporaryFile(delete=False)
     command = ["python", "-m", "macapptree.main", "-a", app_bundle, "--oa", tmp_file.name]
     if max_depth:
         command.extend(["--max-depth", str(max_depth)])
+    if not compute_hashes:
+        command.append("--skip-hashes")
+    if trace_file:
+        command.extend(["--trace", trace_file, "--trace-every", str(trace_every)])
+    if title_regex:
+        command.extend(["--title-regex", title_regex])
     try:
         subprocess.check_call(command)
         return json.load(tmp_file)
@@ -47,6 +52,8 @@ def get_tree(app_bundle, max_depth=None):
 
 
 def get_tree_screenshot(app_bundle, max_depth=None):
+    from PIL import Image
+
     launch_app(app_bundle)
     
     a11y_tmp_file = tempfile.NamedTemporaryFile(delete=False)
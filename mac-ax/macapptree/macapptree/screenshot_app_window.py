@@ -8,6 +8,7 @@ import AppKit
 from unidecode import unidecode
 from PIL import Image
 from macapptree.exceptions import WindowNotFoundException
+from macapptree.window_tools import crop_window
 
 
 class ScreencaptureEx(Exception):
@@ -103,31 +104,62 @@ def get_filename(window_name, extension, add_cursor_move) -> str:
 def crop_screenshot(image_path, window_coords, output_path):
     backing_scale_factor = AppKit.NSScreen.mainScreen().backingScaleFactor()
 
-    # Load the screenshot image
-    screenshot = Image.open(image_path)
-
-    # Unpack the window coordinates (left, top, width, height)
-    left, top, width, height = window_coords
-
-    # Calculate the right and bottom coordinates
-    right = left + width
-    bottom = top + height
-
-    # Crop the image using the window's bounds
-    cropped_image = screenshot.crop((int(left * backing_scale_factor),
-                                     int(top * backing_scale_factor),
-                                     int(right * backing_scale_factor),
-                                     int(bottom * backing_scale_factor)))
+    # Load the screenshot image and crop it using the window's bounds
+    with Image.open(image_path) as screenshot:
+        cropped_image = crop_window(screenshot, window_coords, backing_scale_factor)
 
     # Save the cropped image
     cropped_image.save(output_path)
+    left, top, width, height = window_coords
     scaled_coors = (int(left ),
                     int(top ),
-                    int(right ),
-                    int(bottom ))
+                    int(left + width),
+                    int(top + height))
     return scaled_coors
 
 
+# capture the screen into memory, bounds are (left, top, width, height) in
+# global display coordinates, the image of all displays without them
+def capture_screen(bounds=None) -> Image.Image:
+    if bounds is None:
+        rect = Quartz.CGRectInfinite
+    else:
+        rect = Quartz.CGRectMake(*bounds)
+    cg_image = Quartz.CGWindowListCreateImage(
+        rect,
+        Quartz.kCGWindowListOptionOnScreenOnly,
+        Quartz.kCGNullWindowID,
+        Quartz.kCGWindowImageDefault,
+    )
+    if cg_image is None:
+        raise ScreencaptureEx("Error: could not capture the screen")
+    width = Quartz.CGImageGetWidth(cg_image)
+    height = Quartz.CGImageGetHeight(cg_image)
+    bytes_per_row = Quartz.CGImageGetBytesPerRow(cg_image)
+    data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(cg_image))
+    return Image.frombuffer("RGBA", (width, height), bytes(data), "raw", "BGRA", bytes_per_row, 1)
+
+
+# capture the window into memory, returns the image and the window bounds as
+# (left, top, right, bottom)
+def screenshot_window(
+        app_name: str,
+        window_name: str
+) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+    _, _, window_coords = find_window(app_name, window_name)
+    left, top, width, height = window_coords
+    # only the window area is captured: the image of all displays starts at
+    # the top-left display, not at the origin of the window coordinates
+    image = capture_screen(window_coords)
+    # the image has the scale of the display showing the window, the
+    # segments are drawn with the scale of the main display
+    backing_scale_factor = AppKit.NSScreen.mainScreen().backingScaleFactor()
+    size = (int(width * backing_scale_factor), int(height * backing_scale_factor))
+    if image.size != size:
+        image = image.resize(size)
+    return image, (int(left), int(top), int(left + width), int(top + height))
+
+
 def find_window(
         app_name: str,
         window_name: str
@@ -163,13 +195,10 @@ def screenshot_window_to_file(
         window_name: str,
         output_file: str
 ) -> str:
-    identifier, _, window_coords = find_window(app_name, window_name)
-    take_screenshot(identifier, output_file)
+    cropped_image, scaled_coors = screenshot_window(app_name, window_name)
     _, extension = os.path.splitext(output_file)
-    time.sleep(0.4)
     filename_cropped = output_file.replace(f".{extension}", f"_cropped.{extension}")
-    scaled_coors = crop_screenshot(output_file, window_coords, filename_cropped)
-    time.sleep(0.4)
+    cropped_image.save(filename_cropped)
     return filename_cropped, scaled_coors
 
 
@@ -189,13 +218,11 @@ def screenshot_windows(
             name = element_identifier
         file_name = get_filename(name, extension, add_cursor_move)
         file_path = take_screenshot(identifier, file_name, output_folder)
-        time.sleep(0.4)
 
         file_path_cropped = file_path.replace(f".{extension}", f"_cropped.{extension}")
         file_name_cropped = file_name.replace(f".{extension}", f"_cropped.{extension}")
 
         scaled_coors = crop_screenshot(file_path, window_coords, file_path_cropped)
-        time.sleep(0.4)
         return (file_name_cropped, scaled_coors)
     except Exception as e:
         print(repr(e))
@@ -1,62 +1,54 @@
-from hashlib import md5
-import ApplicationServices
-import Foundation
-import AppKit
-import re
-import json
+from hashlib import blake2s
+from macapptree.backend import (
+    get_backend,
+    ROLE,
+    SUBROLE,
+    TITLE,
+    ENABLED,
+    POSITION,
+    SIZE,
+    DESCRIPTION,
+    ROLE_DESCRIPTION,
+    VALUE,
+    CHILDREN,
+    VISIBLE_CHILDREN,
+    PARENT,
+)
+from axtools.tracing import get_tracer, NULL_TRACER
+from axtools.cache import get_element_cache
 import copy
 
 
-# convert CF attribute to python object
-def CFAttributeToPyObject(attrValue):
-    def list_helper(list_value):
-        list_builder = []
-        for item in list_value:
-            list_builder.append(CFAttributeToPyObject(item))
-        return list_builder
+# attributes read for every element in a single batched call
+LEAF_ATTRIBUTES = (ROLE, TITLE, ENABLED, POSITION, SIZE, DESCRIPTION, ROLE_DESCRIPTION, VALUE)
+NODE_ATTRIBUTES = LEAF_ATTRIBUTES + (CHILDREN, VISIBLE_CHILDREN)
+# attributes served by the element cache, the others are read every time
+STATIC_ATTRIBUTES = (ROLE, ROLE_DESCRIPTION)
+VOLATILE_LEAF_ATTRIBUTES = tuple(name for name in LEAF_ATTRIBUTES if name not in STATIC_ATTRIBUTES)
+VOLATILE_NODE_ATTRIBUTES = VOLATILE_LEAF_ATTRIBUTES + (CHILDREN, VISIBLE_CHILDREN)
 
-    def number_helper(number_value):
-        success, int_value = Foundation.CFNumberGetValue(
-            number_value, Foundation.kCFNumberIntType, None
-        )
-        if success:
-            return int(int_value)
 
-        success, float_value = Foundation.CFNumberGetValue(
-            number_value, Foundation.kCFNumberDoubleType, None
-        )
-        if success:
-            return float(float_value)
+# get the cached static attributes of the element, None on a miss
+def cached_entry(cache, element):
+    try:
+        return cache.get(element)
+    except TypeError:
+        # elements which can not be hashed are never cached
         return None
 
-    def axuielement_helper(element_value):
-        return element_value
-
-    cf_attr_type = Foundation.CFGetTypeID(attrValue)
-    cf_type_mapping = {
-        Foundation.CFStringGetTypeID(): str,
-        Foundation.CFBooleanGetTypeID(): bool,
-        Foundation.CFArrayGetTypeID(): list_helper,
-        Foundation.CFNumberGetTypeID(): number_helper,
-        ApplicationServices.AXUIElementGetTypeID(): axuielement_helper,
-    }
-    try:
-        return cf_type_mapping[cf_attr_type](attrValue)
-    except KeyError:
-        # did not get a supported CF type. Move on to AX type
-        pass
-
-    ax_attr_type = ApplicationServices.AXValueGetType(attrValue)
-    ax_type_map = {
-        ApplicationServices.kAXValueCGSizeType: Foundation.NSSizeFromString,
-        ApplicationServices.kAXValueCGPointType: Foundation.NSPointFromString,
-        ApplicationServices.kAXValueCFRangeType: Foundation.NSRangeFromString,
-    }
+
+# cache the static attributes of the element, elements without a role are
+# left out as they are usually gone already
+def cache_entry(cache, element, attributes):
+    if attributes[ROLE] is None:
+        return None
+    entry = {name: attributes[name] for name in STATIC_ATTRIBUTES}
+    entry["actions"] = None
     try:
-        extracted_str = re.search("{.*}", attrValue.description()).group()
-        return tuple(ax_type_map[ax_attr_type](extracted_str))
-    except KeyError:
+        cache.put(element, entry)
+    except TypeError:
         return None
+    return entry
 
 
 # UIElement class which represents accessibility element and all its attributes
@@ -64,13 +56,39 @@ class UIElement:
 
     # calculate hash for the element
     def calculate_hashes(self):
+        if not self.compute_hashes:
+            return
         self.identifier = self.component_hash()
         self.content_identifier = self.children_content_hash(self.children)
 
-    def __init__(self, element, offset_x=0, offset_y=0, max_depth=None, parents_visible_bbox=None):
+    # recalculate the hashes of the element and its ancestors only, the
+    # hashes of the other elements do not depend on the changed children
+    def update_hashes(self):
+        element = self
+        while element is not None:
+            element.calculate_hashes()
+            element = element.parent
+
+    # add a child and update the hashes
+    def add_child(self, child):
+        child.parent = self
+        self.children.append(child)
+        self.update_hashes()
+
+    # replace a child and update the hashes
+    def replace_child(self, old_child, new_child):
+        index = self.children.index(old_child)
+        old_child.parent = None
+        new_child.parent = self
+        self.children[index] = new_child
+        self.update_hashes()
+
+    def __init__(self, element, offset_x=0, offset_y=0, max_depth=None, parents_visible_bbox=None, compute_hashes=True):
         # set attributes
 
         self.ax_element = element
+        self.parent = None
+        self.compute_hashes = compute_hashes
         self.content_identifier = ""
         self.identifier = ""
         self.name = ""
@@ -81,31 +99,46 @@ class UIElement:
         self.value = None
         self.max_depth = max_depth
 
+        # spans of the accessibility calls, for every Nth element only
+        trace = get_tracer().sample()
+
+        # with a warm cache only the volatile attributes are read
+        cache = get_element_cache()
+        self.cache_entry = cached_entry(cache, element) if cache is not None else None
+
+        # read all the attributes of the element at once
+        backend = get_backend()
+        read_children = self.max_depth is None or self.max_depth > 0
+        with trace.span("attributes", "fetch"):
+            if self.cache_entry is not None:
+                attributes = backend.attributes(
+                    element, VOLATILE_NODE_ATTRIBUTES if read_children else VOLATILE_LEAF_ATTRIBUTES
+                )
+                attributes.update((name, self.cache_entry[name]) for name in STATIC_ATTRIBUTES)
+            else:
+                attributes = backend.attributes(element, NODE_ATTRIBUTES if read_children else LEAF_ATTRIBUTES)
+                if cache is not None:
+                    self.cache_entry = cache_entry(cache, element, attributes)
+
         # set role
-        self.role = element_attribute(element, ApplicationServices.kAXRoleAttribute)
+        self.role = attributes[ROLE]
         if self.role is None:
             self.role = "No role"
 
         # set name
-        self.name = element_attribute(element, ApplicationServices.kAXTitleAttribute)
+        self.name = attributes[TITLE]
         if self.name is not None:
             self.name = self.name.replace(" ", "_")
 
         # set enabled
-        self.enabled = element_attribute(
-            element, ApplicationServices.kAXEnabledAttribute
-        )
+        self.enabled = attributes[ENABLED]
         if self.enabled is None:
             self.enabled = False
 
         # set position and size
-        position = element_attribute(element, ApplicationServices.kAXPositionAttribute)
-        size = element_attribute(element, ApplicationServices.kAXSizeAttribute)
-        start_position = element_value(
-            position, ApplicationServices.kAXValueCGPointType
-        )
+        start_position = attributes[POSITION]
 
-        if self.role == "AXWindow":
+        if self.role == "AXWindow" and start_position is not None:
             offset_x = start_position.x
             offset_y = start_position.y
 
@@ -114,7 +147,7 @@ class UIElement:
         if self.position is not None:
             self.position.x -= max(0, offset_x)
             self.position.y -= max(0, offset_y)
-        self.size = element_value(size, ApplicationServices.kAXValueCGSizeType)
+        self.size = attributes[SIZE]
 
         self._set_bboxes(parents_visible_bbox)
 
@@ -126,33 +159,31 @@ class UIElement:
             start_position.y + offset_y + self.size.height / 2,
         )
 
-        self.description = element_attribute(
-            element, ApplicationServices.kAXDescriptionAttribute
-        )
-        self.role_description = element_attribute(
-            element, ApplicationServices.kAXRoleDescriptionAttribute
-        )
-        attribute_value = element_attribute(
-            element, ApplicationServices.kAXValueAttribute
-        )
+        self.description = attributes[DESCRIPTION]
+        self.role_description = attributes[ROLE_DESCRIPTION]
+        attribute_value = attributes[VALUE]
 
         # set value
         self.value = attribute_value
         if attribute_value is not None:
-            if isinstance(attribute_value, Foundation.NSArray):
-                self.value = []
-                for value in attribute_value:
-                    self.value.append(value)
-            if isinstance(attribute_value, ApplicationServices.AXUIElementRef):
-                self.value = UIElement(attribute_value, offset_x, offset_y)
+            if isinstance(attribute_value, list):
+                self.value = list(attribute_value)
+            if backend.is_element(attribute_value):
+                self.value = UIElement(attribute_value, offset_x, offset_y, compute_hashes=compute_hashes)
 
         # set children
         if self.max_depth is None or self.max_depth > 0:
-            self.children, self.action_items = self._get_children_and_actions(element, start_position, offset_x, offset_y)
+            self.children, self.action_items = self._get_children_and_actions(
+                element, start_position, offset_x, offset_y, attributes, trace
+            )
         else:
             self.children, self.action_items = [], []
+        for child in self.children:
+            child.parent = self
 
-        self.calculate_hashes()
+        # children are built first, so the hashes are calculated bottom-up
+        with trace.span("hashes", "hash"):
+            self.calculate_hashes()
 
         self.unrolled = False
 
@@ -180,49 +211,51 @@ class UIElement:
         else:
             self.visible_bbox = self.bbox
 
-    def _get_children_and_actions(self, element, start_position, offset_x, offset_y):
+    def _get_children_and_actions(self, element, start_position, offset_x, offset_y, attributes=None,
+                                  trace=NULL_TRACER):
         action_items = []
         children_all = []
+        backend = get_backend()
 
         # search for all children
-        children = element_attribute(element, ApplicationServices.kAXChildrenAttribute)
-        error, actions = ApplicationServices.AXUIElementCopyActionNames(element, None)
-        if error == 0 and actions is not None and len(actions) > 0:
+        if attributes is None:
+            with trace.span("children", "fetch"):
+                attributes = backend.attributes(element, (CHILDREN, VISIBLE_CHILDREN))
+        children = attributes[CHILDREN]
+        entry = getattr(self, "cache_entry", None)
+        if entry is not None and entry["actions"] is not None:
+            actions = entry["actions"]
+        else:
+            with trace.span("action_names", "fetch"):
+                actions = backend.action_names(element)
+            if entry is not None and actions is not None:
+                entry["actions"] = list(actions)
+        if actions is not None and len(actions) > 0:
             action_items = actions
 
         if children is not None and len(children) > 0:
             # make children structure flat if it is a group and has only one child
             if self.role == "AXGroup" and len(children) == 1:
-                child_position = element_attribute(
-                    children[0], ApplicationServices.kAXPositionAttribute
-                )
-                child_position_value = element_value(
-                    child_position, ApplicationServices.kAXValueCGPointType
-                )
-                child_size = element_attribute(
-                    children[0], ApplicationServices.kAXSizeAttribute
-                )
-                child_size_value = element_value(
-                    child_size, ApplicationServices.kAXValueCGSizeType
-                )
+                with trace.span("group child", "fetch"):
+                    child_attributes = backend.attributes(
+                        children[0], (POSITION, SIZE, CHILDREN, VISIBLE_CHILDREN)
+                    )
                 if (
-                        start_position == child_position_value
-                        and self.size == child_size_value
+                        start_position == child_attributes[POSITION]
+                        and self.size == child_attributes[SIZE]
                 ):
-                    children_elements = element_attribute(
-                        children[0], ApplicationServices.kAXChildrenAttribute
-                    )
+                    children_elements = child_attributes[CHILDREN]
                     if children_elements is not None and len(children_elements) > 0:
-                        found_children = UIElement.children(
-                            children[0], offset_x, offset_y, self.max_depth, self.visible_bbox
+                        found_children = UIElement.children_from_attributes(
+                            child_attributes, offset_x, offset_y, self.max_depth, self.visible_bbox, self.compute_hashes
                         )
                         children_all = found_children
                     else:
-                        children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
+                        children_all = UIElement.children_from_attributes(attributes, offset_x, offset_y, self.max_depth, self.visible_bbox, self.compute_hashes)
                 else:
-                    children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
+                    children_all = UIElement.children_from_attributes(attributes, offset_x, offset_y, self.max_depth, self.visible_bbox, self.compute_hashes)
             else:
-                children_all = UIElement.children(element, offset_x, offset_y, self.max_depth, self.visible_bbox)
+                children_all = UIElement.children_from_attributes(attributes, offset_x, offset_y, self.max_depth, self.visible_bbox, self.compute_hashes)
 
         children_all = [element for element in children_all if element.position is not None]
         children_all = sorted(
@@ -247,7 +280,7 @@ class UIElement:
     def hash_from_string(self, string):
         if string is None or string == "":
             return ""
-        return md5(string.encode()).hexdigest()
+        return blake2s(string.encode(), digest_size=16).hexdigest()
 
     def component_hash(self):
         if self.position is None or self.size is None:
@@ -282,38 +315,34 @@ class UIElement:
     def children_content_hash(self, children):
         if len(children) == 0:
             return ""
-        all_content_hashes = []
-        all_hashes = []
-        for child in children:
-            all_content_hashes.append(child.content_identifier)
-            all_hashes.append(child.identifier)
-        all_content_hashes.sort()
-        if len(all_content_hashes) == 0:
-            return ""
+        all_content_hashes = sorted(child.content_identifier for child in children)
         content_hash = self.hash_from_string("".join(all_content_hashes))
-        content_structure_hash = self.hash_from_string("".join(all_hashes))
-        return self.hash_from_string(content_hash.join(content_structure_hash))
+        content_structure_hash = self.hash_from_string("".join(child.identifier for child in children))
+        return self.hash_from_string(content_hash + content_structure_hash)
 
     # search for the root window
     @classmethod
     def find_root_element(cls, element):
-        role = element_attribute(element, ApplicationServices.kAXRoleAttribute)
-        sub_role = element_attribute(element, ApplicationServices.kAXSubroleAttribute)
-        if role == "AXWindow" or sub_role == "AXHostingView":
+        attributes = get_backend().attributes(element, (ROLE, SUBROLE, PARENT))
+        if attributes[ROLE] == "AXWindow" or attributes[SUBROLE] == "AXHostingView":
             return element
         else:
-            parent = element_attribute(element, ApplicationServices.kAXParentAttribute)
+            parent = attributes[PARENT]
             if parent is not None:
                 return cls.find_root_element(parent)
         return None
 
     # parse children
     @classmethod
-    def children(cls, element, offset_x=0, offset_y=0, max_depth=None, visible_bbox=None):
-        children = element_attribute(element, ApplicationServices.kAXChildrenAttribute)
-        visible_children = element_attribute(
-            element, ApplicationServices.kAXVisibleChildrenAttribute
-        )
+    def children(cls, element, offset_x=0, offset_y=0, max_depth=None, visible_bbox=None, compute_hashes=True):
+        attributes = get_backend().attributes(element, (CHILDREN, VISIBLE_CHILDREN))
+        return cls.children_from_attributes(attributes, offset_x, offset_y, max_depth, visible_bbox, compute_hashes)
+
+    # parse children from the already read children attributes
+    @classmethod
+    def children_from_attributes(cls, attributes, offset_x=0, offset_y=0, max_depth=None, visible_bbox=None, compute_hashes=True):
+        children = attributes.get(CHILDREN)
+        visible_children = attributes.get(VISIBLE_CHILDREN)
         found_children = []
         if children is not None:
             found_children.extend(children)
@@ -324,22 +353,18 @@ class UIElement:
         result = []
         if max_depth is None or max_depth > 0:
             for child in found_children:
-                child = cls(child, offset_x, offset_y, max_depth - 1 if max_depth is not None else None, visible_bbox)
+                child = cls(child, offset_x, offset_y, max_depth - 1 if max_depth is not None else None, visible_bbox, compute_hashes)
                 result.append(child)
         return result
 
-    # to dict
-    def to_dict(self):
-        def children_to_dict(children):
-            result = []
-            for child in children:
-                result.append(child.to_dict())
-            return result
-
+    # attributes of the element in the serialized form, without the children
+    def serialized_attributes(self):
         value = self.value
         if isinstance(value, UIElement):
-            value = json.dumps(value.to_dict(), indent=4)
-        elif isinstance(value, AppKit.NSDate):
+            # reference the nested element instead of embedding its tree
+            value = {"id": value.identifier}
+        elif value is not None and not isinstance(value, (str, int, float, list)):
+            # dates and other foundation objects
             value = str(value)
 
         if self.absolute_position is not None:
@@ -370,9 +395,14 @@ class UIElement:
             "enabled": self.enabled,
             "bbox": self.bbox,
             "visible_bbox": self.visible_bbox,
-            "children": children_to_dict(self.children),
         }
 
+    # to dict
+    def to_dict(self):
+        result = self.serialized_attributes()
+        result["children"] = [child.to_dict() for child in self.children]
+        return result
+
     #  additional checks
 
     # check if element is a button
@@ -382,40 +412,7 @@ class UIElement:
 
 # get accessibility element attribute
 def element_attribute(element, attribute):
-    if attribute == ApplicationServices.kAXChildrenAttribute:
-        err, value = ApplicationServices.AXUIElementCopyAttributeValues(
-            element, attribute, 0, 999, None
-        )
-        if err == ApplicationServices.kAXErrorSuccess:
-            if isinstance(value, Foundation.__NSArrayM):
-                return CFAttributeToPyObject(value)
-            else:
-                return value
-    err, value = ApplicationServices.AXUIElementCopyAttributeValue(
-        element, attribute, None
-    )
-    if err == ApplicationServices.kAXErrorSuccess:
-        if isinstance(value, Foundation.__NSArrayM):
-            return CFAttributeToPyObject(value)
-        else:
-            return value
-    return None
-
-
-# det accessibility element value
-def element_value(element, type):
-    err, value = ApplicationServices.AXValueGetValue(element, type, None)
-    if err == True:
-        return value
-    return None
-
-
-# get accessibility attribute names
-def element_attribute_names(element):
-    err, value = ApplicationServices.AXUIElementCopyAttributeNames(element, None)
-    if err == ApplicationServices.kAXErrorSuccess:
-        return value
-    return []
+    return get_backend().attribute(element, attribute)
 
 
 # print node with its children and attributes
@@ -1,31 +1,39 @@
-import AppKit
-import shutil
+import re
+from macapptree.backend import get_backend, Point, TITLE
 
-from PIL import Image, ImageDraw
-from time import sleep
+
+# PIL and numpy (through macapptree.overlay) are only imported by the
+# functions drawing images, the tree dump uses this module without them
 
 
 _screen_scaling_factor = 1
 
 # get the screen scaling factor
 def store_screen_scaling_factor():
-    for screen in AppKit.NSScreen.screens():
-        global _screen_scaling_factor
-        _screen_scaling_factor = screen.backingScaleFactor()
+    global _screen_scaling_factor
+    _screen_scaling_factor = get_backend().screen_scaling_factor()
 
 
 # convert point from screen coordinates to window coordinates
 def convert_point_to_window(point, window_element):
-    for screen in AppKit.NSScreen.screens():
-        if AppKit.NSPointInRect(point, screen.frame()):
-            screen_height = screen.frame().size.height
-            return AppKit.NSMakePoint(
-                point.x + window_element.x,
-                point.y - 1 + window_element.y,
-            )
-    return AppKit.NSMakePoint(0.0, 0.0)
+    if get_backend().point_on_screen(point.x, point.y):
+        return Point(
+            point.x + window_element.x,
+            point.y - 1 + window_element.y,
+        )
+    return Point(0.0, 0.0)
     
 
+# get the windows whose title matches the regular expression, all of them
+# without one; only the titles are read, the other windows are never walked
+def windows_matching_title(windows, title_regex=None):
+    if not title_regex:
+        return list(windows)
+    pattern = re.compile(title_regex)
+    backend = get_backend()
+    return [window for window in windows if pattern.search(backend.attribute(window, TITLE) or "")]
+
+
 # check if the windows are equal
 def windows_are_equal(window1, window2):
     if (
@@ -40,110 +48,33 @@ def windows_are_equal(window1, window2):
 
 # get color for the role
 def color_for_role(role):
-    color = "red"
-    if role == "AXButton":
-        color = "blue"
-    elif role == "AXTextField":
-        color = "green"
-    elif role == "AXStaticText":
-        color = "yellow"
-    elif role == "AXImage":
-        color = "purple"
-    elif role == "AXGroup":
-        color = "orange"
-    elif role == "AXScrollBar":
-        color = "brown"
-    elif role == "AXRow":
-        color = "pink"
-    elif role == "AXColumn":
-        color = "cyan"
-    elif role == "AXCell":
-        color = "magenta"
-    elif role == "AXTable":
-        color = "lightblue"
-    elif role == "AXOutline":
-        color = "lightgreen"
-    elif role == "AXLayoutArea":
-        color = "lightyellow"
-    elif role == "AXLayoutItem":
-        color = "lavender"
-    elif role == "AXHandle":
-        color = "peachpuff"
-    elif role == "AXSplitter":
-        color = "lightsalmon"
-    elif role == "AXIncrementor":
-        color = "lightpink"
-    elif role == "AXBusyIndicator":
-        color = "lightcyan"
-    elif role == "AXProgressIndicator":
-        color = "plum"
-    elif role == "AXToolbar":
-        color = "darkred"
-    elif role == "AXPopover":
-        color = "darkblue"
-    elif role == "AXMenu":
-        color = "darkgreen"
-    elif role == "AXMenuItem":
-        color = "olive"
-    elif role == "AXMenuBar":
-        color = "rebeccapurple"
-    elif role == "AXMenuBarItem":
-        color = "darkorange"
-    elif role == "AXMenuButton":
-        color = "saddlebrown"
-    elif role == "AXMenuItemCheckbox":
-        color = "palevioletred"
-    elif role == "AXMenuItemRadio":
-        color = "darkcyan"
-    elif role == "AXMenuItemPopover":
-        color = "darkmagenta"
-    elif role == "AXMenuItemSplitter":
-        color = "black"
-    elif role == "AXMenuItemTable":
-        color = "white"
-    elif role == "AXMenuItemTextField":
-        color = "lightgray"
-    elif role == "AXMenuItemStaticText":
-        color = "darkgray"
-    elif role == "AXMenuItemImage":
-        color = "salmon"
-    elif role == "AXMenuItemGroup":
-        color = "lightblue"
-    elif role == "AXMenuItemScrollBar":
-        color = "lightgreen"
-    elif role == "AXMenuItemRow":
-        color = "lightyellow"
-    elif role == "AXMenuItemColumn":
-        color = "lavender"
-    elif role == "AXMenuItemCell":
-        color = "peachpuff"
-    elif role == "AXMenuItemOutline":
-        color = "burlywood"
-    elif role == "AXMenuItemLayoutArea":
-        color = "lightpink"
-    elif role == "AXMenuItemLayoutItem":
-        color = "lightcyan"
-    elif role == "AXMenuItemHandle":
-        color = "plum"
-    elif role == "AXMenuItemSplitter":
-        color = "darkred"
-    elif role == "AXMenuItemIncrementor":
-        color = "darkblue"
-    elif role == "AXMenuItemBusyIndicator":
-        color = "darkgreen"
-    elif role == "AXMenuItemProgressIndicator":
-        color = "darkyellow"
-    elif role == "AXMenuItemToolbar":
-        color = "rebeccapurple"
-    elif role == "AXMenuItemPopover":
-        color = "darkorange"
-    return color
+    from macapptree.overlay import DEFAULT_COLOR, ROLE_COLORS
+    return ROLE_COLORS.get(role, DEFAULT_COLOR)
+
+
+# crop the window from the screenshot, window_coords are (left, top, width,
+# height) in points while the screenshot is in pixels
+def crop_window(screenshot, window_coords, scaling_factor=None):
+    if scaling_factor is None:
+        scaling_factor = _screen_scaling_factor
+    left, top, width, height = window_coords
+    return screenshot.crop((int(left * scaling_factor),
+                            int(top * scaling_factor),
+                            int((left + width) * scaling_factor),
+                            int((top + height) * scaling_factor)))
+
+
+# draw the window components on a copy of the image
+def segment_window_image(window, image):
+    from macapptree.overlay import flatten_segments, render_segments
+    return render_segments(image, flatten_segments(window, _screen_scaling_factor))
 
 
 # segment the window components
 def segment_window_components(window, image_path: str):
+    from PIL import Image
+
     print(f"Segmenting window {window.name}")
-    segment_image_path = None
 
     if image_path is None or len(image_path) == 0:
         print(f"Image for window {window.name} not found")
@@ -151,18 +82,10 @@ def segment_window_components(window, image_path: str):
 
     print(f"Window name: {image_path}")
 
-    # copy the image for segmentation using new path
+    # segment the image into a new path
     segment_image_path = image_path.replace(".png", "_segmented.png")
-
-    # copy the image for segmentation
-    shutil.copy2(image_path, segment_image_path)
-
-    sleep(0.5)
-
-    # segment the image
-    segment_image(segment_image_path, window)
-
-    sleep(0.5)
+    with Image.open(image_path) as image:
+        segment_window_image(window, image).save(segment_image_path)
 
     return segment_image_path
 
@@ -172,16 +95,20 @@ def segment_image(image_path, window_element, image_drawer=None, image=None):
     if image_path is None:
         return
 
-    # open the image and create a drawer
-    draw = image_drawer
-    image = image
+    if image_drawer is not None:
+        draw_segments(image_drawer, window_element)
+        return
+
+    from PIL import Image
+    with Image.open(image_path) as image:
+        segmented_image = segment_window_image(window_element, image)
+    # save the image
+    print(f"Saving segmented image to {image_path}")
+    segmented_image.save(image_path)
 
-    # validate the image and drawer
-    if image_drawer is None:
-        # draw a rectangle on the image
-        image = Image.open(image_path)
-        draw = ImageDraw.Draw(image)
 
+# draw the rectangles of all children with the color of their role
+def draw_segments(draw, window_element):
     # iterate over all children
     for child in window_element.children:
         bbox = child.visible_bbox
@@ -223,8 +150,4 @@ def segment_image(image_path, window_element, image_drawer=None, image=None):
             draw.rectangle([retina_position, bottom_right], outline=color, width=2)
         except Exception as e:
             print(f"Error drawing rectangle: {e}")
-        segment_image(image_path, child, image_drawer=draw, image=image)
-    if image_drawer is None:
-        # save the image
-        print(f"Saving segmented image to {image_path}")
-        image.save(image_path)
+        draw_segments(draw, child)
@@ -0,0 +1,182 @@
+"""Shared fixtures of the dumper and ax-tools tests.
+
+The dumpers are not installable packages, so their directories are put on
+`sys.path` here: `win-ax` (its modules import each other as siblings),
+`mac-ax/macapptree`, `ax-tools` and `benchmarks` for the synthetic trees and
+fake desktops. Nothing needs macOS or Windows, the mac-ax tests run against
+FakeElement trees served by FakeBackend and the win-ax tests against the
+pywinauto stand-ins of `synthetic.WinDesktop`.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for path in ('win-ax', os.path.join('mac-ax', 'macapptree'), 'ax-tools', 'benchmarks'):
+    path = os.path.join(ROOT, path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import synthetic  # noqa: E402
+from axtools.cache import set_element_cache  # noqa: E402
+from macapptree import backend as mac_backend  # noqa: E402
+from macapptree.backend import (  # noqa: E402
+    FakeBackend, FakeElement, Point, Size, ROLE, TITLE, ENABLED, POSITION, SIZE, DESCRIPTION,
+    ROLE_DESCRIPTION, VALUE,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_element_cache():
+    """Both dumpers share the element cache of axtools.cache, no test leaves one set"""
+    set_element_cache(None)
+    yield
+    set_element_cache(None)
+
+
+@pytest.fixture
+def fake_backend():
+    """Install a FakeBackend for macapptree, the previous backend is restored afterwards"""
+    previous = mac_backend._backend
+    backend = FakeBackend()
+    mac_backend.set_backend(backend)
+    yield backend
+    mac_backend.set_backend(previous)
+
+
+def make_element(role, title=None, rect=None, children=None, actions=(), enabled=True,
+                 description=None, role_description=None, value=None, **attributes):
+    """FakeElement with the attributes UIElement reads, rect is (x, y, width, height) on screen"""
+    values = {
+        ROLE: role,
+        TITLE: title,
+        ENABLED: enabled,
+        DESCRIPTION: description,
+        ROLE_DESCRIPTION: role_description if role_description is not None else role[2:].lower(),
+        VALUE: value,
+    }
+    if rect is not None:
+        x, y, width, height = rect
+        values[POSITION] = Point(x, y)
+        values[SIZE] = Size(width, height)
+    values.update(attributes)
+    return FakeElement(values, actions=actions, children=children)
+
+
+@pytest.fixture
+def element():
+    """Factory of FakeElements, see `make_element`"""
+    return make_element
+
+
+@pytest.fixture
+def mac_app(element):
+    """Window at (100, 50) with a toolbar, a group of two buttons and a text field.
+
+    Returns the window element and its elements by title.
+    """
+    ok = element("AXButton", "O K", (300, 400, 80, 30), actions=["AXPress"])
+    cancel = element("AXButton", "Cancel", (400, 400, 80, 30), actions=["AXPress"])
+    buttons = element("AXGroup", "buttons", (290, 390, 200, 50), children=[ok, cancel])
+    field = element("AXTextField", "query", (120, 100, 300, 24), value="hello")
+    toolbar = element("AXToolbar", "toolbar", (100, 60, 800, 30))
+    window = element("AXWindow", "Main", (100, 50, 800, 600), children=[toolbar, field, buttons])
+    return window, {"ok": ok, "cancel": cancel, "buttons": buttons, "query": field, "toolbar": toolbar}
+
+
+@pytest.fixture
+def tree_spec():
+    """Small synthetic tree of four windows"""
+    return synthetic.TreeSpec(nodes=200, depth=5, fanout=4, windows=4, seed=7)
+
+
+@pytest.fixture
+def win_windows(tree_spec):
+    return synthetic.generate(tree_spec)
+
+
+@pytest.fixture
+def win_dumper():
+    """win-ax/dump-tree.py imported as a new module, its globals start fresh in every test"""
+    return synthetic.load_win_dumper()
+
+
+@pytest.fixture
+def win_desktop(win_dumper, win_windows):
+    """Synthetic desktop installed in the win-ax dumper"""
+    desktop = synthetic.win_desktop(win_windows)
+    win_dumper.set_desktop(desktop)
+    return desktop
+
+
+class FakeClock:
+    """Monotonic clock whose `sleep` advances the time instead of waiting"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0.0)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_snapshot(names, time=None, x=0):
+    """win-ax style document of one window with a button per name, event format with a time"""
+    buttons = [
+        {"name": name, "role": "Button", "description": "", "value": "",
+         "bbox": {"x": x + 10, "y": 40 * index + 10, "width": 100, "height": 30},
+         "states": {"enabled": True, "visible": True}, "children": []}
+        for index, name in enumerate(names)
+    ]
+    window = {"name": "Main window", "role": "Window", "description": "", "value": "",
+              "bbox": {"x": x, "y": 0, "width": 400, "height": 40 * len(names) + 20},
+              "states": {"enabled": True, "visible": True}, "children": buttons}
+    tree = {"tree": [window], "focused_element": None, "queries": {}}
+    return tree if time is None else {"time": time, "data": dict({"duration": 5}, **tree)}
+
+
+@pytest.fixture
+def snapshot():
+    """Factory of win-ax snapshots, see `make_snapshot`"""
+    return make_snapshot
+
+
+def make_linux_node(role, x, y, width, height, *children, name=None):
+    """linux-ax node, the bbox is relative to the parent below applications, windows and frames"""
+    return {"name": role if name is None else name, "role": role, "description": "", "value": None,
+            "bbox": {"x": x, "y": y, "width": width, "height": height}, "children": list(children)}
+
+
+@pytest.fixture
+def linux_node():
+    """Factory of linux-ax nodes, see `make_linux_node`"""
+    return make_linux_node
+
+
+def write_snapshots(path, documents, mtime_ns=None):
+    """Write one document as plain json, several as json lines; mtime_ns sets the modification time"""
+    with open(path, "w", encoding="utf-8") as f:
+        if len(documents) == 1 and not str(path).endswith(".jsonl"):
+            json.dump(documents[0], f, indent=2)
+        else:
+            f.writelines(json.dumps(document) + "\n" for document in documents)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+@pytest.fixture
+def snapshot_file():
+    """Writer of snapshot files, see `write_snapshots`"""
+    return write_snapshots
@@ -0,0 +1,23 @@
+import pytest
+
+from macapptree.backend import Backend, FakeBackend, POSITION, Point, TITLE
+
+
+def test_incomplete_backend_can_not_be_created():
+    class AttributesOnly(Backend):
+        def attributes(self, element, names):
+            return dict.fromkeys(names)
+
+    with pytest.raises(TypeError, match="element_at_position"):
+        AttributesOnly()
+
+
+def test_fake_backend_copies_values(element):
+    window = element("AXWindow", "Main", (100, 50, 800, 600))
+    backend = FakeBackend()
+
+    position = backend.attribute(window, POSITION)
+    position.x = 0
+
+    assert backend.attributes(window, (TITLE, POSITION)) == {TITLE: "Main", POSITION: Point(100, 50)}
+    assert backend.calls["attributes"] == 2
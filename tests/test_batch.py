@@ -0,0 +1,134 @@
+import json
+from argparse import Namespace
+
+import pytest
+
+from axtools import batch
+from axtools.batch import CHECKPOINT_NAME, check_output_paths, output_path, run_batch
+from axtools.compressed import open_file
+
+SECOND = 10 ** 9
+
+
+def read_records(path):
+    with open_file(str(path)) as f:
+        return [json.loads(line) for line in f]
+
+
+def shard_records(out):
+    return {record["path"]: record for shard in sorted(out.glob("batch-*")) for record in read_records(shard)}
+
+
+def run(paths, **kwargs):
+    kwargs.setdefault("processes", 1)
+    kwargs.setdefault("progress_interval", 0)
+    return run_batch([str(path) for path in paths], ["stats", "hash"], **kwargs)
+
+
+@pytest.fixture
+def trees(snapshot, snapshot_file, tmp_path):
+    directory = tmp_path / "trees"
+    directory.mkdir()
+    return [snapshot_file(directory / f"{name}.json", [snapshot([name])], SECOND) for name in ("a", "b", "c")]
+
+
+def test_output_next_to_the_inputs(trees):
+    progress, failed = run(trees)
+
+    assert (progress.files, failed) == (3, [])
+    with open(output_path(trees[0], batch.DEFAULT_SUFFIX)) as f:
+        record = json.load(f)
+    assert record["path"] == trees[0]
+    assert record["stats"]["nodes"] == 2
+
+
+@pytest.mark.parametrize("names", [
+    ["tree.json", "tree.json.gz"],
+    ["tree.json", "tree.jsonl"],
+    ["tree.json.xz", "tree.jsonl.gz"],
+])
+def test_colliding_outputs_are_refused(names, snapshot, tmp_path):
+    paths = []
+    for name in names:
+        path = str(tmp_path / name)
+        with open_file(path, "w") as f:
+            json.dump(snapshot([name]), f)
+        paths.append(path)
+
+    with pytest.raises(ValueError, match="tree.batch.json"):
+        run(paths)
+
+    # nothing was written, not even the first output
+    assert not (tmp_path / "tree.batch.json").exists()
+    # the shards have no such collision
+    progress, failed = run(paths[:1], output_dir=str(tmp_path / "out"))
+    assert failed == []
+
+
+def test_check_output_paths_with_another_suffix(tmp_path):
+    check_output_paths([str(tmp_path / "a.json"), str(tmp_path / "a.txt")], ".batch.json")
+    check_output_paths([str(tmp_path / "a" / "tree.json"), str(tmp_path / "b" / "tree.json")], ".batch.json")
+    with pytest.raises(ValueError):
+        check_output_paths([str(tmp_path / "a.json"), str(tmp_path / "a.jsonl.gz")], ".out.json")
+
+
+def test_resume_from_the_checkpoint(trees, snapshot, snapshot_file, tmp_path):
+    out = tmp_path / "out"
+    progress, _ = run(trees[:2], output_dir=str(out))
+    assert progress.files == 2
+
+    # a changed and a new file are processed again, the unchanged one is skipped
+    snapshot_file(trees[1], [snapshot(["b", "b2"])], 2 * SECOND)
+    progress, failed = run(trees, output_dir=str(out))
+
+    assert (progress.total, progress.files, failed) == (2, 2, [])
+    assert sorted(path.name for path in out.glob("batch-*")) == ["batch-000000.jsonl.gz", "batch-000001.jsonl.gz"]
+    assert sorted(record["path"] for record in read_records(out / "batch-000001.jsonl.gz")) == trees[1:]
+    assert shard_records(out)[trees[2]]["stats"]["nodes"] == 2
+
+    progress, _ = run(trees, output_dir=str(out))
+    assert progress.total == 0
+
+
+def test_checkpoint_ignores_a_cut_off_line(trees, tmp_path):
+    out = tmp_path / "out"
+    run(trees[:1], output_dir=str(out))
+    with open(out / CHECKPOINT_NAME, "a") as f:
+        f.write('["/cut')
+
+    progress, _ = run(trees, output_dir=str(out))
+
+    assert progress.files == 2
+
+
+def test_checkpoint_of_other_passes_is_refused(trees, tmp_path):
+    out = tmp_path / "out"
+    run(trees, output_dir=str(out))
+
+    with pytest.raises(ValueError, match="passes"):
+        run_batch(trees, ["stats"], output_dir=str(out), processes=1, progress_interval=0)
+
+
+def test_shards_rotate_by_size(trees, tmp_path):
+    out = tmp_path / "out"
+
+    run(trees, output_dir=str(out), shard_ext=".jsonl", shard_size=1)
+
+    # a record is never split, every shard over the size starts the next one
+    shards = sorted(path.name for path in out.glob("batch-*"))
+    assert shards == ["batch-000000.jsonl", "batch-000001.jsonl", "batch-000002.jsonl"]
+    assert sorted(shard_records(out)) == trees
+
+
+def test_run_reports_collisions(snapshot, snapshot_file, tmp_path, capsys):
+    snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])])
+    snapshot_file(tmp_path / "tree.jsonl", [snapshot(["Save"]), snapshot(["Open"])])
+    args = Namespace(inputs=[str(tmp_path)], pattern="tree.json*", passes="stats", out=None,
+                     suffix=batch.DEFAULT_SUFFIX, shard_ext=".jsonl.gz", compress_level=None, workers=1,
+                     chunk_size=None, checkpoint=None, shard_size=1, progress=0)
+
+    with pytest.raises(SystemExit) as exit_info:
+        batch.run(args)
+
+    assert exit_info.value.code == 2
+    assert "would both be written to" in capsys.readouterr().err
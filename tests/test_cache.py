@@ -0,0 +1,121 @@
+import pytest
+
+from axtools.cache import ElementCache, get_element_cache, set_element_cache
+from macapptree.uielement import UIElement
+
+
+def test_lru_eviction():
+    cache = ElementCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used entry now
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_put_refreshes_an_entry():
+    cache = ElementCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("a", 10)
+    cache.put("c", 3)
+
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+
+
+def test_stats():
+    cache = ElementCache(max_size=1)
+    assert cache.stats()["hit_rate"] == 0.0
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    cache.put("b", 2)
+
+    assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 1, "size": 1, "max_size": 1,
+                             "hit_rate": pytest.approx(2 / 3)}
+
+
+def test_clear_keeps_the_counts():
+    cache = ElementCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_element_cache_is_shared_by_the_dumpers(win_dumper):
+    assert get_element_cache() is None
+    cache = ElementCache()
+    set_element_cache(cache)
+    assert get_element_cache() is cache
+    assert win_dumper.get_element_cache() is cache
+
+
+def capture_win(win_dumper, win_desktop):
+    win_desktop.calls.clear()
+    tree = win_dumper.capture_accessibility_tree(max_workers=1)["tree"]
+    return tree, dict(win_desktop.calls)
+
+
+def test_win_warm_cache(win_dumper, win_desktop, tree_spec):
+    cold_tree, cold_calls = capture_win(win_dumper, win_desktop)
+    set_element_cache(ElementCache())
+    first_tree, first_calls = capture_win(win_dumper, win_desktop)
+    warm_tree, warm_calls = capture_win(win_dumper, win_desktop)
+
+    # a cold cache reads the static attributes once per element, a warm one not at all
+    assert cold_calls["control_type"] >= first_calls["control_type"] == tree_spec.nodes
+    assert warm_calls.get("control_type", 0) == 0
+    assert warm_calls.get("description", 0) == 0
+    # the volatile attributes are read every time
+    assert warm_calls["rectangle"] >= tree_spec.nodes
+    assert warm_tree == first_tree
+    assert [window["name"] for window in warm_tree] == [window["name"] for window in cold_tree]
+    stats = get_element_cache().stats()
+    assert stats["misses"] == stats["size"] == tree_spec.nodes
+    assert stats["hits"] >= tree_spec.nodes
+
+
+def test_win_cache_size_is_bounded(win_dumper, win_desktop):
+    set_element_cache(ElementCache(max_size=10))
+    capture_win(win_dumper, win_desktop)
+    _, calls = capture_win(win_dumper, win_desktop)
+
+    stats = get_element_cache().stats()
+    assert stats["size"] == 10
+    assert stats["evictions"] > 0
+    # the entries of the first windows were evicted before they were read again
+    assert calls["control_type"] > 0
+
+
+def test_mac_warm_cache(fake_backend, mac_app):
+    window_element, _ = mac_app
+    cold = UIElement(window_element).to_dict()
+    cold_calls = dict(fake_backend.calls)
+
+    set_element_cache(ElementCache())
+    fake_backend.calls.clear()
+    first = UIElement(window_element).to_dict()
+    first_calls = dict(fake_backend.calls)
+    fake_backend.calls.clear()
+    warm = UIElement(window_element).to_dict()
+    warm_calls = dict(fake_backend.calls)
+
+    assert cold == first == warm
+    assert first_calls == cold_calls
+    # the action names are cached with the role, the attributes are still read in one call per element
+    assert warm_calls.get("action_names", 0) == 0
+    assert warm_calls["attributes"] == cold_calls["attributes"]
+    stats = get_element_cache().stats()
+    assert stats["hits"] == stats["misses"] == stats["size"] == 6
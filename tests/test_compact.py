@@ -0,0 +1,61 @@
+import copy
+
+from axtools.compact import MAC, WIN, CompactOptions, compact_roots
+
+
+def node(role, name="", bbox=(0, 0, 100, 30), children=(), visible=True):
+    x, y, width, height = bbox
+    return {"name": name, "role": role, "description": "", "value": "",
+            "bbox": {"x": x, "y": y, "width": width, "height": height},
+            "states": {"visible": visible}, "children": list(children)}
+
+
+def win_window():
+    button = node("Button", "OK", (10, 10, 80, 20))
+    return node("Window", "Main", (0, 0, 400, 300), [
+        # a wrapper of the same size around the button
+        node("Pane", "", (10, 10, 80, 20), [button]),
+        node("Text", "Title", (10, 40, 200, 20), [node("Text", "Title", (10, 40, 200, 20))]),
+        node("Image", "spacer", (10, 70, 0, 20)),
+        node("Group", "", (10, 100, 50, 50)),
+        node("List", "hidden", (10, 160, 100, 100), [node("ListItem", "a")], visible=False),
+    ])
+
+
+def test_compact_win_tree():
+    window = win_window()
+    stats = compact_roots([window], WIN)
+
+    assert [(child["role"], child["name"]) for child in window["children"]] == [("Button", "OK"), ("Text", "Title")]
+    assert window["children"][1]["children"] == []
+    assert stats.to_dict() == {"before": 9, "after": 3, "collapsed": 1, "merged": 1, "dropped": 4}
+    assert stats.reduction == 1 - 3 / 9
+
+
+def test_steps_can_be_switched_off():
+    window = win_window()
+    stats = compact_roots([window], WIN, CompactOptions(
+        collapse_wrappers=False, drop_zero_area=False, drop_empty_text=False, merge_text=False,
+        drop_invisible=False,
+    ))
+    assert window == win_window()
+    assert stats.before == stats.after == 9
+
+
+def test_roots_are_kept():
+    window = node("Window", "", (0, 0, 0, 0), visible=False)
+    before = copy.deepcopy(window)
+    compact_roots([window], WIN)
+    assert window == before
+
+
+def test_mac_nodes_clipped_away_are_dropped():
+    window = {"role": "AXWindow", "name": "Main", "bbox": [0, 0, 400, 300], "visible_bbox": [0, 0, 400, 300],
+              "children": [
+                  {"role": "AXButton", "name": "OK", "bbox": [10, 10, 90, 30], "visible_bbox": [10, 10, 90, 30],
+                   "children": []},
+                  {"role": "AXButton", "name": "Gone", "bbox": [500, 10, 580, 30], "visible_bbox": None,
+                   "children": []},
+              ]}
+    compact_roots([window], MAC)
+    assert [child["name"] for child in window["children"]] == ["OK"]
@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+
+from axtools.compressed import compression_for_path, dump_json, open_file
+
+DOCUMENT = {
+    "tree": [{"name": "Fenêtre 😀", "children": [{"name": "OK", "bbox": [1, 2, 3, 4]}]}],
+    "queries": {"cursor": None, "random1": {"name": "的"}},
+    "empty": [],
+}
+
+
+@pytest.mark.parametrize("path, compression", [
+    ("out.json", None), ("out.json.gz", "gzip"), ("OUT.JSON.XZ", "xz"), ("out.zst", "zstd"), ("out.zstd", "zstd"),
+])
+def test_compression_for_path(path, compression):
+    assert compression_for_path(path) == compression
+
+
+@pytest.mark.parametrize("levels", [0, 1, 3, 10])
+def test_dump_json_matches_json_dumps(levels):
+    out = io.StringIO()
+    dump_json(DOCUMENT, out, levels)
+    assert out.getvalue() == json.dumps(DOCUMENT, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("name", ["tree.json", "tree.json.gz", "tree.json.xz"])
+def test_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    with open_file(path, "w", 1) as f:
+        dump_json(DOCUMENT, f)
+    with open_file(path) as f:
+        assert json.load(f) == DOCUMENT
+    with open(path, "rb") as f:
+        assert (f.read(1) == b"{") == (name == "tree.json")
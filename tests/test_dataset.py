@@ -0,0 +1,134 @@
+import io
+import json
+import tarfile
+from argparse import Namespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from axtools import dataset, tree as axtree
+from axtools.dataset import ShardWriter, export_dataset, infer_scaling_factor
+from macapptree.uielement import UIElement
+
+
+@pytest.fixture
+def mac_pair(fake_backend, mac_app, tmp_path):
+    """mac_app window tree and its retina screenshot, 1600x1200 pixels for 800x600 points"""
+    tree_path = tmp_path / "window.json"
+    tree_path.write_text(json.dumps(UIElement(mac_app[0]).to_dict()))
+    image_path = tmp_path / "window.png"
+    x, y = np.meshgrid(np.arange(1600), np.arange(1200))
+    pixels = np.stack([x % 256, y % 256, (x // 256) * 16 + y // 256], axis=-1).astype(np.uint8)
+    Image.fromarray(pixels).save(image_path)
+    return str(tree_path), str(image_path), pixels
+
+
+def read_shard(path):
+    with tarfile.open(path) as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+
+def read_index(out):
+    with open(out / "index.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_infer_scaling_factor(mac_pair, snapshot):
+    tree_path, _, _ = mac_pair
+    flat = axtree.flatten(axtree.load(tree_path))
+    assert infer_scaling_factor(flat, (1600, 1200)) == 2
+    assert infer_scaling_factor(flat, (1200, 900)) == 1.5
+    # screenshots smaller than the window are not scaled down
+    assert infer_scaling_factor(flat, (400, 300)) == 1
+    assert infer_scaling_factor(axtree.flatten(snapshot(["Save"])), (1600, 1200)) == 1
+
+
+def test_export_mac_tree(mac_pair, tmp_path):
+    tree_path, image_path, pixels = mac_pair
+    out = tmp_path / "out"
+
+    assert export_dataset([(tree_path, image_path)], str(out), processes=1) == (6, [])
+
+    records = read_index(out)
+    by_name = {record["name"]: record for record in records}
+    assert [record["element"] for record in records] == [1, 2, 3, 4, 5, 6]
+    assert {record["shard"] for record in records} == {"shard-000000.tar"}
+    assert {record["scaling_factor"] for record in records} == {2}
+    # window relative points doubled to pixels, the end corner is exclusive
+    ok = by_name["O_K"]
+    assert ok["rect"] == [400, 700, 560, 760]
+    assert ok["role"] == "AXButton"
+    assert ok["parent"] == by_name["buttons"]["element"]
+    assert ok["depth"] == 2
+
+    members = read_shard(out / "shard-000000.tar")
+    assert sorted(members) == sorted([f"000000/{index}.png" for index in range(1, 7)] + ["000000/mask.png"])
+    crop = np.asarray(Image.open(io.BytesIO(members[ok["crop"]])))
+    assert np.array_equal(crop, pixels[700:760, 400:560])
+
+    mask_image = Image.open(io.BytesIO(members["000000/mask.png"]))
+    assert mask_image.mode.startswith("I;16")
+    mask = np.asarray(mask_image)
+    assert mask.shape == (1200, 1600)
+    assert mask[730, 450] == ok["element"]
+    # the group is painted below its buttons, the window everywhere else
+    assert mask[705, 582] == by_name["buttons"]["element"]
+    assert mask[1100, 1500] == by_name["Main"]["element"]
+
+
+def test_explicit_scaling_factor_and_min_size(mac_pair, tmp_path):
+    tree_path, image_path, _ = mac_pair
+    out = tmp_path / "out"
+
+    exported, _ = export_dataset([(tree_path, image_path)], str(out), scaling_factor=1, min_size=25)
+
+    # the text field is 24 points high, everything else is kept at scale 1
+    rects = {record["name"]: record["rect"] for record in read_index(out)}
+    assert exported == len(rects) == 5
+    assert "query" not in rects
+    assert rects["O_K"] == [200, 350, 280, 380]
+
+
+def test_trees_with_many_nodes_get_a_uint32_mask(tmp_path, snapshot):
+    document = snapshot(["Save"] + [""] * (np.iinfo(np.uint16).max - 2))
+    for child in document["tree"][0]["children"][1:]:
+        child["bbox"] = {"x": 0, "y": 0, "width": 0, "height": 0}
+    tree_path = tmp_path / "tree.json"
+    tree_path.write_text(json.dumps(document))
+    image_path = tmp_path / "tree.png"
+    Image.new("RGB", (400, 200), "white").save(image_path)
+
+    records, members = dataset.export_file("key", str(tree_path), str(image_path))
+
+    names = dict(members)
+    assert "key/mask.npy" in names and "key/mask.png" not in names
+    mask = np.load(io.BytesIO(names["key/mask.npy"]))
+    assert mask.dtype == np.uint32
+    assert mask[20, 20] == 2
+    assert [record["mask"] for record in records] == ["key/mask.npy"] * 2
+
+
+def test_shard_writer_rotates_between_groups(tmp_path):
+    writer = ShardWriter(str(tmp_path), shard_size=1)
+    shards = [writer.write_group([(f"{index}/a.png", b"x" * 10), (f"{index}/b.png", b"y")]) for index in range(3)]
+    writer.close()
+
+    assert shards == ["shard-000000.tar", "shard-000001.tar", "shard-000002.tar"]
+    # a group is never split over two shards
+    assert sorted(read_shard(tmp_path / "shard-000001.tar")) == ["1/a.png", "1/b.png"]
+
+
+def test_run_reports_failed_files(mac_pair, tmp_path, capsys):
+    tree_path, image_path, _ = mac_pair
+    out = tmp_path / "out"
+    args = Namespace(trees=[], pair=[[tree_path, image_path], [tree_path, str(tmp_path / "missing.png")]],
+                     out=str(out), image_ext=".png", scale=None, min_size=1, workers=1, shard_size=1)
+
+    with pytest.raises(SystemExit) as exit_info:
+        dataset.run(args)
+
+    assert exit_info.value.code == 1
+    err = capsys.readouterr().err
+    assert "missing.png" in err
+    assert "Exported 6 elements from 1 files" in err
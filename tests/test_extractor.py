@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from macapptree.backend import SUBROLE, WINDOW
+from macapptree.extractor import extract_with_hit_test, grid_points
+from macapptree.uielement import UIElement
+
+# centers of the 2x2 grid cells of the mac_app window at (100, 50, 800, 600)
+TOP_LEFT = (300, 200)
+TOP_RIGHT = (700, 200)
+BOTTOM_LEFT = (300, 500)
+BOTTOM_RIGHT = (700, 500)
+
+
+def hit(point):
+    # the hit test moves grid points one pixel up
+    x, y = point
+    return (x - 1, y - 2, x + 1, y + 1)
+
+
+def popover(element, window_element, rect=(650, 150, 400, 120)):
+    x, y = rect[:2]
+    button = element("AXButton", "Share", (x + 10, y + 10, 80, 30), actions=["AXPress"])
+    return element("AXGroup", "popover", rect, children=[button],
+                   **{SUBROLE: "AXHostingView", WINDOW: window_element}), button
+
+
+def capture(window_element, compute_hashes, tmp_path, grid=(2, 2)):
+    window = UIElement(window_element, compute_hashes=compute_hashes)
+    output = tmp_path / "tree.json"
+    found = extract_with_hit_test(window, "com.example.app", str(output), False, None, grid)
+    return window, found, output
+
+
+def roles(window):
+    return [child.role for child in window.children]
+
+
+def test_grid_points(fake_backend, mac_app):
+    window = UIElement(mac_app[0])
+    points = [(point.x, point.y) for point in grid_points(window, (2, 2))]
+    assert points == [TOP_LEFT, TOP_RIGHT, BOTTOM_LEFT, BOTTOM_RIGHT]
+
+
+@pytest.mark.parametrize("compute_hashes", [True, False])
+def test_elements_of_the_window_are_not_merged(fake_backend, mac_app, tmp_path, compute_hashes):
+    window_element, elements = mac_app
+    fake_backend.hit_targets = [
+        (hit(TOP_LEFT), elements["query"]),
+        (hit(TOP_RIGHT), window_element),
+        (hit(BOTTOM_LEFT), elements["ok"]),
+        (hit(BOTTOM_RIGHT), elements["cancel"]),
+    ]
+    before = UIElement(window_element, compute_hashes=compute_hashes).to_dict()
+
+    window, found, output = capture(window_element, compute_hashes, tmp_path)
+
+    assert found
+    assert fake_backend.calls["element_at_position"] == 4
+    # every hit resolves to the window itself, which is in the tree already
+    assert roles(window) == ["AXGroup", "AXTextField", "AXToolbar"]
+    assert window.to_dict() == before
+    assert json.loads(output.read_text()) == before
+
+
+@pytest.mark.parametrize("compute_hashes", [True, False])
+def test_popover_is_merged_once(fake_backend, mac_app, element, tmp_path, compute_hashes):
+    window_element, elements = mac_app
+    popover_element, share = popover(element, window_element)
+    fake_backend.hit_targets = [
+        (hit(TOP_LEFT), elements["query"]),
+        # both right cells hit the popover, which reaches past the window
+        (hit(TOP_RIGHT), share),
+        (hit(BOTTOM_RIGHT), popover_element),
+    ]
+    window_content = UIElement(window_element, compute_hashes=compute_hashes).content_identifier
+
+    window, found, output = capture(window_element, compute_hashes, tmp_path)
+
+    assert found
+    assert roles(window) == ["AXGroup", "AXTextField", "AXToolbar", "AXGroup"]
+    merged = window.children[-1]
+    assert merged.name == "popover"
+    assert merged.parent is window
+    assert [child.name for child in merged.children] == ["Share"]
+    # positions are relative to the window, popovers are not clipped to it
+    assert (merged.position.x, merged.position.y) == (550, 100)
+    assert merged.bbox == merged.visible_bbox == [550, 100, 950, 220]
+    if compute_hashes:
+        assert merged.identifier
+        assert window.content_identifier != window_content
+    else:
+        assert merged.identifier == window.content_identifier == ""
+    assert [child["name"] for child in json.loads(output.read_text())["children"]][-1] == "popover"
+
+
+def test_popover_of_another_window_is_skipped(fake_backend, mac_app, element, tmp_path):
+    window_element, elements = mac_app
+    other = element("AXWindow", "Other", (900, 50, 400, 300))
+    _, share = popover(element, other)
+    fake_backend.hit_targets = [(hit(TOP_RIGHT), share), (hit(TOP_LEFT), elements["query"])]
+
+    window, found, _ = capture(window_element, True, tmp_path)
+
+    assert found
+    assert roles(window) == ["AXGroup", "AXTextField", "AXToolbar"]
+
+
+def test_nothing_hit(fake_backend, mac_app, tmp_path):
+    window, found, output = capture(mac_app[0], True, tmp_path)
+    assert not found
+    assert not output.exists()
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from axtools import tree as axtree
+from axtools.geometry import anchor_indices, path_sums, screen_rects
+from macapptree.uielement import UIElement
+
+
+def rects_by_name(flat, rects):
+    return {node["name"]: [float(value) for value in rect] for node, rect in zip(flat.nodes, rects.tolist())}
+
+
+def test_anchor_indices_of_a_deep_chain():
+    depth = 100
+    parent = np.arange(-1, depth - 1)
+    is_anchor = np.zeros(depth, dtype=bool)
+    is_anchor[[10, 50]] = True
+
+    anchor = anchor_indices(parent, is_anchor)
+
+    assert anchor[:10].tolist() == [0] * 10
+    assert anchor[10:50].tolist() == [10] * 40
+    assert anchor[50:].tolist() == [50] * 50
+
+
+def test_path_sums_stop_at_anchors():
+    # 0 -> 1 -> 2 -> 3 and 0 -> 4, node 2 is an anchor
+    parent = np.array([-1, 0, 1, 2, 0])
+    values = np.array([[1.0, 10.0], [2.0, 20.0], [4.0, 40.0], [8.0, 80.0], [16.0, 160.0]])
+    is_anchor = np.array([False, False, True, False, False])
+
+    sums = path_sums(parent, values, is_anchor)
+
+    assert sums.tolist() == [[1, 10], [3, 30], [4, 40], [12, 120], [17, 170]]
+    assert values[0].tolist() == [1.0, 10.0]
+
+
+@pytest.fixture
+def linux_tree(linux_node):
+    """Application with a screen positioned window holding nested panels, and a frame at (30, 40) in its window"""
+    button = linux_node("button", 5, 5, 20, 10)
+    inner = linux_node("inner", 10, 20, 100, 50, button)
+    outer = linux_node("outer", 100, 200, 300, 200, inner)
+    window = linux_node("window", 500, 300, 800, 600, outer)
+    label = linux_node("label", 1, 2, 10, 10)
+    panel = linux_node("panel", 50, 60, 100, 100, label)
+    frame = linux_node("frame", 30, 40, 400, 300, panel)
+    dialog = linux_node("window", 1000, 700, 500, 400, frame, name="dialog-window")
+    application = linux_node("application", 0, 0, 1920, 1080, window, dialog)
+    return [application]
+
+
+def test_flatten_resolves_nested_relative_boxes(linux_tree):
+    flat = axtree.flatten(linux_tree)
+    assert flat.schema == axtree.LINUX
+    rects = rects_by_name(flat, flat.rects)
+
+    # windows are in screen coordinates, their panels are summed up to them
+    assert rects["window"] == [500, 300, 1300, 900]
+    assert rects["outer"] == [600, 500, 900, 700]
+    assert rects["inner"] == [610, 520, 710, 570]
+    assert rects["button"] == [615, 525, 635, 535]
+    # the frame subtree stays in window coordinates
+    assert rects["frame"] == [30, 40, 430, 340]
+    assert rects["label"] == [81, 102, 91, 112]
+
+
+def test_linux_frames_are_moved_to_the_screen(linux_tree):
+    flat = axtree.flatten(linux_tree)
+    rects = rects_by_name(flat, screen_rects(flat))
+
+    assert rects["frame"] == [1030, 740, 1430, 1040]
+    assert rects["panel"] == [1080, 800, 1180, 900]
+    assert rects["label"] == [1081, 802, 1091, 812]
+    # nodes outside of frames keep their screen rectangles
+    assert rects["button"] == [615, 525, 635, 535]
+    assert rects["application"] == [0, 0, 1920, 1080]
+
+
+def test_nested_linux_frames_share_their_window(linux_tree, linux_node):
+    dialog = linux_tree[0]["children"][1]
+    frame = dialog["children"][0]
+    frame["children"].append(linux_node("frame", 5, 5, 50, 50, linux_node("label", 2, 2, 5, 5, name="nested label")))
+    flat = axtree.flatten(linux_tree)
+    nested = [index for index, node in enumerate(flat.nodes) if node["name"] == "nested label"][0]
+
+    rects = screen_rects(flat)
+
+    # the inner frame is in the coordinates of the same window
+    assert rects[nested].tolist() == [1007, 707, 1012, 712]
+
+
+def test_linux_frame_without_a_window_keeps_its_coordinates(linux_node):
+    frame = linux_node("frame", 30, 40, 400, 300, linux_node("label", 1, 2, 10, 10))
+    flat = axtree.flatten([frame])
+    assert np.array_equal(screen_rects(flat), flat.rects)
+
+
+def test_win_rects_are_screen_rects(snapshot):
+    flat = axtree.flatten(snapshot(["Save"], x=300))
+    rects = screen_rects(flat)
+    assert rects.tolist() == flat.rects.tolist()
+    assert rects[1].tolist() == [310, 10, 410, 40]
+
+
+def test_mac_rects_are_moved_by_their_window(fake_backend, mac_app):
+    flat = axtree.flatten(UIElement(mac_app[0]).to_dict())
+    assert flat.schema == axtree.MAC
+    rects = screen_rects(flat)
+
+    ok = [index for index, node in enumerate(flat.nodes) if node["name"] == "O_K"][0]
+    assert flat.rects[ok].tolist() == [200, 350, 280, 380]
+    assert rects[ok].tolist() == [300, 400, 380, 430]
+    assert rects[0].tolist() == [100, 50, 900, 650]
@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from macapptree.overlay import (
+    PALETTE_COLORS, ROLE_CODES, Segments, fill_mask, flatten_segments, label_mask, render_batch,
+)
+from macapptree.uielement import UIElement
+
+
+def segments(*rects, codes=None):
+    return Segments(np.array(rects, dtype=np.float64).reshape(-1, 4),
+                    np.array(codes if codes is not None else [0] * len(rects), dtype=np.int64))
+
+
+def test_flatten_segments(fake_backend, mac_app):
+    window = UIElement(mac_app[0])
+    flat = flatten_segments(window)
+
+    # pre-order: buttons, Cancel, O K, query, toolbar
+    assert flat.codes.tolist() == [ROLE_CODES[role] for role in (
+        "AXGroup", "AXButton", "AXButton", "AXTextField", "AXToolbar")]
+    # the inclusive right edge is one pixel in, the bottom one pixel up for the outline
+    assert flat.rects[2].tolist() == [200, 350, 279, 379]
+    assert flat.rects[3].tolist() == [20, 50, 319, 73]
+
+
+def test_flatten_segments_of_the_dict_form(fake_backend, mac_app):
+    window = UIElement(mac_app[0])
+    flat = flatten_segments(window, 2)
+    from_dict = flatten_segments(window.to_dict(), 2)
+
+    assert np.array_equal(flat.rects, from_dict.rects)
+    assert np.array_equal(flat.codes, from_dict.codes)
+    assert flat.rects[2].tolist() == [400, 700, 559, 759]
+
+
+def test_elements_without_size_are_skipped_with_their_children(fake_backend, element):
+    hidden = element("AXGroup", "hidden", (100, 100, 0, 50), children=[
+        element("AXButton", "inside", (100, 100, 40, 20)),
+    ])
+    shown = element("AXStaticText", "shown", (200, 100, 40, 20))
+    window = UIElement(element("AXWindow", "Main", (0, 0, 800, 600), children=[hidden, shown]))
+
+    flat = flatten_segments(window)
+
+    assert flat.codes.tolist() == [ROLE_CODES["AXStaticText"]]
+
+
+def test_fill_mask_later_segments_win():
+    mask = fill_mask(segments((0, 0, 5, 3), (2, 1, 7, 2), (6, 0, 6, 0)), (4, 8))
+    assert mask.tolist() == [
+        [0, 0, 0, 0, 0, 0, 2, -1],
+        [0, 0, 1, 1, 1, 1, 1, 1],
+        [0, 0, 1, 1, 1, 1, 1, 1],
+        [0, 0, 0, 0, 0, 0, -1, -1],
+    ]
+
+
+def test_fill_mask_clips_segments_to_the_mask():
+    mask = fill_mask(segments((-5, -5, 1, 1), (3, 3, 20, 20), (10, 10, 12, 12)), (5, 5))
+    assert mask[:2, :2].tolist() == [[0, 0], [0, 0]]
+    assert (mask[3:, 3:] == 1).all()
+    assert (mask != 2).all()
+    assert (mask == -1).sum() == 25 - 4 - 4
+
+
+def test_label_mask_ids():
+    button = ROLE_CODES["AXButton"]
+    labels = label_mask(segments((0, 0, 3, 1), (2, 0, 3, 0), (0, 2, 0, 2), codes=[button, 0, 7]), (3, 5))
+
+    assert labels.dtype == np.uint8
+    # background 0, role codes shifted by one, unknown roles 1
+    assert labels.tolist() == [
+        [button + 1, button + 1, 1, 1, 0],
+        [button + 1, button + 1, button + 1, button + 1, 0],
+        [8, 0, 0, 0, 0],
+    ]
+
+
+def test_render_batch(fake_backend, mac_app, tmp_path):
+    window = UIElement(mac_app[0])
+    image_path = tmp_path / "window.png"
+    Image.new("RGB", (800, 600), "white").save(image_path)
+    tree_path = tmp_path / "tree.json"
+    tree_path.write_text(json.dumps(window.to_dict()))
+    jobs = [
+        (str(image_path), window, str(tmp_path / "element.png")),
+        (str(image_path), window.to_dict(), str(tmp_path / "dict.png")),
+        (str(image_path), str(tree_path), str(tmp_path / "file.png")),
+    ]
+
+    outputs = render_batch(jobs, processes=2, chunksize=1)
+
+    assert outputs == [job[2] for job in jobs]
+    images = [np.asarray(Image.open(path)) for path in outputs]
+    assert all(np.array_equal(images[0], image) for image in images[1:])
+    assert tuple(images[0][350, 200]) == PALETTE_COLORS[ROLE_CODES["AXButton"]]
+
+
+@pytest.mark.parametrize("shape", [(0, 0), (1, 1)])
+def test_fill_mask_without_segments(shape):
+    assert (fill_mask(segments(), shape) == -1).all()
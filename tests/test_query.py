@@ -0,0 +1,190 @@
+import json
+import re
+from argparse import Namespace
+
+import pytest
+
+from axtools import query
+from axtools.query import Compound, Predicate, SelectorError, SnapshotIndex, Step, parse
+from macapptree.uielement import UIElement
+
+
+def select(index, selector):
+    return index.select(selector).tolist()
+
+
+@pytest.fixture
+def win_index(snapshot):
+    """Main window (0) with buttons Save (1), Open (2, focused), Save as (3) and a list (4) of three items"""
+    document = snapshot(["Save", "Open", "Save as"])
+    window = document["tree"][0]
+    window["children"][1]["states"]["focused"] = True
+    items = [
+        {"name": name, "role": "ListItem", "description": "", "value": "",
+         "bbox": {"x": 10, "y": 200 + 20 * row, "width": 200, "height": 20},
+         "states": {"selected": selected}, "children": []}
+        for row, (name, selected) in enumerate([("report.pdf", True), ("notes.txt", False), ("REPORT-2.PDF", True)])
+    ]
+    window["children"].append({"name": "files", "role": "List", "description": "", "value": "",
+                               "bbox": {"x": 10, "y": 200, "width": 200, "height": 60},
+                               "states": {}, "children": items})
+    return SnapshotIndex.from_document(document)
+
+
+@pytest.fixture
+def mac_index(fake_backend, mac_app):
+    """Main (0), buttons group (1) with Cancel (2) and O_K (3), query text field (4), toolbar (5)"""
+    return SnapshotIndex.from_document(UIElement(mac_app[0]).to_dict())
+
+
+@pytest.fixture
+def linux_index(linux_node):
+    """application (0) > window (1) at (500, 300) > frame (2) at (10, 20) in the window > OK (3) > icon (4)"""
+    icon = linux_node("icon", 2, 2, 8, 6)
+    button = linux_node("push button", 5, 5, 20, 10, icon, name="OK")
+    frame = linux_node("frame", 10, 20, 400, 300, button)
+    window = linux_node("window", 500, 300, 800, 600, frame)
+    return SnapshotIndex.from_document([linux_node("application", 0, 0, 1920, 1080, window, name="gedit")])
+
+
+def test_parse_compound():
+    selector = parse('Window[focused] AXButton[name="Save"][!enabled]')
+    assert selector.alternatives == ((
+        Step(Compound("window", (Predicate("focused"),))),
+        Step(Compound("button", (Predicate("name", "=", "Save"), Predicate("enabled", negate=True)))),
+    ),)
+
+
+def test_parse_combinators_and_alternatives():
+    selector = parse("List > ListItem, *[value^='http']")
+    first, second = selector.alternatives
+    assert [(step.compound.role, step.axis) for step in first] == [("list", "descendant"), ("listitem", "child")]
+    assert second == (Step(Compound(None, (Predicate("value", "^=", "http"),))),)
+
+
+def test_parse_values():
+    (step,), = parse("*[name~=/^report.*\\.pdf$/i][inside=0,0,10,20][depth=3][checked=false]").alternatives
+    regex, inside, depth, checked = step.compound.predicates
+    assert regex.value.pattern == "^report.*\\.pdf$" and regex.value.flags & re.I
+    assert inside.value == (0.0, 0.0, 10.0, 20.0)
+    assert depth.value == 3
+    assert checked.value is False
+
+
+def test_parsed_selectors_are_cached():
+    assert parse("Button") is parse("Button")
+
+
+@pytest.mark.parametrize("selector", [
+    "",
+    "Button[",
+    "Button[name=",
+    "Button >",
+    "> Button",
+    "Button,",
+    ", Button",
+    "Button$",
+    "Button[name=x]Window",
+    "Button[name=/Save/]",
+    "*[inside=1,2]",
+    "*[contains=a,b]",
+])
+def test_bad_selectors(selector):
+    with pytest.raises(SelectorError):
+        parse(selector)
+
+
+@pytest.mark.parametrize("selector, expected", [
+    ("Button", [1, 2, 3]),
+    ('Button[name="Save"]', [1]),
+    ("Button[name^=Save]", [1, 3]),
+    ("Button[name$=as]", [3]),
+    ("Button[name*=pe]", [2]),
+    ("Button[name!=Save]", [2, 3]),
+    ("ListItem[name~=/^report.*\\.pdf$/i]", [5, 7]),
+    ("ListItem[name~=pdf]", [5]),
+    ("ListItem[selected]", [5, 7]),
+    ("ListItem[!selected]", [6]),
+    ("*[focused]", [2]),
+    ("Button[focused=false]", [1, 3]),
+    ("*[role=listitem][name*=.txt]", [6]),
+    ("Window Button", [1, 2, 3]),
+    ("Window ListItem", [5, 6, 7]),
+    ("List > ListItem", [5, 6, 7]),
+    ("Window > ListItem", []),
+    ("Window > *", [1, 2, 3, 4]),
+    ("List Button", []),
+    ('Button[name="Open"], ListItem[name="notes.txt"]', [2, 6]),
+    ("Button, Button[name=Open]", [1, 2, 3]),
+    ("*[inside=0,0,200,85]", [1, 2]),
+    ("Button[contains=50,60]", [2]),
+    ("*[overlaps=100,30,120,60]", [0, 1, 2]),
+    ("Checkbox", []),
+])
+def test_win_selectors(win_index, selector, expected):
+    assert select(win_index, selector) == expected
+
+
+@pytest.mark.parametrize("selector, expected", [
+    ("Button", [2, 3]),
+    ("AXButton[name=O_K]", [3]),
+    ("Group > Button", [2, 3]),
+    ("Window TextField[value=hello]", [4]),
+    ("Window > Button", []),
+    # screen rectangles, the window is at (100, 50)
+    ("Button[contains=340,415]", [3]),
+    ("*[inside=100,50,900,130]", [4, 5]),
+])
+def test_mac_selectors(mac_index, selector, expected):
+    assert select(mac_index, selector) == expected
+
+
+@pytest.mark.parametrize("selector, expected", [
+    ("PushButton", [3]),
+    ("application > window > frame > PushButton > icon", [4]),
+    ("window PushButton", [3]),
+    ("application > PushButton", []),
+    ("*[name=gedit] Icon", [4]),
+    # the frame is moved by its window, the button by the frame
+    ("PushButton[contains=520,330]", [3]),
+    ("*[inside=515,325,535,335]", [3, 4]),
+])
+def test_linux_selectors(linux_index, selector, expected):
+    assert select(linux_index, selector) == expected
+
+
+def test_navigation(win_index):
+    assert win_index.children(0).tolist() == [1, 2, 3, 4]
+    assert win_index.children(4).tolist() == [5, 6, 7]
+    assert win_index.ancestors(6) == [4, 0]
+    assert win_index.first("ListItem[selected]")["name"] == "report.pdf"
+    assert win_index.first("Checkbox") is None
+    assert [node["name"] for node in win_index.select_nodes("Button[name^=Save]")] == ["Save", "Save as"]
+
+
+def test_run(snapshot, snapshot_file, tmp_path, capsys):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save", "Open"])])
+
+    query.run(Namespace(selector="Button[name=Open]", trees=[path], count=False, limit=None, nodes=False))
+
+    match = json.loads(capsys.readouterr().out)
+    assert match == {"index": 2, "role": "Button", "name": "Open", "rect": [10.0, 50.0, 110.0, 80.0],
+                     "path": [0], "file": path}
+
+
+def test_run_without_matches(snapshot, snapshot_file, tmp_path, capsys):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])])
+
+    with pytest.raises(SystemExit) as exit_info:
+        query.run(Namespace(selector="Checkbox", trees=[path], count=True, limit=None, nodes=False))
+
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out == f"{path}\t0\n"
+
+
+def test_run_with_a_bad_selector(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        query.run(Namespace(selector="Button[", trees=[], count=False, limit=None, nodes=False))
+
+    assert exit_info.value.code == 2
+    assert "Invalid selector" in capsys.readouterr().err
@@ -0,0 +1,149 @@
+import gzip
+import json
+from argparse import Namespace
+
+import pytest
+
+from axtools import recorder
+from axtools.cache import get_element_cache
+from axtools.recorder import FakeCapture, RotatingLog, SnapshotRecorder, read_records
+
+
+class ListLog:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def record(clock, capture, hz=10, count=None, duration=None):
+    log = ListLog()
+    snapshots = SnapshotRecorder(capture, hz, log, clock=clock, sleep=clock.sleep, wall_clock=lambda: 1000 + clock())
+    summary = snapshots.run(count, duration)
+    return log.records, summary
+
+
+def test_ticks_follow_the_schedule(clock):
+    capture = FakeCapture(0.02, 0.02, nodes=3, sleep=clock.sleep)
+    records, summary = record(clock, capture, count=4)
+
+    assert [entry["tick"] for entry in records] == [0, 1, 2, 3]
+    assert [entry["time"] for entry in records] == [1000000, 1000100, 1000200, 1000300]
+    assert all(entry["skipped"] == 0 for entry in records)
+    assert records[0]["data"]["duration"] == pytest.approx(20)
+    assert len(records[0]["data"]["tree"][0]["children"]) == 3
+    assert summary["records"] == 4
+    assert summary["skipped"] == 0
+    assert summary["mean_duration"] == pytest.approx(0.02)
+
+
+def test_slow_captures_skip_ticks(clock):
+    # every capture takes two and a half periods
+    capture = FakeCapture(0.25, 0.25, sleep=clock.sleep)
+    records, summary = record(clock, capture, count=3)
+
+    assert [entry["tick"] for entry in records] == [0, 3, 6]
+    assert [entry["skipped"] for entry in records] == [0, 2, 2]
+    assert summary["skipped"] == 6
+    assert summary["max_duration"] == pytest.approx(0.25)
+
+
+def test_duration_limit(clock):
+    records, summary = record(clock, FakeCapture(sleep=clock.sleep), hz=4, duration=1.0)
+    assert [entry["tick"] for entry in records] == [0, 1, 2, 3]
+    assert summary["records"] == 4
+
+
+def test_failed_captures_are_counted(clock, capsys):
+    fake = FakeCapture(sleep=clock.sleep)
+    calls = []
+
+    def capture():
+        calls.append(None)
+        if len(calls) == 2:
+            raise OSError("window closed")
+        return fake()
+
+    records, summary = record(clock, capture, count=3)
+
+    assert [entry["tick"] for entry in records] == [0, 2]
+    assert summary["errors"] == 1
+    assert "Capture of tick 1 failed: window closed" in capsys.readouterr().err
+
+
+def test_hz_must_be_positive():
+    with pytest.raises(ValueError):
+        SnapshotRecorder(FakeCapture(), 0, ListLog())
+
+
+def test_log_rotation(tmp_path):
+    log = RotatingLog(str(tmp_path / "log.jsonl.gz"), max_bytes=100, keep=2)
+    for index in range(5):
+        log.write({"index": index, "padding": "x" * 40})
+    log.close()
+
+    assert log.segments == [str(tmp_path / f"log-{index:06d}.jsonl.gz") for index in range(5)]
+    kept = sorted(path.name for path in tmp_path.iterdir())
+    assert kept == ["log-000003.jsonl.gz", "log-000004.jsonl.gz"]
+    with gzip.open(tmp_path / "log-000004.jsonl.gz", "rt") as f:
+        assert json.loads(f.read())["index"] == 4
+    assert [entry["index"] for entry in read_records(log.segments[-1])] == [4]
+
+
+def test_log_keeps_records_together_below_max_bytes(tmp_path):
+    log = RotatingLog(str(tmp_path / "log.jsonl"), max_bytes=1 << 20)
+    for index in range(3):
+        log.write({"index": index})
+    log.close()
+    assert [entry["index"] for entry in read_records(log.segments[0])] == [0, 1, 2]
+
+
+def test_in_process_dumper_with_cache(win_dumper, win_desktop, win_windows, clock):
+    capture = recorder.load_dumper(win_dumper.__file__, cache_size=1000)
+    # the recorder imports its own instance of the dumper
+    capture.__globals__["set_desktop"](win_desktop)
+    assert get_element_cache().max_size == 1000
+
+    records, summary = record(clock, capture, count=2)
+
+    assert summary["records"] == 2
+    first, second = (entry["data"] for entry in records)
+    assert len(first["tree"]) == len(win_windows)
+    # the windows are listed in the order their workers finish
+    assert sorted(first["tree"], key=json.dumps) == sorted(second["tree"], key=json.dumps)
+    # the counts add up over the captures, the second one reads no element cold
+    assert second["cache"]["misses"] == first["cache"]["misses"] > 0
+    assert second["cache"]["hits"] > first["cache"]["hits"]
+
+
+def test_dumper_without_element_cache(tmp_path):
+    path = tmp_path / "dumper.py"
+    path.write_text("def set_element_cache(cache):\n    pass\n\n"
+                    "def capture_accessibility_tree():\n    return {'tree': []}\n")
+
+    assert recorder.load_dumper(str(path))() == {"tree": []}
+    # a set_element_cache function alone does not declare the support
+    with pytest.raises(ValueError, match="no element cache"):
+        recorder.load_dumper(str(path), cache_size=10)
+
+
+def test_run_with_fake_backend(tmp_path, capsys):
+    out = tmp_path / "snapshots.jsonl"
+    args = Namespace(command=[], hz=200.0, out=str(out), dumper=None, cache=None, fake="0:0", count=3,
+                     duration=None, max_bytes=64, keep=None, compact=True, track=True, compress_level=None)
+    recorder.run(args)
+
+    records = list(read_records(str(tmp_path / "snapshots-000000.jsonl")))
+    assert len(records) == 3
+    assert records[0]["data"]["compaction"]["before"] == 11
+    tracks = [[node["track_id"] for node in entry["data"]["tree"][0]["children"]] for entry in records]
+    assert tracks[0] == tracks[1] == tracks[2]
+    assert "Recorded 3 snapshots" in capsys.readouterr().err
+
+
+def test_run_needs_one_source(tmp_path):
+    args = Namespace(command=["dump"], hz=1.0, out=str(tmp_path / "log"), dumper=None, cache=None, fake="0:0")
+    with pytest.raises(SystemExit) as exit_info:
+        recorder.run(args)
+    assert exit_info.value.code == 2
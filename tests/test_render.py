@@ -0,0 +1,196 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from axtools import render, tree as axtree
+from axtools.geometry import screen_rects
+from axtools.render import node_scores, render_text, select_nodes
+from macapptree.uielement import UIElement
+
+
+def win_node(role, name, x, y, width, height, *children, **states):
+    return {"name": name, "role": role, "description": "", "value": "",
+            "bbox": {"x": x, "y": y, "width": width, "height": height},
+            "states": dict({"enabled": True, "visible": True}, **states), "children": list(children)}
+
+
+@pytest.fixture
+def desktop():
+    """Editor window with a toolbar, a document of text lines and a file list with the focus on "file 7",
+    behind it another window of buttons"""
+    toolbar = win_node("Pane", "toolbar", 0, 0, 1000, 40,
+                       *(win_node("Button", f"b{index}", 40 * index, 0, 40, 40) for index in range(5)))
+    document = win_node("Document", "doc", 0, 40, 700, 700,
+                        *(win_node("Text", f"line {index}", 0, 40 + 20 * index, 700, 20) for index in range(30)))
+    files = win_node("List", "files", 700, 40, 300, 700,
+                     *(win_node("ListItem", f"file {index}", 700, 40 + 20 * index, 300, 20, focused=index == 7)
+                       for index in range(10)))
+    editor = win_node("Window", "Editor", 0, 0, 1000, 800, toolbar, document, files)
+    other = win_node("Window", "Other", 1000, 0, 400, 400,
+                     *(win_node("Button", f"other {index}", 1000, 40 * index, 100, 30) for index in range(10)))
+    return {"tree": [editor, other], "focused_element": None, "queries": {}}
+
+
+@pytest.fixture
+def mac_tree(fake_backend, mac_app):
+    return UIElement(mac_app[0]).to_dict()
+
+
+@pytest.fixture
+def linux_tree(linux_node):
+    buttons = [linux_node("push button", 10 + 30 * index, 10, 25, 20, name=f"button {index}") for index in range(8)]
+    labels = [linux_node("label", 10, 40 + 15 * index, 200, 15, name=f"label {index}") for index in range(8)]
+    panel = linux_node("panel", 0, 0, 300, 200, *buttons, *labels)
+    window = linux_node("frame", 100, 100, 300, 200, panel, name="gedit")
+    return [linux_node("application", 0, 0, 1920, 1080, window, name="gedit")]
+
+
+def names(text):
+    return {line.split('"')[1] for line in text.splitlines() if '"' in line and not line.lstrip().startswith("…")}
+
+
+def scan_select(flat, scores, line, max_chars):
+    """Best-first selection without the heap: every step scans the whole frontier for the best node"""
+    children = [[] for _ in range(len(flat))]
+    for index, parent in enumerate(flat.parent.tolist()):
+        if parent >= 0:
+            children[parent].append(index)
+    shown = np.zeros(len(flat), dtype=bool)
+    pending = {-1: len(flat.roots)}
+    reserved = render._summary_cost(0) if flat.roots else 0
+    used = 0
+    frontier = list(flat.roots)
+    while frontier:
+        index = max(frontier, key=lambda candidate: (scores[candidate], -candidate))
+        frontier.remove(index)
+        parent, depth = int(flat.parent[index]), int(flat.depth[index])
+        cost = len(line(index)) + 1
+        freed = render._summary_cost(depth) if pending[parent] == 1 else 0
+        needed = render._summary_cost(depth + 1) if children[index] else 0
+        if used + reserved + cost + needed - freed > max_chars:
+            continue
+        shown[index] = True
+        used += cost
+        reserved += needed - freed
+        pending[parent] -= 1
+        pending[index] = len(children[index])
+        frontier.extend(children[index])
+    return shown
+
+
+def test_everything_fits(desktop):
+    text, shown, total = render_text(desktop, 10 ** 6)
+
+    lines = text.splitlines()
+    assert shown == total == len(lines) == 60
+    assert "…" not in text
+    # pre-order with the depth as indentation
+    assert lines[0] == 'Window "Editor" @0,0 1000x800'
+    assert lines[1] == '  Pane "toolbar" @0,0 1000x40'
+    assert lines[2] == '    Button "b0" @0,0 40x40'
+    assert lines[-1] == '  Button "other 9" @1000,360 100x30'
+    assert '    ListItem "file 7" @700,180 300x20 [focused]' in lines
+
+
+@pytest.mark.parametrize("tree", ["desktop", "mac_tree", "linux_tree"])
+def test_output_stays_within_the_budget(request, tree):
+    document = request.getfixturevalue(tree)
+    full, _, _ = render_text(document, 10 ** 6)
+
+    for max_chars in range(60, len(full) + 40, 23):
+        text, _, _ = render_text(document, max_chars)
+        assert len(text) <= max_chars
+
+
+def test_elided_children_are_summarised(desktop):
+    text, shown, total = render_text(desktop, 800)
+
+    assert shown < total
+    summaries = [line for line in text.splitlines() if line.lstrip().startswith("…")]
+    assert summaries
+    for line in summaries:
+        assert len(line.lstrip()) <= render.SUMMARY_LENGTH
+    # the other window is shown, its buttons only as a summary
+    assert '  … 10 more: 10 Button (10 nodes)' in summaries
+
+
+@pytest.mark.parametrize("max_chars", [400, 600, 1000, 1500])
+def test_higher_priority_nodes_are_kept(desktop, max_chars):
+    text, _, _ = render_text(desktop, max_chars)
+    shown = names(text)
+
+    # the path to the focused node comes before everything else
+    assert {"Editor", "files", "file 7"} <= shown
+    # interactive nodes of the focused window before text and before other windows
+    buttons = {f"b{index}" for index in range(5)}
+    lines = {f"line {index}" for index in range(30)}
+    others = {f"other {index}" for index in range(10)}
+    if shown & lines:
+        assert buttons <= shown
+    if shown & others:
+        assert lines <= shown
+
+
+def test_focus_is_ranked_above_the_rest(desktop):
+    flat = axtree.flatten(desktop)
+    scores = node_scores(flat, screen_rects(flat))
+    by_name = dict(zip(flat.names, scores))
+
+    assert by_name["file 7"] > by_name["b0"] > by_name["line 0"] > by_name["other 0"]
+    assert by_name["Other"] > by_name["file 7"]
+
+
+@pytest.mark.parametrize("tree", ["desktop", "mac_tree", "linux_tree"])
+def test_heap_matches_the_frontier_scan(request, tree):
+    flat = axtree.flatten(request.getfixturevalue(tree))
+    rects = screen_rects(flat)
+    scores = node_scores(flat, rects)
+
+    def line(index):
+        return render.node_line(flat.nodes[index], rects[index], int(flat.depth[index]))
+
+    for max_chars in (100, 250, 400, 700, 1200, 2500, 10 ** 6):
+        shown, lines, _ = select_nodes(flat, scores, line, max_chars)
+        assert shown.tolist() == scan_select(flat, scores, line, max_chars).tolist()
+        assert sorted(lines) == np.flatnonzero(shown).tolist()
+
+
+def test_lines_are_rendered_only_for_the_head_of_the_queue(desktop):
+    flat = axtree.flatten(desktop)
+    rects = screen_rects(flat)
+    scores = node_scores(flat, rects)
+    rendered = []
+
+    def line(index):
+        rendered.append(index)
+        return render.node_line(flat.nodes[index], rects[index], int(flat.depth[index]))
+
+    # the budget only fits the roots, their children are rendered and refused once
+    shown, _, _ = select_nodes(flat, scores, line, 200)
+
+    assert np.flatnonzero(shown).tolist() == flat.roots
+    assert len(rendered) == len(set(rendered))
+    assert len(rendered) < len(flat)
+
+
+def test_mac_tree_without_bbox(mac_tree):
+    text, shown, total = render_text(mac_tree, 10 ** 6, bbox=False)
+    assert shown == total == 6
+    assert text.splitlines()[0] == 'Window "Main"'
+    assert '    Button "O_K"' in text.splitlines()
+
+
+def test_heapq_is_used_for_the_queue(monkeypatch, desktop):
+    pops = []
+    heappop = heapq.heappop
+
+    def counting_heappop(queue):
+        pops.append(len(queue))
+        return heappop(queue)
+
+    monkeypatch.setattr(render.heapq, "heappop", counting_heappop)
+    render_text(desktop, 10 ** 6)
+
+    # every node passes the queue once
+    assert len(pops) == 60
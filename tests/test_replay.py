@@ -0,0 +1,102 @@
+import json
+import runpy
+import sys
+
+import pytest
+
+from macapptree import backend as mac_backend, replay as mac_replay
+from macapptree.replay import ReplayBackend, replay_trees, start_recording
+from macapptree.uielement import UIElement
+
+# recorded latency of every call in the recordings below
+LATENCY = 0.01
+
+
+def slow(recording_path):
+    with open(recording_path, encoding="utf-8") as f:
+        recording = json.load(f)
+    for call in recording["calls"]:
+        call["latency"] = LATENCY
+    with open(recording_path, "w", encoding="utf-8") as f:
+        json.dump(recording, f)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Durations of the sleeps of the replays, nothing is slept"""
+    durations = []
+    monkeypatch.setattr("time.sleep", durations.append)
+    return durations
+
+
+@pytest.fixture
+def mac_recording(fake_backend, mac_app, tmp_path):
+    window_element, _ = mac_app
+    recorder = start_recording()
+    try:
+        tree = UIElement(window_element).to_dict()
+    finally:
+        mac_backend.set_backend(fake_backend)
+    path = tmp_path / "mac-recording.json"
+    recorder.save(path)
+    return path, tree
+
+
+def test_mac_replay(mac_recording):
+    path, tree = mac_recording
+    trees = replay_trees(path)
+    assert [replayed.to_dict() for replayed in trees] == [tree]
+
+
+def test_mac_replay_rejects_other_versions(tmp_path):
+    path = tmp_path / "recording.json"
+    path.write_text(json.dumps({"version": 0, "calls": []}))
+    with pytest.raises(ValueError):
+        ReplayBackend.load(path)
+
+
+@pytest.mark.parametrize("latency, slept", [(None, False), ("0", False), ("1", True)])
+def test_mac_replay_latency_option(mac_recording, sleeps, monkeypatch, capsys, latency, slept):
+    path, _ = mac_recording
+    slow(path)
+    argv = ["replay.py", str(path)] + (["--latency", latency] if latency is not None else [])
+    monkeypatch.setattr(sys, "argv", argv)
+
+    runpy.run_path(mac_replay.__file__, run_name="__main__")
+
+    assert "Replayed 1 trees with 6 elements" in capsys.readouterr().out
+    assert bool(sleeps) == slept
+
+
+@pytest.fixture
+def win_recording(win_dumper, win_desktop, tmp_path):
+    from replay import Recorder
+    recorder = Recorder()
+    win_dumper.set_desktop(recorder.wrap(win_desktop))
+    tree = win_dumper.capture_accessibility_tree(max_workers=1)["tree"]
+    path = tmp_path / "win-recording.json"
+    recorder.save(path)
+    return path, tree
+
+
+def test_win_replay(win_dumper, win_recording):
+    from replay import Replay
+    path, tree = win_recording
+    win_dumper.set_desktop(Replay.load(path).root())
+    assert win_dumper.capture_accessibility_tree(max_workers=1)["tree"] == tree
+
+
+@pytest.mark.parametrize("latency, slept", [(None, False), ("0", False), ("1", True)])
+def test_win_replay_latency_option(win_dumper, win_recording, sleeps, monkeypatch, tmp_path, latency, slept):
+    path, tree = win_recording
+    slow(path)
+    out = tmp_path / "tree.json"
+    argv = ["dump-tree.py", "--replay", str(path), "-w", "1", "-o", str(out)]
+    if latency is not None:
+        argv += ["--replay-latency", latency]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    win_dumper.main()
+
+    assert json.loads(out.read_text())["tree"] == json.loads(json.dumps(tree))
+    assert bool(sleeps) == slept
@@ -0,0 +1,126 @@
+from argparse import Namespace
+
+import pytest
+
+from axtools import sqlexport
+from axtools.sqlexport import SnapshotDatabase, state_values
+
+SECOND = 10 ** 9
+
+
+def snapshot_rows(database):
+    return database.db.execute("SELECT record, time, nodes FROM snapshots ORDER BY id").fetchall()
+
+
+def node_names(database):
+    return sorted(name for name, in database.db.execute("SELECT name FROM nodes"))
+
+
+@pytest.fixture
+def database(tmp_path):
+    with SnapshotDatabase(str(tmp_path / "dumps.db")) as database:
+        yield database
+
+
+def test_node_rows(database, snapshot, snapshot_file, tmp_path):
+    document = snapshot(["Save", "Open"], 1000)
+    document["data"]["tree"][0]["children"][1]["states"] = {"enabled": False, "focused": True, "unknown": True}
+    path = snapshot_file(tmp_path / "tree.json", [document])
+
+    assert database.add_file(path) == (1, 3)
+
+    assert database.db.execute("SELECT source, record, time, duration, schema, nodes FROM snapshots").fetchall() == [
+        (path, 0, 1000, 5.0, "win", 3),
+    ]
+    rows = database.db.execute(
+        "SELECT id, parent, depth, position, role, name, x, y, width, height, state_enabled, state_focused "
+        "FROM nodes ORDER BY id").fetchall()
+    assert rows == [
+        (1, None, 0, 0, "Window", "Main window", 0.0, 0.0, 400.0, 100.0, 1, None),
+        (2, 1, 1, 1, "Button", "Save", 10.0, 10.0, 100.0, 30.0, 1, None),
+        (3, 1, 1, 2, "Button", "Open", 10.0, 50.0, 100.0, 30.0, 0, 1),
+    ]
+
+
+def test_state_values():
+    values = state_values({"visible": True, "checked": False, "pressed": "yes"})
+    assert values[sqlexport.STATES.index("visible")] == 1
+    assert values[sqlexport.STATES.index("checked")] == 0
+    assert values[sqlexport.STATES.index("pressed")] is None
+    assert state_values(None) == sqlexport.NO_STATES
+
+
+def test_node_ids_continue_over_snapshots(database, snapshot):
+    with database.db:
+        assert database.add_snapshot(snapshot(["Save"]), "a", 0, 1000) == 2
+        assert database.add_snapshot(snapshot(["Open"]), "b", 0, 2000) == 2
+    rows = database.db.execute("SELECT id, snapshot, parent FROM nodes ORDER BY id").fetchall()
+    assert rows == [(1, 1, None), (2, 1, 1), (3, 2, None), (4, 2, 3)]
+
+
+def test_unchanged_file_is_skipped(database, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])], SECOND)
+    assert database.add_file(path) == (1, 2)
+    assert database.add_file(path) == (0, 0)
+    assert len(snapshot_rows(database)) == 1
+
+
+def test_overwritten_dump_replaces_its_snapshot(database, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"], 1000)], SECOND)
+    database.add_file(path)
+    snapshot_file(path, [snapshot(["Open", "Close"], 2000)], 2 * SECOND)
+
+    assert database.add_file(path) == (1, 3)
+    assert snapshot_rows(database) == [(0, 2000, 3)]
+    assert node_names(database) == ["Close", "Main window", "Open"]
+
+
+def test_growing_record_log_adds_new_records(database, snapshot, snapshot_file, tmp_path):
+    path = tmp_path / "log.jsonl"
+    first = [snapshot(["Save"], 1000), snapshot(["Open"], 2000)]
+    snapshot_file(path, first, SECOND)
+    assert database.add_file(str(path)) == (2, 4)
+
+    snapshot_file(path, first + [snapshot(["Close"], 3000)], 2 * SECOND)
+    assert database.add_file(str(path)) == (1, 2)
+    assert snapshot_rows(database) == [(0, 1000, 2), (1, 2000, 2), (2, 3000, 2)]
+
+
+def test_record_log_which_shrank_is_exported_again(database, snapshot, snapshot_file, tmp_path):
+    path = tmp_path / "log.jsonl"
+    snapshot_file(path, [snapshot(["Save"], 1000), snapshot(["Open"], 2000)], SECOND)
+    database.add_file(str(path))
+
+    snapshot_file(path, [snapshot(["Close"], 3000)], 2 * SECOND)
+    assert database.add_file(str(path)) == (1, 2)
+    assert snapshot_rows(database) == [(0, 3000, 2)]
+    assert node_names(database) == ["Close", "Main window"]
+
+
+def test_failed_file_leaves_the_database_unchanged(database, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"], 1000)], SECOND)
+    database.add_file(path)
+    with open(path, "w") as f:
+        f.write('{"tree": [')
+
+    with pytest.raises(ValueError):
+        database.add_file(path)
+    assert node_names(database) == ["Main window", "Save"]
+
+
+def test_run(tmp_path, snapshot, snapshot_file, capsys):
+    good = snapshot_file(tmp_path / "log.jsonl", [snapshot(["Save"], 1000), snapshot(["Open"], 2000)])
+    bad = tmp_path / "broken.json"
+    bad.write_text('{"tree": [')
+    path = str(tmp_path / "dumps.db")
+
+    with pytest.raises(SystemExit) as exit_info:
+        sqlexport.run(Namespace(database=path, files=[good, str(bad)]))
+
+    assert exit_info.value.code == 1
+    err = capsys.readouterr().err
+    assert f"Failed to export {bad}" in err
+    assert "Exported 2 snapshots with 4 nodes from 1 files" in err
+    with SnapshotDatabase(path) as database:
+        indexes = {name for name, in database.db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"snapshots_time", "nodes_snapshot", "nodes_role", "nodes_name"} <= indexes
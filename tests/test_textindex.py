@@ -0,0 +1,111 @@
+import json
+from argparse import Namespace
+
+import pytest
+
+from axtools import textindex
+from axtools.textindex import TextIndex, walk_text
+
+SECOND = 10 ** 9
+
+
+def names(index, query):
+    return sorted(label for _, _, _, _, label in index.search(query))
+
+
+def snapshot_rows(index):
+    return index.db.execute("SELECT record, time FROM snapshots ORDER BY id").fetchall()
+
+
+@pytest.fixture
+def index(tmp_path):
+    with TextIndex(str(tmp_path / "index.db")) as index:
+        yield index
+
+
+def test_search(index, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save file", "Save as", "Open recent file"], 1000)])
+    assert index.add_file(path) == (1, 4)
+
+    assert names(index, "save") == ["Save as", "Save file"]
+    assert names(index, "file save") == ["Save file"]
+    assert names(index, '"recent file"') == ["Open recent file"]
+    assert names(index, '"file recent"') == []
+    assert names(index, "rec*") == ["Open recent file"]
+    assert index.timeline("file") == [(1000, path, 2)]
+
+
+def test_unchanged_file_is_skipped(index, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])], SECOND)
+    assert index.add_file(path) == (1, 2)
+    assert index.add_file(path) == (0, 0)
+    assert len(snapshot_rows(index)) == 1
+
+
+def test_overwritten_dump_replaces_its_snapshot(index, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"], 1000)], SECOND)
+    index.add_file(path)
+    snapshot_file(path, [snapshot(["Open", "Close"], 2000)], 2 * SECOND)
+
+    assert index.add_file(path) == (1, 3)
+    assert names(index, "save") == []
+    assert names(index, "open") == ["Open"]
+    assert snapshot_rows(index) == [(0, 2000)]
+    # the postings of the old nodes are gone as well
+    assert index.db.execute("SELECT COUNT(*) FROM postings WHERE node NOT IN (SELECT id FROM nodes)").fetchone() == (0,)
+
+
+def test_growing_record_log_adds_new_records(index, snapshot, snapshot_file, tmp_path):
+    path = tmp_path / "log.jsonl"
+    first = [snapshot(["Save"], 1000), snapshot(["Open"], 2000)]
+    snapshot_file(path, first, SECOND)
+    assert index.add_file(str(path)) == (2, 4)
+
+    snapshot_file(path, first + [snapshot(["Close"], 3000)], 2 * SECOND)
+    assert index.add_file(str(path)) == (1, 2)
+    assert snapshot_rows(index) == [(0, 1000), (1, 2000), (2, 3000)]
+    assert names(index, "main") == ["Main window"] * 3
+
+
+def test_record_log_which_shrank_is_indexed_again(index, snapshot, snapshot_file, tmp_path):
+    path = tmp_path / "log.jsonl"
+    snapshot_file(path, [snapshot(["Save"], 1000), snapshot(["Open"], 2000)], SECOND)
+    index.add_file(str(path))
+
+    snapshot_file(path, [snapshot(["Close"], 3000)], 2 * SECOND)
+    assert index.add_file(str(path)) == (1, 2)
+    assert snapshot_rows(index) == [(0, 3000)]
+    assert names(index, "save") == names(index, "open") == []
+
+
+def test_failed_file_leaves_the_index_unchanged(index, snapshot, snapshot_file, tmp_path):
+    path = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"], 1000)], SECOND)
+    index.add_file(path)
+    with open(path, "w") as f:
+        f.write('{"tree": [')
+
+    with pytest.raises(ValueError):
+        index.add_file(path)
+    index.forget_terms()
+    assert names(index, "save") == ["Save"]
+
+
+def test_walk_text_skips_nodes_which_are_not_dicts(snapshot):
+    document = snapshot(["Save"])
+    document["tree"][0]["children"] += [None, "text", 5, ["nested"]]
+    document["tree"].append("window")
+    assert [(path, node["name"]) for path, node, _ in walk_text(document)] == [("0", "Main window"), ("0/0", "Save")]
+
+
+def test_run_reports_files_which_are_not_trees(tmp_path, snapshot, snapshot_file, capsys):
+    good = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])])
+    bad = tmp_path / "number.json"
+    bad.write_text(json.dumps(5))
+
+    with pytest.raises(SystemExit) as exit_info:
+        textindex.run(Namespace(index=str(tmp_path / "index.db"), files=[good, str(bad)]))
+
+    assert exit_info.value.code == 1
+    err = capsys.readouterr().err
+    assert f"Failed to index {bad}: Not an accessibility tree: int" in err
+    assert "Indexed 1 snapshots from 1 files" in err
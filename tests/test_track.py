@@ -0,0 +1,169 @@
+import copy
+import json
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+from axtools import track
+from axtools.track import PASSES, Tracker, overlap
+
+
+def tracks(document):
+    """Track ids of the nodes of a document by name, in reverse pre-order for names used more than once"""
+    ids = {}
+    stack = list(document["tree"])
+    while stack:
+        node = stack.pop()
+        ids.setdefault(node["name"], []).append(node["track_id"])
+        stack.extend(node["children"])
+    return ids
+
+
+def counts(**matched):
+    return {kind: matched.get(kind, 0) for kind in PASSES}
+
+
+def button(name, x, y):
+    return {"name": name, "role": "Button", "description": "", "value": "",
+            "bbox": {"x": x, "y": y, "width": 100, "height": 30},
+            "states": {"enabled": True, "visible": True}, "children": []}
+
+
+@pytest.fixture
+def tracker():
+    return Tracker()
+
+
+def test_first_snapshot_starts_new_tracks(tracker, snapshot):
+    document = snapshot(["Save", "Open"])
+    assert tracker.update(document) == counts(new=3)
+    assert tracks(document) == {"Main window": [1], "Save": [2], "Open": [3]}
+
+
+def test_unchanged_snapshot_keeps_its_tracks(tracker, snapshot):
+    first = snapshot(["Save", "Open"])
+    tracker.update(first)
+    second = snapshot(["Save", "Open"], x=300)
+
+    # the subtree hashes leave geometry out, moving the window keeps every track
+    assert tracker.update(second) == counts(subtree=3)
+    assert tracks(second) == tracks(first)
+    assert tracker.next_track == 4
+
+
+def test_identity(tracker, snapshot):
+    first = snapshot(["Save", "Open"])
+    second = snapshot(["Export", "Close"], x=300)
+    for document in (first, second):
+        for index, node in enumerate(document["tree"][0]["children"]):
+            node["runtime_id"] = [42, index]
+    tracker.update(first)
+
+    # renamed and moved, the runtime ids still match the buttons
+    assert tracker.update(second) == counts(identity=2, path=1)
+    assert tracks(second) == {"Main window": [1], "Export": [2], "Close": [3]}
+
+
+def test_path_matches_children_in_sibling_order(tracker, snapshot):
+    first = snapshot(["OK", "OK"])
+    tracker.update(first)
+    second = snapshot(["OK", "OK", "Help"])
+
+    # the duplicate subtrees are not unique, they are matched below their window
+    assert tracker.update(second) == counts(path=3, new=1)
+    assert tracks(second)["OK"] == tracks(first)["OK"]
+    assert tracks(second)["Help"] == [4]
+
+
+def test_overlap_matches_a_renamed_node_in_place(tracker, snapshot):
+    tracker.update(snapshot(["Save", "Open"]))
+    second = snapshot(["Save as", "Open"])
+
+    assert tracker.update(second) == counts(subtree=1, path=1, overlap=1)
+    assert tracks(second) == {"Main window": [1], "Save as": [2], "Open": [3]}
+
+
+def test_renamed_node_far_away_is_new(tracker, snapshot):
+    tracker.update(snapshot(["Save", "Open"]))
+    second = snapshot(["Save", "Open"])
+    second["tree"][0]["children"][0] = button("Save as", 500, 500)
+
+    assert tracker.update(second) == counts(subtree=1, path=1, new=1)
+    assert tracks(second)["Save as"] == [4]
+
+
+def test_min_overlap(snapshot):
+    tracker = Tracker(min_overlap=0.9)
+    tracker.update(snapshot(["Save"]))
+    second = snapshot(["Save as"])
+    # a third of the button overlaps its old rectangle
+    second["tree"][0]["children"][0]["bbox"]["x"] += 50
+
+    assert tracker.update(second) == counts(path=1, new=1)
+
+
+def test_moved_node_under_a_new_parent(tracker, snapshot):
+    first = snapshot(["Save"])
+    tracker.update(first)
+    second = copy.deepcopy(first)
+    window = second["tree"][0]
+    save = window["children"][0]
+    group = {"name": "toolbar", "role": "Group", "description": "", "value": "",
+             "bbox": {"x": 0, "y": 0, "width": 400, "height": 60},
+             "states": {"enabled": True, "visible": True}, "children": [copy.deepcopy(save)]}
+    # a second Save keeps the subtree hash of the first one from being unique
+    window["children"] = [group, button("Save", 10, 200)]
+
+    assert tracker.update(second) == counts(path=1, moved=1, new=2)
+    assert tracks(second)["Save"][1] == tracks(first)["Save"][0]
+
+
+def test_tracks_follow_the_previous_snapshot(tracker, snapshot):
+    tracker.update(snapshot(["Save"]))
+    tracker.update(snapshot(["Save", "Open"]))
+    third = snapshot(["Open"])
+
+    assert tracker.update(third) == counts(subtree=1, path=1)
+    assert tracks(third) == {"Main window": [1], "Open": [3]}
+
+
+def test_overlap():
+    a = np.array([0.0, 0.0, 10.0, 10.0])
+    missing = np.full(4, np.nan)
+    assert overlap(a, a) == 1.0
+    assert overlap(a, np.array([5.0, 0.0, 15.0, 10.0])) == pytest.approx(50 / 150)
+    assert overlap(a, np.array([10.0, 0.0, 20.0, 10.0])) == 0.0
+    assert overlap(missing, missing) == 1.0
+    assert overlap(a, missing) == 0.0
+
+
+def test_run(snapshot, snapshot_file, tmp_path, capsys):
+    log = snapshot_file(tmp_path / "log.jsonl", [snapshot(["Save"], 1000), snapshot(["Save", "Open"], 2000)])
+    dump = snapshot_file(tmp_path / "tree.json", [snapshot(["Open"])])
+    out = tmp_path / "tracked.jsonl"
+
+    track.run(Namespace(files=[log, dump], out=str(out), compress_level=None, min_overlap=0.5))
+
+    documents = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(documents) == 3
+    assert [tracks(document["data"] if "data" in document else document) for document in documents] == [
+        {"Main window": [1], "Save": [2]},
+        {"Main window": [1], "Save": [2], "Open": [3]},
+        {"Main window": [1], "Open": [3]},
+    ]
+    assert ("Tracked 7 nodes in 3 snapshots (0 identity, 2 subtree, 2 path, 0 overlap, 0 moved, 3 new), 3 tracks"
+            in capsys.readouterr().err)
+
+
+def test_run_reports_unreadable_files(snapshot, snapshot_file, tmp_path, capsys):
+    good = snapshot_file(tmp_path / "tree.json", [snapshot(["Save"])])
+    bad = tmp_path / "broken.json"
+    bad.write_text('{"tree": [')
+
+    with pytest.raises(SystemExit) as exit_info:
+        track.run(Namespace(files=[str(bad), good], out=str(tmp_path / "out.jsonl"), compress_level=None,
+                            min_overlap=0.5))
+
+    assert exit_info.value.code == 1
+    assert f"Failed to read {bad}" in capsys.readouterr().err
@@ -0,0 +1,147 @@
+from macapptree.uielement import UIElement
+
+
+def test_attributes(fake_backend, mac_app):
+    window_element, _ = mac_app
+    window = UIElement(window_element)
+
+    assert window.role == "AXWindow"
+    assert window.name == "Main"
+    assert window.enabled is True
+    assert (window.absolute_position.x, window.absolute_position.y) == (100, 50)
+    # the window is the origin of the positions of its elements
+    assert (window.position.x, window.position.y) == (0, 0)
+    assert window.bbox == [0, 0, 800, 600]
+
+    # sorted by position, bottom right first
+    assert [child.name for child in window.children] == ["buttons", "query", "toolbar"]
+    buttons, query, toolbar = window.children
+    assert all(child.parent is window for child in window.children)
+    assert (query.position.x, query.position.y) == (20, 50)
+    assert (query.absolute_position.x, query.absolute_position.y) == (120, 100)
+    assert query.value == "hello"
+    assert query.role_description == "textfield"
+    assert query.bbox == [20, 50, 320, 74]
+
+    cancel, ok = buttons.children
+    # spaces in names are replaced
+    assert ok.name == "O_K"
+    assert ok.action_items == ["AXPress"]
+    assert ok.bbox == [200, 350, 280, 380]
+    assert toolbar.children == []
+
+
+def test_visible_bbox_clipped_to_parent(fake_backend, element):
+    wide = element("AXButton", "wide", (850, 60, 100, 30))
+    outside = element("AXButton", "outside", (1000, 700, 10, 10))
+    window = UIElement(element("AXWindow", "Main", (100, 50, 800, 600), children=[wide, outside]))
+
+    outside, wide = window.children
+    assert wide.bbox == [750, 10, 850, 40]
+    assert wide.visible_bbox == [750, 10, 800, 40]
+    assert outside.visible_bbox is None
+
+
+def test_single_child_group_is_flattened(fake_backend, element):
+    button = element("AXButton", "OK", (20, 20, 40, 20))
+    inner = element("AXGroup", None, (10, 10, 200, 100), children=[button])
+    outer = element("AXGroup", None, (10, 10, 200, 100), children=[inner])
+    window = UIElement(element("AXWindow", "Main", (0, 0, 800, 600), children=[outer]))
+
+    group = window.children[0]
+    assert [child.name for child in group.children] == ["OK"]
+
+
+def test_elements_without_position_are_dropped(fake_backend, element):
+    window = UIElement(element("AXWindow", "Main", (100, 50, 800, 600), children=[
+        element("AXButton", "placed", (120, 70, 40, 20)),
+        element("AXButton", "floating"),
+    ]))
+    assert [child.name for child in window.children] == ["placed"]
+
+
+def test_max_depth(fake_backend, mac_app):
+    window_element, _ = mac_app
+    window = UIElement(window_element, max_depth=1)
+    buttons = window.children[0]
+    assert buttons.name == "buttons"
+    assert buttons.children == []
+
+
+def test_hashes(fake_backend, element):
+    def window(title, x):
+        return UIElement(element("AXWindow", "Main", (100, 50, 800, 600), children=[
+            element("AXButton", title, (x, 70, 40, 20)),
+        ]))
+
+    first = window("OK", 120)
+    same = window("OK", 120)
+    renamed = window("Cancel", 120)
+    moved = window("OK", 130)
+
+    assert len(first.identifier) == 32
+    assert first.identifier == same.identifier
+    assert first.content_identifier == same.content_identifier
+    assert first.children[0].identifier == same.children[0].identifier
+
+    # the ids are built from geometry, role and state, names are left out
+    assert renamed.children[0].identifier == first.children[0].identifier
+    assert renamed.children[0].content_identifier == first.children[0].content_identifier == ""
+    assert renamed.content_identifier == first.content_identifier
+
+    # positions change the ids of the element and the content id of its parent
+    assert moved.children[0].identifier != first.children[0].identifier
+    assert moved.identifier == first.identifier
+    assert moved.content_identifier != first.content_identifier
+
+
+def test_hashes_off(fake_backend, mac_app):
+    window_element, _ = mac_app
+    window = UIElement(window_element, compute_hashes=False)
+    assert window.identifier == ""
+    assert window.content_identifier == ""
+    assert all(child.identifier == "" for child in window.children)
+
+
+def test_update_hashes_after_add_child(fake_backend, mac_app, element):
+    window_element, _ = mac_app
+    window = UIElement(window_element)
+    buttons = window.children[0]
+    window_content = window.content_identifier
+    buttons_content = buttons.content_identifier
+
+    buttons.add_child(UIElement(element("AXButton", "Help", (500, 400, 40, 30)), 100, 50))
+
+    assert buttons.children[-1].parent is buttons
+    assert buttons.content_identifier != buttons_content
+    assert window.content_identifier != window_content
+
+
+def test_to_dict(fake_backend, mac_app):
+    window_element, _ = mac_app
+    data = UIElement(window_element).to_dict()
+
+    assert set(data) == {
+        "id", "name", "role", "description", "role_description", "value", "absolute_position",
+        "position", "size", "enabled", "bbox", "visible_bbox", "children",
+    }
+    assert data["role"] == "AXWindow"
+    assert data["absolute_position"] == "100.00;50.00"
+    assert data["position"] == "0.00;0.00"
+    assert data["size"] == "800;600"
+    query = data["children"][1]
+    assert query["name"] == "query"
+    assert query["value"] == "hello"
+    assert query["position"] == "20.00;50.00"
+    assert query["children"] == []
+    assert [child["name"] for child in data["children"][0]["children"]] == ["Cancel", "O_K"]
+
+
+def test_to_dict_references_element_values(fake_backend, element):
+    title = element("AXStaticText", "Title", (120, 70, 40, 20))
+    window = UIElement(element("AXWindow", "Main", (100, 50, 800, 600), children=[
+        element("AXScrollArea", "scroll", (110, 60, 200, 100), value=title),
+    ]))
+    scroll = window.to_dict()["children"][0]
+    assert scroll["value"] == {"id": window.children[0].value.identifier}
+    assert scroll["value"]["id"]
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+import synthetic
+
+
+def window_names(tree):
+    return sorted(window["name"] for window in tree)
+
+
+@pytest.fixture
+def titled(win_windows, win_desktop):
+    """Name the synthetic windows 'Window 0' to 'Window 3', return the names"""
+    for index, window in enumerate(win_windows):
+        window.name = f"Window {index}"
+    return [window.name for window in win_windows]
+
+
+@pytest.fixture
+def hidden(monkeypatch):
+    """Names of the windows whose is_visible() returns False, and the thread of the first check of every window.
+
+    The states of every element are read with is_visible() as well, only the
+    first call on a top-level window (a control with a handle) is recorded.
+    """
+    names = set()
+    checked = {}
+    is_visible = synthetic.WinControl.is_visible
+
+    def fake_is_visible(control):
+        if control.handle:
+            checked.setdefault(control.node.name, threading.current_thread())
+        is_visible(control)
+        return control.node.name not in names
+
+    monkeypatch.setattr(synthetic.WinControl, "is_visible", fake_is_visible)
+    return names, checked
+
+
+def test_all_windows(win_dumper, titled):
+    tree = win_dumper.get_all_windows_accessibility_tree(max_workers=2)
+    assert window_names(tree) == titled
+
+
+def test_invisible_windows_are_skipped_by_the_workers(win_dumper, win_desktop, titled, hidden):
+    names, checked = hidden
+    names.add("Window 2")
+
+    tree = win_dumper.get_all_windows_accessibility_tree(max_workers=2)
+
+    assert window_names(tree) == ["Window 0", "Window 1", "Window 3"]
+    assert sorted(checked) == titled
+    # no visibility check runs on the enumerating thread
+    assert threading.main_thread() not in checked.values()
+
+
+def test_invisible_window_is_not_walked(win_dumper, win_desktop, titled, hidden):
+    names, _ = hidden
+    names.update(titled)
+
+    assert win_dumper.get_all_windows_accessibility_tree(max_workers=2) == []
+    assert win_desktop.calls["children"] == 0
+    assert win_desktop.calls["rectangle"] == 0
+
+
+def test_failing_window_leaves_the_others(win_dumper, win_desktop, titled, monkeypatch, capsys):
+    is_visible = synthetic.WinControl.is_visible
+
+    def fake_is_visible(control):
+        if control.node.name == "Window 1":
+            raise RuntimeError("window closed")
+        return is_visible(control)
+
+    monkeypatch.setattr(synthetic.WinControl, "is_visible", fake_is_visible)
+
+    tree = win_dumper.get_all_windows_accessibility_tree(max_workers=2)
+
+    assert window_names(tree) == ["Window 0", "Window 2", "Window 3"]
+    assert "Error processing window: window closed" in capsys.readouterr().err
+
+
+def test_failing_enumeration(win_dumper, win_desktop, monkeypatch, capsys):
+    def windows():
+        raise RuntimeError("no desktop")
+
+    monkeypatch.setattr(win_desktop, "windows", windows)
+
+    assert win_dumper.get_all_windows_accessibility_tree(max_workers=2) == []
+    assert "Error enumerating windows: no desktop" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("options, expected", [
+    ({"pids": [1001, 1003]}, ["Window 1", "Window 3"]),
+    ({"process_names": ["APP2.EXE", "app0"]}, ["Window 0", "Window 2"]),
+    ({"exclude": ["app0.exe"]}, ["Window 1", "Window 2", "Window 3"]),
+    ({"title_regex": "[12]$"}, ["Window 1", "Window 2"]),
+    ({"foreground_only": True}, ["Window 0"]),
+    ({"process_names": ["app1", "app2"], "title_regex": "2"}, ["Window 2"]),
+])
+def test_window_filter(win_dumper, titled, options, expected):
+    window_filter = win_dumper.WindowFilter(**options)
+    tree = win_dumper.get_all_windows_accessibility_tree(max_workers=2, window_filter=window_filter)
+    assert window_names(tree) == expected
+
+
+def test_filtered_windows_are_not_checked_for_visibility(win_dumper, win_desktop, titled, hidden):
+    _, checked = hidden
+    window_filter = win_dumper.WindowFilter(pids=[1000])
+
+    tree = win_dumper.get_all_windows_accessibility_tree(max_workers=2, window_filter=window_filter)
+
+    assert window_names(tree) == ["Window 0"]
+    assert list(checked) == ["Window 0"]
+
+
+def test_window_filter_reads_each_process_name_once(win_dumper, win_desktop, titled, monkeypatch):
+    looked_up = []
+    process_name = win_desktop.process_name
+
+    def counting_process_name(pid):
+        looked_up.append(pid)
+        return process_name(pid)
+
+    monkeypatch.setattr(win_desktop, "process_name", counting_process_name)
+    window_filter = win_dumper.WindowFilter(process_names=["app1"])
+
+    for _ in range(2):
+        tree = win_dumper.get_all_windows_accessibility_tree(max_workers=1, window_filter=window_filter)
+        assert window_names(tree) == ["Window 1"]
+    assert sorted(looked_up) == [1000, 1001, 1002, 1003]
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from macapptree import window_tools
+from macapptree.backend import TITLE
+from macapptree.uielement import UIElement
+from macapptree.window_tools import windows_matching_title
+
+
+@pytest.fixture
+def windows(element):
+    button = element("AXButton", "OK", (120, 70, 40, 20))
+    return [
+        element("AXWindow", "Inbox", (0, 0, 800, 600), children=[button]),
+        element("AXWindow", "Draft: report", (100, 100, 400, 300)),
+        element("AXWindow", None, (200, 200, 400, 300)),
+    ]
+
+
+def titles(windows):
+    return [window.attributes[TITLE] for window in windows]
+
+
+def test_all_windows_without_a_title_regex(fake_backend, windows):
+    assert windows_matching_title(windows) == windows
+    assert fake_backend.calls["attributes"] == 0
+
+
+def test_windows_matching_title(fake_backend, windows):
+    assert titles(windows_matching_title(windows, "^Draft")) == ["Draft: report"]
+    assert titles(windows_matching_title(windows, "o")) == ["Inbox", "Draft: report"]
+    assert windows_matching_title(windows, "Settings") == []
+    # one title read per window, none of their elements
+    assert fake_backend.calls["attributes"] == 9
+
+
+@pytest.fixture
+def screenshot():
+    """400x300 pixel screenshot whose red channel is x // 2 and green channel y // 2"""
+    from PIL import Image
+    x, y = np.meshgrid(np.arange(400), np.arange(300))
+    pixels = np.stack([x // 2, y // 2, np.zeros_like(x)], axis=-1).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+@pytest.fixture
+def scaling_factor(fake_backend, monkeypatch):
+    """Retina screen, stored like the captures do"""
+    monkeypatch.setattr(window_tools, "_screen_scaling_factor", 1)
+    fake_backend.scaling_factor = 2
+    window_tools.store_screen_scaling_factor()
+    return 2
+
+
+def test_crop_window(screenshot):
+    cropped = window_tools.crop_window(screenshot, (10, 20, 50, 30), scaling_factor=1)
+    assert cropped.size == (50, 30)
+    assert cropped.getpixel((0, 0)) == (5, 10, 0)
+
+
+def test_crop_window_scales_points_to_pixels(screenshot, scaling_factor):
+    cropped = window_tools.crop_window(screenshot, (10, 20, 50, 30))
+    assert cropped.size == (100, 60)
+    # the window origin in points is at pixel (20, 40)
+    assert cropped.getpixel((0, 0)) == (10, 20, 0)
+    assert cropped.getpixel((99, 59)) == (59, 49, 0)
+
+
+def window_pixels(image):
+    return np.asarray(image.convert("RGB"))
+
+
+def test_segment_window_image(fake_backend, mac_app, scaling_factor):
+    from PIL import Image
+    window = UIElement(mac_app[0])
+    image = Image.new("RGB", (1600, 1200), "white")
+
+    segmented = window_tools.segment_window_image(window, image)
+
+    assert segmented is not image
+    assert segmented.size == image.size
+    assert (window_pixels(image) == 255).all()
+    pixels = window_pixels(segmented)
+    # the O K button is at (200, 350) to (280, 380) in the window, in pixels doubled
+    blue = (0, 0, 255)
+    assert tuple(pixels[700, 400]) == blue
+    assert tuple(pixels[700, 559]) == blue
+    assert tuple(pixels[720, 480]) == (255, 255, 255)
+    # the text field outline is green
+    assert tuple(pixels[100, 40]) == (0, 128, 0)
@@ -1,17 +1,22 @@
 import argparse
+import io
+import os
+import re
 import sys
 import time
-import pywinauto
-from pywinauto.application import Application
-from pywinauto import Desktop
 import json
+import random
 import threading
-from functools import wraps
+from collections import deque
 import atexit
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import win32gui
-import win32api
-from ctypes.wintypes import tagPOINT
+from axtools.tracing import Tracer, get_tracer, set_tracer
+from axtools.compressed import dump_json, open_file
+from axtools.compact import WIN, CompactOptions, compact_roots
+from axtools.cache import get_element_cache
+
+# the recorder may set an axtools.cache.ElementCache for in-process captures
+SUPPORTS_ELEMENT_CACHE = True
 
 # Track active threads for cleanup
 active_threads = []
@@ -24,31 +29,33 @@ def cleanup_threads():
 
 atexit.register(cleanup_threads)
 
-def timeout(seconds):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            result = [TimeoutError('Timed out')]
-            def worker():
-                try:
-                    result[0] = func(*args, **kwargs)
-                except Exception as e:
-                    result[0] = e
-            thread = threading.Thread(target=worker)
-            thread.daemon = True
-            active_threads.append(thread)
-            thread.start()
-            thread.join(seconds)
-            if thread in active_threads:
-                active_threads.remove(thread)
-            if isinstance(result[0], Exception):
-                raise result[0]
-            return result[0]
-        return wrapper
-    return decorator
-
-def get_control_value(control):
-    """Get control value trying multiple methods"""
+def call_with_timeout(seconds, func, *args, **kwargs):
+    """Run func in a daemon thread, raise TimeoutError when it takes longer than seconds"""
+    result = [TimeoutError('Timed out')]
+    def worker():
+        try:
+            result[0] = func(*args, **kwargs)
+        except Exception as e:
+            result[0] = e
+    thread = threading.Thread(target=worker, name=f"{func.__name__} (timeout)")
+    thread.daemon = True
+    active_threads.append(thread)
+    thread.start()
+    thread.join(seconds)
+    if thread.is_alive():
+        get_tracer().instant("timeout", "window", {"function": func.__name__, "seconds": seconds})
+    if thread in active_threads:
+        active_threads.remove(thread)
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return result[0]
+
+def get_control_value(control, unsupported=None):
+    """Get control value trying multiple methods
+
+    Getters which fail are added to `unsupported` and skipped when the same
+    set is passed again, the element cache keeps it per element.
+    """
     value = ''
     
     # Try different value getters
@@ -59,19 +66,23 @@ def get_control_value(control):
         lambda: control.window_text() if control.window_text() != control.element_info.name else ''
     ]
     
-    for getter in value_getters:
+    for index, getter in enumerate(value_getters):
+        if unsupported is not None and index in unsupported:
+            continue
         try:
             val = getter()
             if val:
                 value = str(val)
                 break
         except:
+            if unsupported is not None:
+                unsupported.add(index)
             continue
             
     return value
 
-def get_control_states(control):
-    """Get all available control states"""
+def get_control_states(control, unsupported=None):
+    """Get all available control states, skipping the names in `unsupported`"""
     states = {}
     
     state_checks = [
@@ -94,14 +105,54 @@ def get_control_states(control):
     ]
     
     for state_name, func_name in state_checks:
+        if unsupported is not None and state_name in unsupported:
+            continue
         try:
             if hasattr(control, func_name):
                 states[state_name] = getattr(control, func_name)()
+            elif unsupported is not None:
+                unsupported.add(state_name)
         except:
+            if unsupported is not None:
+                unsupported.add(state_name)
             continue
             
     return states
 
+def element_key(control):
+    """UIA runtime id of a control as cache key, None when it has none"""
+    try:
+        runtime_id = control.element_info.runtime_id
+    except Exception:
+        return None
+    return tuple(runtime_id) if runtime_id else None
+
+def get_static_info(control, cache=None):
+    """Control type, description and unsupported value getters and states.
+
+    These rarely change for an element, so with a cache they are read once
+    per runtime id and served from the cache in later captures. The entry
+    keeps the runtime id as well.
+    """
+    key = None
+    if cache is not None:
+        key = element_key(control)
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+    element_info = control.element_info
+    entry = {
+        "role": element_info.control_type or '',
+        "description": getattr(element_info, 'description', ''),
+        "value_unsupported": set(),
+        "states_unsupported": set(),
+        "runtime_id": list(key) if key is not None else None,
+    }
+    if key is not None:
+        cache.put(key, entry)
+    return entry
+
 # warning: this seems to modify window focus
 def get_control_properties(control):
     """Get additional control properties"""
@@ -129,6 +180,7 @@ def get_control_properties(control):
     except:
         # Fallback to getting writable properties only
         try:
+            import pywinauto
             orig_class = control.__class__
             class TempElement(control.__class__):
                 writable_props = pywinauto.base_wrapper.BaseWrapper.writable_props
@@ -165,13 +217,12 @@ def get_control_properties(control):
 
 def get_element_info(control, executor=None, path=''):
     """Get comprehensive element information using a queue-based approach"""
-    from collections import deque
-    
     try:
         # Initialize queue and result tree
         queue = deque([(control, None)])  # (control, parent_id) pairs
         elements = {}
         next_id = 0
+        cache = get_element_cache()
         
         while queue:
             current_control, parent_id = queue.popleft()
@@ -179,29 +230,44 @@ def get_element_info(control, executor=None, path=''):
             next_id += 1
             
             try:
+                # Spans of the attribute fetches, for every Nth node only
+                trace = get_tracer().sample()
+
                 # Get basic info
                 try:
-                    rect = current_control.rectangle()
-                    bbox = {
-                        "x": rect.left,
-                        "y": rect.top,
-                        "width": rect.width(),
-                        "height": rect.height()
-                    }
+                    with trace.span("rectangle", "fetch"):
+                        rect = current_control.rectangle()
+                        bbox = {
+                            "x": rect.left,
+                            "y": rect.top,
+                            "width": rect.width(),
+                            "height": rect.height()
+                        }
                 except Exception as e:
                     print(f"Error getting rectangle: {e}", file=sys.stderr)
                     bbox = {"x": 0, "y": 0, "width": 0, "height": 0}
                 
                 # Build element info
+                with trace.span("element_info", "fetch"):
+                    name = current_control.element_info.name or ''
+                    static = get_static_info(current_control, cache)
+                with trace.span("value", "fetch"):
+                    value = get_control_value(current_control, static["value_unsupported"])
+                with trace.span("states", "fetch"):
+                    states = get_control_states(current_control, static["states_unsupported"])
                 element = {
-                    "name": current_control.element_info.name or '',
-                    "role": current_control.element_info.control_type or '',
-                    "description": getattr(current_control.element_info, 'description', ''),
-                    "value": get_control_value(current_control),
+                    "name": name,
+                    "role": static["role"],
+                    "description": static["description"],
+                    "value": value,
                     "bbox": bbox,
-                    "states": get_control_states(current_control),
+                    "states": states,
                     "children": []
                 }
+                # the runtime id is read for the cache anyway, it identifies
+                # the element across snapshots (axtools track)
+                if static["runtime_id"] is not None:
+                    element["runtime_id"] = static["runtime_id"]
                 
                 # Store element and update parent's children list
                 elements[current_id] = element
@@ -210,7 +276,8 @@ def get_element_info(control, executor=None, path=''):
                 
                 # Add children to queue
                 try:
-                    children = current_control.children()
+                    with trace.span("children", "fetch"):
+                        children = current_control.children()
                     for child in children:
                         queue.append((child, current_id))
                 except Exception as e:
@@ -227,26 +294,144 @@ def get_element_info(control, executor=None, path=''):
         print(f"Error in get_element_info: {e}", file=sys.stderr)
         return None
 
-def get_all_windows_accessibility_tree(timeout_seconds=5, max_workers=None):
-    """Get accessibility tree using Desktop to enumerate windows"""
+class UIADesktop:
+    """Root controls of the live UI Automation desktop.
+
+    Everything the dumper reads goes through these methods and the wrappers
+    they return, so the desktop can be swapped for a recording or a replay.
+    """
+
+    def windows(self):
+        """All top-level windows, the dumper checks their visibility in its workers"""
+        from pywinauto import Desktop
+        # visible_only would check every window one after the other here
+        return Desktop(backend="uia").windows(visible_only=False)
+
+    def focused_control(self):
+        from pywinauto.uia_defines import IUIA
+        focused = IUIA().iuia.GetFocusedElement()
+        return self._wrap(focused)
+
+    def control_at_position(self, x, y):
+        from pywinauto.uia_defines import IUIA
+        from ctypes.wintypes import tagPOINT
+        elem = IUIA().iuia.ElementFromPoint(tagPOINT(x, y))
+        return self._wrap(elem)
+
+    def foreground_handle(self):
+        import win32gui
+        return win32gui.GetForegroundWindow()
+
+    def process_name(self, pid):
+        from pywinauto.application import process_module
+        return os.path.basename(process_module(pid))
+
+    def cursor_position(self):
+        import win32api
+        return win32api.GetCursorPos()
+
+    def monitor_area(self):
+        import win32api
+        monitor = win32api.GetMonitorInfo(win32api.MonitorFromPoint((0,0)))
+        return monitor.get("Monitor")
+
+    def _wrap(self, element):
+        from pywinauto.uia_element_info import UIAElementInfo
+        from pywinauto.controls.uiawrapper import UIAWrapper
+        return UIAWrapper(UIAElementInfo(element))
+
+desktop = UIADesktop()
+
+def set_desktop(new_desktop):
+    """Replace the desktop the dumper reads from"""
+    global desktop
+    desktop = new_desktop
+
+def normalize_process_name(name):
+    name = (name or '').lower()
+    return name[:-4] if name.endswith('.exe') else name
+
+class WindowFilter:
+    """Select top-level windows by process, title and foreground state.
+
+    Every rule reads only the window metadata it needs (handle, process id,
+    process name, title), so a rejected window costs a few calls and none
+    of its subtree is walked. Process names match without case and `.exe`.
+    """
+
+    def __init__(self, pids=None, process_names=None, title_regex=None, foreground_only=False, exclude=None):
+        self.pids = set(pids or ())
+        self.process_names = {normalize_process_name(name) for name in process_names or ()}
+        self.title = re.compile(title_regex) if title_regex else None
+        self.foreground_only = foreground_only
+        self.exclude = {normalize_process_name(name) for name in exclude or ()}
+        self.foreground = None
+        self.names_by_pid = {}
+
+    def prepare(self):
+        """Read the desktop state shared by all windows, once per capture"""
+        if self.foreground_only:
+            self.foreground = desktop.foreground_handle()
+
+    def process_name(self, pid):
+        if pid not in self.names_by_pid:
+            try:
+                self.names_by_pid[pid] = normalize_process_name(desktop.process_name(pid))
+            except Exception:
+                self.names_by_pid[pid] = ''
+        return self.names_by_pid[pid]
+
+    def accepts(self, window):
+        if self.foreground_only and window.handle != self.foreground:
+            return False
+        if self.pids or self.process_names or self.exclude:
+            pid = window.element_info.process_id
+            if self.pids and pid not in self.pids:
+                return False
+            if self.process_names or self.exclude:
+                name = self.process_name(pid)
+                if self.process_names and name not in self.process_names:
+                    return False
+                if name in self.exclude:
+                    return False
+        if self.title is not None and not self.title.search(window.element_info.name or ''):
+            return False
+        return True
+
+def walk_visible_window(window, window_filter=None):
+    """Get the tree of a window, None when it is not visible or filtered out"""
+    if window_filter is not None and not window_filter.accepts(window):
+        return None
+    if not window.is_visible():
+        return None
+    with get_tracer().span("get_element_info", "window"):
+        return get_element_info(window)
+
+def process_window(window, index, timeout_seconds, window_filter=None):
+    """Window task of the executor, the filter and visibility checks run here as well"""
+    with get_tracer().span("window task", "window", {"window": index}):
+        return call_with_timeout(timeout_seconds, walk_visible_window, window, window_filter)
+
+def get_all_windows_accessibility_tree(timeout_seconds=5, max_workers=None, window_filter=None):
+    """Get accessibility tree using Desktop to enumerate windows.
+
+    The windows are submitted right after the one enumeration call, the
+    workers check their visibility and walk them, so no serial pass over the
+    windows delays the walks. Windows rejected by `window_filter` are
+    left out before their subtree is read.
+    """
     try:
-        desktop = Desktop(backend="uia")
         tree = []
+        if window_filter is not None:
+            window_filter.prepare()
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = []
-            for window in desktop.windows():
-                if not window.is_visible():
-                    continue
-                    
-                @timeout(timeout_seconds)
-                def process_window(w):
-                    return get_element_info(w)
-                
-                try:
-                    futures.append(executor.submit(process_window, window))
-                except Exception as e:
-                    print(f"Error submitting window task: {e}", file=sys.stderr)
+            try:
+                for index, window in enumerate(desktop.windows()):
+                    futures.append(executor.submit(process_window, window, index, timeout_seconds, window_filter))
+            except Exception as e:
+                print(f"Error enumerating windows: {e}", file=sys.stderr)
             
             for future in as_completed(futures):
                 try:
@@ -266,9 +451,7 @@ def get_all_windows_accessibility_tree(timeout_seconds=5, max_workers=None):
 def get_focused_element():
     """Get the currently focused element"""
     try:
-        focused = pywinauto.uia_defines.IUIA().iuia.GetFocusedElement()
-        element_info = pywinauto.uia_element_info.UIAElementInfo(focused)
-        wrapper = pywinauto.controls.uiawrapper.UIAWrapper(element_info)
+        wrapper = desktop.focused_control()
         return get_element_info(wrapper)
     except:
         print("Failed to get focused element", file=sys.stderr)
@@ -277,9 +460,7 @@ def get_focused_element():
 def get_element_at_position(x, y):
     """Get element at specific screen coordinates"""
     try:
-        elem = pywinauto.uia_defines.IUIA().iuia.ElementFromPoint(tagPOINT(x, y))
-        element_info = pywinauto.uia_element_info.UIAElementInfo(elem)
-        wrapper = pywinauto.controls.uiawrapper.UIAWrapper(element_info)
+        wrapper = desktop.control_at_position(x, y)
         return {
             "position": {"x": x, "y": y},
             "element": get_element_info(wrapper)
@@ -293,17 +474,15 @@ def get_element_at_position(x, y):
 
 def get_cursor_element():
     """Get element under the cursor"""
-    x, y = win32api.GetCursorPos()
+    x, y = desktop.cursor_position()
     return get_element_at_position(x, y)
 
 def get_random_screen_points():
     """Get two random points on the primary monitor"""
-    monitor = win32api.GetMonitorInfo(win32api.MonitorFromPoint((0,0)))
-    monitor_area = monitor.get("Monitor")
+    monitor_area = desktop.monitor_area()
     width = monitor_area[2] - monitor_area[0]
     height = monitor_area[3] - monitor_area[1]
     
-    import random
     points = []
     for _ in range(2):
         x = random.randint(0, width-1)
@@ -311,15 +490,24 @@ def get_random_screen_points():
         points.append(get_element_at_position(x, y))
     return points
 
-def save_accessibility_tree(output_file=None, timeout=5, max_workers=None, event_format=False):
-    start_time = int(time.time() * 1000)  # JS equivalent of timestamp_millis
+def capture_accessibility_tree(timeout=5, max_workers=None, compact=None, window_filter=None):
+    """Capture the windows, the focused element and the element queries.
+
+    With CompactOptions in `compact` the window trees are compacted and the
+    node counts before and after are added as `compaction`. A WindowFilter
+    selects the windows, the focused element and queries are not filtered.
+    While an ElementCache is set, its counts are added as `cache`.
+    """
+    tracer = get_tracer()
     
     # Get focused element
-    focused = get_focused_element()
+    with tracer.span("focused element", "capture"):
+        focused = get_focused_element()
     
     # Get element queries
-    cursor = get_cursor_element()
-    random_points = get_random_screen_points()
+    with tracer.span("queries", "capture"):
+        cursor = get_cursor_element()
+        random_points = get_random_screen_points()
     
     # Combine all queries with enumerated random points
     queries = {
@@ -329,27 +517,24 @@ def save_accessibility_tree(output_file=None, timeout=5, max_workers=None, event
     }
 
     # Get main tree last (slowest)
-    tree = get_all_windows_accessibility_tree(timeout, max_workers)
-    
-    end_time = int(time.time() * 1000)
-    duration = end_time - start_time
+    with tracer.span("windows", "capture"):
+        tree = get_all_windows_accessibility_tree(timeout, max_workers, window_filter)
     
-    if event_format:
-        output = {
-            "time": start_time,
-            "data": {
-                "duration": duration,
-                "tree": tree,
-                "focused_element": focused,
-                "queries": queries
-            }
-        }
-    else:
-        output = {
-            "tree": tree,
-            "focused_element": focused,
-            "queries": queries
-        }
+    output = {
+        "tree": tree,
+        "focused_element": focused,
+        "queries": queries
+    }
+
+    if compact is not None:
+        with tracer.span("compact", "capture"):
+            stats = compact_roots(tree, WIN, compact)
+        output["compaction"] = stats.to_dict()
+        print(f"Compacted {stats.before} to {stats.after} nodes ({stats.reduction:.0%} fewer)", file=sys.stderr)
+
+    cache = get_element_cache()
+    if cache is not None:
+        output["cache"] = cache.stats()
     
     # Ensure all strings are properly encoded
     def clean_string(s):
@@ -377,27 +562,50 @@ def save_accessibility_tree(output_file=None, timeout=5, max_workers=None, event
         return v
 
     # Clean the output data
-    output = clean_value(output)
+    with tracer.span("clean strings", "serialize"):
+        return clean_value(output)
+
+def save_accessibility_tree(output_file=None, timeout=5, max_workers=None, event_format=False, compress_level=None,
+                            compact=None, window_filter=None):
+    start_time = int(time.time() * 1000)  # JS equivalent of timestamp_millis
     
-    # Convert to JSON with ASCII-only encoding
-    json_output = json.dumps(output, ensure_ascii=True)
+    tracer = get_tracer()
     
-    if output_file:
-        try:
-            with open(output_file, 'w', encoding='ascii') as f:
-                f.write(json_output)
-        except IOError as e:
-            print(f"Error writing to file {output_file}: {e}", file=sys.stderr)
-            sys.exit(1)
+    data = capture_accessibility_tree(timeout, max_workers, compact, window_filter)
+    
+    end_time = int(time.time() * 1000)
+    duration = end_time - start_time
+    
+    if event_format:
+        output = {
+            "time": start_time,
+            "data": dict({"duration": duration}, **data)
+        }
     else:
-        print(json_output)
+        output = data
+    
+    # Stream the json as utf-8, compressed when the file extension asks for it
+    with tracer.span("write", "io", {"file": output_file or "stdout"}):
+        if output_file:
+            try:
+                with open_file(output_file, 'w', compress_level) as f:
+                    dump_json(output, f)
+            except (IOError, ValueError) as e:
+                print(f"Error writing to file {output_file}: {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+            dump_json(output, stdout)
+            stdout.write('\n')
+            stdout.flush()
+            stdout.detach()
     
     return output
 
 def main():
     parser = argparse.ArgumentParser(description='Generate accessibility tree for all windows')
     parser.add_argument('-o', '--out',
-                      help='Output file path. If not specified, prints to stdout',
+                      help='Output file path, .gz, .xz and .zst files are compressed. If not specified, prints to stdout',
                       type=str,
                       default=None)
     parser.add_argument('-t', '--timeout',
@@ -408,17 +616,90 @@ def main():
                       help='Maximum number of parallel workers (default: number of CPUs * 5)',
                       type=int,
                       default=None)
+    parser.add_argument('-l', '--compress-level',
+                      help='Compression level of compressed output (default: 6 for gzip and xz, 3 for zstd)',
+                      type=int,
+                      default=None)
     parser.add_argument('-e', '--event',
                       help='Output in event format with timing data',
                       action='store_true')
+    parser.add_argument('--pid',
+                      help='Capture the windows of this process id only, repeat for more',
+                      type=int,
+                      action='append')
+    parser.add_argument('--process-name',
+                      help='Capture the windows of this process only (e.g. chrome.exe), repeat for more',
+                      action='append')
+    parser.add_argument('--title-regex',
+                      help='Capture the windows whose title matches this regular expression only',
+                      type=str,
+                      default=None)
+    parser.add_argument('--foreground-only',
+                      help='Capture the foreground window only',
+                      action='store_true')
+    parser.add_argument('--exclude',
+                      help='Skip the windows of this process, repeat for more',
+                      action='append')
+    parser.add_argument('--compact',
+                      help='Collapse same-size wrappers, drop zero-area, empty and invisible leaves and merge text chains',
+                      action='store_true')
+    parser.add_argument('--record',
+                      help='Record every UI Automation call with its result and latency to this file',
+                      type=str,
+                      default=None)
+    parser.add_argument('--replay',
+                      help='Serve the UI Automation calls from a recording instead of the desktop',
+                      type=str,
+                      default=None)
+    parser.add_argument('--replay-latency',
+                      help='Delay replayed calls by their recorded latency times this factor',
+                      type=float,
+                      default=None)
+    parser.add_argument('--trace',
+                      help='Write Chrome trace events (chrome://tracing, Perfetto) to this file',
+                      type=str,
+                      default=None)
+    parser.add_argument('--trace-every',
+                      help='Trace the attribute fetches of every Nth node only (default: 1)',
+                      type=int,
+                      default=1)
     
     args = parser.parse_args()
     
+    window_filter = None
+    if args.pid or args.process_name or args.title_regex or args.foreground_only or args.exclude:
+        try:
+            window_filter = WindowFilter(args.pid, args.process_name, args.title_regex, args.foreground_only,
+                                         args.exclude)
+        except re.error as e:
+            print(f"Invalid --title-regex: {e}", file=sys.stderr)
+            sys.exit(2)
+    
+    if args.trace:
+        set_tracer(Tracer(args.trace_every))
+    
+    recorder = None
+    if args.replay:
+        from replay import Replay
+        replay = Replay.load(args.replay, args.replay_latency is not None,
+                             args.replay_latency if args.replay_latency is not None else 1.0)
+        set_desktop(replay.root())
+    elif args.record:
+        from replay import Recorder
+        recorder = Recorder()
+        set_desktop(recorder.wrap(desktop))
+    
     try:
-        save_accessibility_tree(args.out, args.timeout, args.workers, args.event)
+        save_accessibility_tree(args.out, args.timeout, args.workers, args.event, args.compress_level,
+                                CompactOptions() if args.compact else None, window_filter)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if recorder is not None:
+            recorder.save(args.record)
+        if args.trace:
+            get_tracer().save(args.trace)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,294 @@
+"""Record and replay the UI Automation calls of the dumper.
+
+`Recorder.wrap` returns a proxy which forwards every attribute read and
+method call to the wrapped object and logs the result and latency. Returned
+objects (pywinauto wrappers, element infos, rectangles) are wrapped as well,
+so a whole traversal is captured by wrapping the desktop only.
+
+`Replay` serves a saved recording through the same attribute reads and
+calls, so the traversal code runs unchanged on machines without UI
+Automation, optionally with the recorded latencies.
+"""
+import builtins
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+RECORDING_VERSION = 1
+
+# shortest sleep used to replay the recorded latencies
+MIN_SLEEP = 0.001
+
+
+def _args_key(args, kwargs):
+    return json.dumps([args, kwargs], sort_keys=True)
+
+
+class RecordedError(Exception):
+    """Exception raised by the recorded call which has no builtin equivalent"""
+
+
+class ReplayMissError(AttributeError):
+    """The replayed code made a call which is not in the recording.
+
+    Derives from AttributeError so `hasattr` probes of attributes which were
+    never read while recording report them as missing.
+    """
+
+
+class RecordingProxy:
+    """Forward to the target object and log every access"""
+
+    __slots__ = ("_target", "_id", "_recorder")
+
+    def __init__(self, target, object_id, recorder):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_id", object_id)
+        object.__setattr__(self, "_recorder", recorder)
+
+    def __getattr__(self, name):
+        recorder = self._recorder
+        start = time.perf_counter()
+        try:
+            value = getattr(self._target, name)
+        except Exception as e:
+            recorder.log(self._id, "get", name, None, start, error=e)
+            raise
+
+        if callable(value):
+            recorder.log(self._id, "get", name, None, start, result={"$method": True})
+            return recorder.recording_method(self._id, name, value)
+        encoded, wrapped = recorder.encode(value)
+        recorder.log(self._id, "get", name, None, start, result=encoded)
+        return wrapped
+
+    def __str__(self):
+        return self.__getattr__("__str__")()
+
+    def __bool__(self):
+        return self.__getattr__("__bool__")() if hasattr(self._target, "__bool__") else True
+
+    def __repr__(self):
+        return f"RecordingProxy({self._target!r})"
+
+
+class Recorder:
+    """Collect the calls made through the proxies of one recording"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.next_id = 0
+
+    def wrap(self, target):
+        with self.lock:
+            object_id = self.next_id
+            self.next_id += 1
+        return RecordingProxy(target, object_id, self)
+
+    def encode(self, value):
+        """Get the json form of the value and the value handed to the caller"""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value, value
+        if isinstance(value, list):
+            pairs = [self.encode(item) for item in value]
+            return [encoded for encoded, _ in pairs], [wrapped for _, wrapped in pairs]
+        if isinstance(value, tuple):
+            pairs = [self.encode(item) for item in value]
+            return {"$tuple": [encoded for encoded, _ in pairs]}, tuple(wrapped for _, wrapped in pairs)
+        proxy = self.wrap(value)
+        return {"$ref": proxy._id}, proxy
+
+    def encode_args(self, args):
+        if isinstance(args, RecordingProxy):
+            return {"$ref": args._id}
+        if isinstance(args, (list, tuple)):
+            return [self.encode_args(arg) for arg in args]
+        if isinstance(args, dict):
+            return {key: self.encode_args(value) for key, value in args.items()}
+        return args
+
+    def unwrap_args(self, args):
+        if isinstance(args, RecordingProxy):
+            return args._target
+        if isinstance(args, (list, tuple)):
+            return type(args)(self.unwrap_args(arg) for arg in args)
+        if isinstance(args, dict):
+            return {key: self.unwrap_args(value) for key, value in args.items()}
+        return args
+
+    def recording_method(self, object_id, name, method):
+        def call(*args, **kwargs):
+            key = _args_key(self.encode_args(args), self.encode_args(kwargs))
+            start = time.perf_counter()
+            try:
+                value = method(*self.unwrap_args(args), **self.unwrap_args(kwargs))
+            except Exception as e:
+                self.log(object_id, "call", name, key, start, error=e)
+                raise
+            encoded, wrapped = self.encode(value)
+            self.log(object_id, "call", name, key, start, result=encoded)
+            return wrapped
+        return call
+
+    def log(self, object_id, op, name, args, start, result=None, error=None):
+        entry = {
+            "object": object_id,
+            "op": op,
+            "name": name,
+            "latency": time.perf_counter() - start,
+        }
+        if args is not None:
+            entry["args"] = args
+        if error is not None:
+            entry["error"] = [type(error).__name__, str(error)]
+        else:
+            entry["result"] = result
+        with self.lock:
+            self.calls.append(entry)
+
+    def save(self, path):
+        with self.lock:
+            recording = {"version": RECORDING_VERSION, "calls": list(self.calls)}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False)
+
+
+class ReplayProxy:
+    """Stand-in for a recorded object"""
+
+    __slots__ = ("_id", "_replay")
+
+    def __init__(self, object_id, replay):
+        object.__setattr__(self, "_id", object_id)
+        object.__setattr__(self, "_replay", replay)
+
+    def __getattr__(self, name):
+        result = self._replay.next_result(self._id, "get", name, None)
+        if isinstance(result, dict) and result.get("$method"):
+            return self._replay.replay_method(self._id, name)
+        return result
+
+    def __str__(self):
+        return self.__getattr__("__str__")()
+
+    def __bool__(self):
+        try:
+            return self.__getattr__("__bool__")()
+        except ReplayMissError:
+            return True
+
+    def __repr__(self):
+        return f"ReplayProxy({self._id})"
+
+
+class Replay:
+    """Serve the calls of a recording, keyed by object, name and arguments.
+
+    Repeated calls get the recorded results in order, the last one is reused
+    once they run out. Calls with arguments which were never recorded, like
+    the random screen points, get the results of the same method in
+    recording order. With `latencies` every result is delayed by its
+    recorded latency times `latency_scale`.
+    """
+
+    def __init__(self, calls, latencies=False, latency_scale=1.0):
+        self.latencies = latencies
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.entries = defaultdict(deque)
+        self.any_args_entries = defaultdict(deque)
+        self.proxies = {}
+        self.replayed = set()
+        self.owed = threading.local()
+        for entry in calls:
+            key = (entry["object"], entry["op"], entry["name"])
+            self.entries[key + (entry.get("args"),)].append(entry)
+            if entry["op"] == "call":
+                self.any_args_entries[key].append(entry)
+
+    @classmethod
+    def load(cls, path, latencies=False, latency_scale=1.0):
+        with open(path, encoding="utf-8") as f:
+            recording = json.load(f)
+        if recording.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version {recording.get('version')}")
+        return cls(recording["calls"], latencies, latency_scale)
+
+    def root(self):
+        """Get the stand-in of the first wrapped object, usually the desktop"""
+        return self.proxy(0)
+
+    def proxy(self, object_id):
+        with self.lock:
+            proxy = self.proxies.get(object_id)
+            if proxy is None:
+                proxy = self.proxies[object_id] = ReplayProxy(object_id, self)
+        return proxy
+
+    def replay_method(self, object_id, name):
+        def call(*args, **kwargs):
+            key = _args_key(self.encode_args(args), self.encode_args(kwargs))
+            return self.next_result(object_id, "call", name, key)
+        return call
+
+    def encode_args(self, args):
+        if isinstance(args, ReplayProxy):
+            return {"$ref": args._id}
+        if isinstance(args, (list, tuple)):
+            return [self.encode_args(arg) for arg in args]
+        if isinstance(args, dict):
+            return {key: self.encode_args(value) for key, value in args.items()}
+        return args
+
+    def next_result(self, object_id, op, name, args):
+        with self.lock:
+            entry = self._next_entry(self.entries.get((object_id, op, name, args)))
+            if entry is None and op == "call":
+                entry = self._next_entry(self.any_args_entries.get((object_id, op, name)))
+            if entry is None:
+                raise ReplayMissError(f"{op} {name} of object {object_id} is not recorded")
+            self.replayed.add(id(entry))
+
+        if self.latencies:
+            self._delay(entry["latency"] * self.latency_scale)
+        if "error" in entry:
+            raise self.error(*entry["error"])
+        return self.decode(entry["result"])
+
+    def _next_entry(self, queue):
+        if not queue:
+            return None
+        # skip the entries already served through the other lookup
+        while len(queue) > 1 and id(queue[0]) in self.replayed:
+            queue.popleft()
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def _delay(self, latency):
+        # sleeping for every microsecond call would cost more than the call
+        # itself, so short latencies are collected per thread and slept off
+        # once they add up
+        owed = getattr(self.owed, "latency", 0.0) + latency
+        if owed >= MIN_SLEEP:
+            start = time.perf_counter()
+            time.sleep(owed)
+            owed -= time.perf_counter() - start
+        self.owed.latency = owed
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if isinstance(value, dict):
+            if "$ref" in value:
+                return self.proxy(value["$ref"])
+            if "$tuple" in value:
+                return tuple(self.decode(item) for item in value["$tuple"])
+        return value
+
+    @staticmethod
+    def error(name, message):
+        error_type = getattr(builtins, name, None)
+        if isinstance(error_type, type) and issubclass(error_type, Exception):
+            return error_type(message)
+        return RecordedError(f"{name}: {message}")